@@ -0,0 +1,140 @@
+"""
+AI Client Module - Gọi model (OpenAI) từ các async handler mà không block event loop
+- Các hàm gọi model đồng bộ (recognize.py, ai_recommend.py) được chạy trong thread pool riêng
+- Giới hạn số lời gọi model đồng thời (semaphore + số worker của pool)
+- Timeout cho từng lời gọi; request bị huỷ thì lời gọi chưa chạy cũng bị huỷ
+- Thread nền (worker nhận dạng) gọi qua call(): dùng chung pool nên cùng giới hạn đồng thời
+"""
+
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Số lời gọi model tối đa chạy cùng lúc trên một worker uvicorn
+MODEL_MAX_CONCURRENCY = int(os.getenv('MODEL_MAX_CONCURRENCY', '8'))
+# Timeout (giây) cho một lời gọi, tính cả thời gian chờ slot
+MODEL_CALL_TIMEOUT = float(os.getenv('MODEL_CALL_TIMEOUT', '60'))
+
+
+class ModelCallTimeout(Exception):
+    """Lời gọi model vượt quá timeout"""
+
+
+class ModelClient:
+    """
+    Chạy các lời gọi model blocking trong thread pool có giới hạn
+    để event loop vẫn phục vụ được các request khác.
+    """
+
+    def __init__(self, max_concurrency: int = MODEL_MAX_CONCURRENCY, default_timeout: float = MODEL_CALL_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="model-call")
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+
+        self._stats_lock = Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._cancelled = 0
+        self._total_latency = 0.0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Semaphore gắn với event loop hiện tại"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(id(loop))
+        if semaphore is None:
+            semaphore = self._semaphores[id(loop)] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Chạy func(*args, **kwargs) trong thread pool và chờ kết quả.
+        Raise ModelCallTimeout nếu quá timeout.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self._run_limited(func, *args, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            logger.warning(f"Model call {getattr(func, '__name__', func)} timed out after {timeout}s")
+            raise ModelCallTimeout(f"Model call timed out after {timeout}s")
+        except asyncio.CancelledError:
+            with self._stats_lock:
+                self._cancelled += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self._total_latency += time.perf_counter() - start
+
+    def call(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Bản đồng bộ của run() cho thread không có event loop (worker nền).
+        Chạy trong cùng pool nên không vượt quá max_concurrency lời gọi cùng lúc.
+        Raise ModelCallTimeout nếu quá timeout (tính cả thời gian chờ worker).
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        future = self._executor.submit(self._invoke, func, *args, **kwargs)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Chưa chạy thì huỷ luôn; đang chạy thì để chạy nốt trong pool
+            future.cancel()
+            with self._stats_lock:
+                self._timeouts += 1
+            logger.warning(f"Model call {getattr(func, '__name__', func)} timed out after {timeout}s")
+            raise ModelCallTimeout(f"Model call timed out after {timeout}s")
+        finally:
+            with self._stats_lock:
+                self._total_latency += time.perf_counter() - start
+
+    def _invoke(self, func: Callable, *args, **kwargs) -> Any:
+        """Chạy trong pool: gọi func và đếm thống kê"""
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            with self._stats_lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+        with self._stats_lock:
+            self._completed += 1
+        return result
+
+    async def _run_limited(self, func: Callable, *args, **kwargs) -> Any:
+        async with self._semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(self._invoke, func, *args, **kwargs))
+
+    def get_stats(self) -> Dict:
+        """Thống kê lời gọi model"""
+        with self._stats_lock:
+            finished = self._completed + self._failed + self._timeouts + self._cancelled
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timeouts": self._timeouts,
+                "cancelled": self._cancelled,
+                "avg_latency_ms": round(self._total_latency / finished * 1000, 1) if finished else 0.0,
+            }
+
+
+# Global instance
+model_client = ModelClient()
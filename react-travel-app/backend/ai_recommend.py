@@ -3,6 +3,11 @@ import unidecode
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
+from ai_client import MODEL_CALL_TIMEOUT
+from reloadable import ReloadableFile
+from destination_index import DestinationIndex
+from geo_index import GeoIndex
+from districts import DISTRICTS_FILE, get_district_table
 
 # Load biến môi trường từ file .env
 load_dotenv()
@@ -15,64 +20,110 @@ api_key = os.getenv('OPENAI_API_KEY', '')
 if not api_key:
     raise ValueError("OPENAI_API_KEY not found in environment variables. Please add it to your .env file.")
 
-client = OpenAI(api_key=api_key)
+client = OpenAI(api_key=api_key, timeout=MODEL_CALL_TIMEOUT)
 print("[AI_RECOMMEND] OpenAI client initialized successfully")
-def loadDestination():
-   
-    destinations = []
-    # Fix path to find database.json in backend folder
-    db_path = os.path.join(os.path.dirname(__file__), 'database.json')
-    with open(db_path, "r", encoding = "utf-8") as f:
-        data = json.load(f)
+DATABASE_FILE = os.path.join(os.path.dirname(__file__), 'database.json')
+POPULAR_LIMIT = 6
+HIGH_RATING_THRESHOLD = 4.5
+
+def _prepare_destination(destination):
+    """Chuẩn hoá một địa điểm từ database.json, thêm các trường dùng cho tìm kiếm."""
+    raw_tags = destination.get("tags", [])
+    dest_name = destination.get("name", "") # Lấy tên
+    display_tags = [tag.strip().lower() for tag in raw_tags]
+    search_words = set()
+
+    search_phrases = []
+
+    # --- Xử lý TÊN ---
+    # Ví dụ: "Chợ Bến Thành" -> "cho ben thanh"
+    norm_name = unidecode.unidecode(dest_name.lower())
+    # Thêm cụm từ "cho ben thanh" vào danh sách
+    search_phrases.append(norm_name)
+    # Tách "cho ben thanh" thành {"cho", "ben", "thanh"}
+    search_words.update(norm_name.split())
     
-    for destination in data:
-        raw_tags = destination.get("tags", [])
-        dest_name = destination.get("name", "") # Lấy tên
-        display_tags = [tag.strip().lower() for tag in raw_tags]
-        search_words = set()
-
-        search_phrases = []
-
-        # --- Xử lý TÊN ---
-        # Ví dụ: "Chợ Bến Thành" -> "cho ben thanh"
-        norm_name = unidecode.unidecode(dest_name.lower())
-        # Thêm cụm từ "cho ben thanh" vào danh sách
-        search_phrases.append(norm_name)
-        # Tách "cho ben thanh" thành {"cho", "ben", "thanh"}
-        search_words.update(norm_name.split())
+    # --- Xử lý TAGS ---
+    for tag in raw_tags:
+        # Ví dụ: "vui chơi" -> "vui choi"
+        norm_tag_phrase = unidecode.unidecode(tag.lower())
         
-        # --- Xử lý TAGS ---
-        for tag in raw_tags:
-            # Ví dụ: "vui chơi" -> "vui choi"
-            norm_tag_phrase = unidecode.unidecode(tag.lower())
-            
-            # Thêm cụm từ "vui choi" vào danh sách
-            search_phrases.append(norm_tag_phrase)
-            
-            # Tách "vui choi" thành {"vui", "choi"}
-            search_words.update(norm_tag_phrase.split())
+        # Thêm cụm từ "vui choi" vào danh sách
+        search_phrases.append(norm_tag_phrase)
+        
+        # Tách "vui choi" thành {"vui", "choi"}
+        search_words.update(norm_tag_phrase.split())
+    
+    # Thêm các trường đã xử lý vào dictionary
+    return {
+        "name" : dest_name, # Tên gốc
+        "location" : destination.get("location"),
+        "tags" : display_tags, # Tag gốc
         
-        # Thêm các trường đã xử lý vào dictionary
-        destinations.append({
-            "name" : dest_name, # Tên gốc
-            "location" : destination.get("location"),
-            "tags" : display_tags, # Tag gốc
-            
-            # 2 trường mới dùng cho tìm kiếm SIÊU CHÍNH XÁC
-            "search_words": search_words,   # Set: {"vui", "choi", "thao", "cam", "vien"...}
-            "search_phrases": search_phrases, # List: ["vui choi", "thao cam vien"...]
-            
-            "introduction" : destination.get("introduction"),
-            "price" : destination.get("price (VNĐ)"),
-            "rating" : destination.get("rating"),
-            "lat" : destination.get("lat"),
-            "lon" : destination.get("lon"),
-            "review" : destination.get("review"),
-            "province" : destination.get("province"),
-            "images": destination.get("images", [])
-        })
-
-    return destinations
+        # 2 trường mới dùng cho tìm kiếm SIÊU CHÍNH XÁC
+        "search_words": search_words,   # Set: {"vui", "choi", "thao", "cam", "vien"...}
+        "search_phrases": search_phrases, # List: ["vui choi", "thao cam vien"...]
+        
+        "introduction" : destination.get("introduction"),
+        "price" : destination.get("price (VNĐ)"),
+        "rating" : destination.get("rating"),
+        "lat" : destination.get("lat"),
+        "lon" : destination.get("lon"),
+        "review" : destination.get("review"),
+        "province" : destination.get("province"),
+        "images": destination.get("images", [])
+    }
+
+def _json_default(value):
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _response_bytes(destinations):
+    """Body JSON dựng sẵn cho các endpoint trả danh sách địa điểm."""
+    return json.dumps(
+        {"success": True, "destinations": destinations},
+        ensure_ascii=False, separators=(",", ":"), default=_json_default
+    ).encode("utf-8")
+
+class DestinationCatalog:
+    """
+    Snapshot bất biến của database.json, dựng một lần và thay thế nguyên khối
+    khi file thay đổi. Không sửa các list/dict bên trong - hãy copy trước khi sửa.
+    """
+    def __init__(self, data):
+        self.destinations = [_prepare_destination(destination) for destination in data]
+        # Gán quận gần nhất cho từng địa điểm (một lần cho cả catalog)
+        districts = get_district_table().assign((d.get('lat'), d.get('lon')) for d in self.destinations)
+        self.by_district = {}
+        for dest, district in zip(self.destinations, districts):
+            dest["district"] = district
+            if district:
+                self.by_district.setdefault(district, []).append(dest)
+        # Các view dựng sẵn cho handler
+        self.by_rating = sorted(self.destinations, key=lambda x: x.get('rating') or 0, reverse=True)
+        self.popular = self.by_rating[:POPULAR_LIMIT]
+        self.high_rated = [d for d in self.destinations if (d.get('rating') or 0) >= HIGH_RATING_THRESHOLD]
+        self.destinations_json = _response_bytes(self.destinations)
+        self.popular_json = _response_bytes(self.popular)
+        self.index = DestinationIndex(self.destinations)
+        self.geo_index = GeoIndex((d.get('lat'), d.get('lon')) for d in self.destinations)
+
+def _build_catalog(path):
+    with open(path, "r", encoding = "utf-8") as f:
+        data = json.load(f)
+    print(f"[AI_RECOMMEND] Destination catalog built with {len(data)} destinations")
+    return DestinationCatalog(data)
+
+_catalog = ReloadableFile(DATABASE_FILE, _build_catalog, extra_paths=[DISTRICTS_FILE])
+
+def get_destination_catalog():
+    """Catalog địa điểm hiện tại (dựng lại khi database.json thay đổi)."""
+    return _catalog.get()
+
+def loadDestination():
+    """Danh sách địa điểm đã chuẩn hoá (dùng chung, không được sửa trực tiếp)."""
+    return get_destination_catalog().destinations
 
 #Tính độ tương thích địa điểm
 def compatibality_rate(preference, destination):
@@ -97,18 +148,17 @@ def compatibality_rate(preference, destination):
     return score
 
 #Recommend theo tags
-def recommend(preference, destination):
-    preference = preference.lower()
-
-    results = []
-    for dest in destination:
-        score = compatibality_rate(preference, dest)
-        if score > 0:
-            results.append((dest, score))
-    #Sắp xếp giảm dần theo điểm số tương thích
-    results.sort(key = lambda x : x[1], reverse = True)
-
-    return [d[0] for d in results[:5]]
+def recommend(preference, destination, limit = 5):
+    """
+    Gợi ý theo tags/tên qua inverted index.
+    Danh sách từ catalog dùng index dựng sẵn; danh sách khác thì dựng index tạm.
+    """
+    catalog = get_destination_catalog()
+    if destination is catalog.destinations:
+        index = catalog.index
+    else:
+        index = DestinationIndex(destination)
+    return index.search(preference, limit)
 
 #Recommend bằng AI (sử dụng OpenAI API)
 def ai_recommend(user_input, places_data):
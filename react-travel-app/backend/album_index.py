@@ -0,0 +1,404 @@
+"""
+Album Index Module - Index của một album: phân trang bằng cursor và tìm kiếm theo địa danh/ngày
+- Dựng một lần từ danh sách item (AlbumStore cache theo shard), sau đó cập nhật từng item
+  khi thêm/sửa/xoá ảnh thay vì dựng lại
+- Thứ tự: vị trí trong album, ngày upload, tên địa danh (đã bỏ dấu)
+- Cursor chứa khoá sắp xếp của item cuối trang, trang tiếp theo tìm bằng bisect
+  nên chi phí mỗi trang không phụ thuộc vào kích thước album
+- Thứ tự trong album dựa trên số thứ tự "seq" lưu trong item (tăng dần theo danh sách),
+  không dựa trên slot của index, nên cursor vẫn đúng sau khi index được dựng lại
+- Index địa danh (tên chuẩn hoá -> vị trí) và index ngày upload (khoảng ngày bằng bisect):
+  chi phí tìm kiếm tỉ lệ với số kết quả, không phải số ảnh trong album
+- Projection: chỉ trả các field được yêu cầu, mặc định là metadata (không có dữ liệu ảnh)
+"""
+
+import base64
+import difflib
+import json
+import time
+from bisect import bisect_left, bisect_right
+from threading import RLock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import unidecode
+
+SORT_POSITION = "position"
+SORT_UPLOADED_AT = "uploaded_at"
+SORT_LANDMARK = "landmark"
+SORT_FIELDS = (SORT_POSITION, SORT_UPLOADED_AT, SORT_LANDMARK)
+SORT_ORDERS = ("asc", "desc")
+
+# Field chứa dữ liệu ảnh inline (dữ liệu cũ), không bao giờ trả trong metadata
+HEAVY_FIELDS = frozenset({"image_data", "bytes"})
+
+MAX_PAGE_SIZE = 500
+
+# Tìm gần đúng khi không có địa danh nào chứa chuỗi tìm kiếm
+FUZZY_MATCHES = 5
+FUZZY_CUTOFF = 0.75
+
+UNKNOWN_LANDMARK = "Chưa nhận dạng"
+
+# Ký tự lớn hơn mọi ký tự trong tên/ngày: cận trên khi tìm theo tiền tố
+_PREFIX_END = "￿"
+
+# Kiểu của từng thành phần khoá sắp xếp (để kiểm tra cursor từ client)
+_KEY_TYPES = {
+    # seq của item (không phải slot của index)
+    SORT_POSITION: (int,),
+    SORT_UPLOADED_AT: (str, str, int),
+    SORT_LANDMARK: (str, str, str, int),
+}
+
+
+class InvalidCursor(ValueError):
+    """Cursor hỏng hoặc không khớp với sort/order của request"""
+
+
+def _item_key(item: Dict) -> str:
+    """Khoá phân biệt các item trùng khoá sắp xếp"""
+    return item.get("id") or item.get("image_hash") or item.get("filename") or ""
+
+
+def _valid_seq(value) -> bool:
+    return type(value) is int and value > 0
+
+
+def next_sequence(items: List[Dict]) -> int:
+    """
+    seq cho item sắp thêm vào cuối album: lớn hơn seq cuối cùng, và theo micro giây
+    để không dùng lại seq của item cuối vừa bị xoá (cursor có thể đang trỏ tới nó)
+    """
+    last = items[-1].get("seq") if items else None
+    return max(last + 1 if _valid_seq(last) else 1, time.time_ns() // 1000)
+
+
+def assign_sequence(items: List[Dict]) -> int:
+    """
+    Gán seq cho item chưa có (dữ liệu cũ) hoặc sai thứ tự, để seq tăng dần theo danh sách.
+    Sửa item tại chỗ; trả về số item đã gán.
+    """
+    assigned = 0
+    previous = 0
+    for item in items:
+        seq = item.get("seq")
+        if not _valid_seq(seq) or seq <= previous:
+            seq = item["seq"] = previous + 1
+            assigned += 1
+        previous = seq
+    return assigned
+
+
+def normalize_landmark(landmark: Optional[str]) -> str:
+    return unidecode.unidecode((landmark or "").lower()).strip()
+
+
+def encode_cursor(sort: str, order: str, key: Tuple) -> str:
+    payload = json.dumps({"s": sort, "o": order, "k": list(key)}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        key = tuple(payload["k"])
+    except Exception:
+        raise InvalidCursor("Cursor không hợp lệ")
+    if payload.get("s") != sort or payload.get("o") != order:
+        raise InvalidCursor("Cursor không khớp với sort/order")
+    types = _KEY_TYPES[sort]
+    if len(key) != len(types) or not all(type(part) is t for part, t in zip(key, types)):
+        raise InvalidCursor("Cursor không hợp lệ")
+    return key
+
+
+def project(item: Dict, fields: Optional[Iterable[str]] = None) -> Dict:
+    """Bản sao item chỉ gồm các field yêu cầu (None = toàn bộ metadata)"""
+    if fields is None:
+        return {k: v for k, v in item.items() if k not in HEAVY_FIELDS}
+    return {k: item[k] for k in fields if k in item and k not in HEAVY_FIELDS}
+
+
+class AlbumIndex:
+    """
+    Index của một album. Mỗi item có một vị trí (slot) cố định suốt đời index;
+    item bị xoá để lại slot rỗng (AlbumStore dựng lại index khi có quá nhiều slot rỗng).
+    Slot chỉ dùng bên trong một index; cursor dùng seq của item (assign_sequence / next_sequence),
+    item chưa có seq hợp lệ được tính seq ngay sau item trước (không sửa item).
+    Item được coi là bất biến: sửa item = thay bằng dict mới (replace).
+    Mọi thao tác đọc/ghi đi qua một RLock; thao tác đọc chỉ giữ lock trong O(kết quả).
+    """
+
+    def __init__(self, items: Iterable[Dict]):
+        self._lock = RLock()
+        self._slots: List[Optional[Dict]] = []
+        # seq của từng slot (tăng dần, giữ nguyên cả khi slot rỗng) để bisect cursor thứ tự album
+        self._seqs: List[int] = []
+        # Tên địa danh chuẩn hoá của từng slot (dùng lại cho khoá sắp xếp)
+        self._norms: List[str] = []
+        self._live = 0
+        self._total_bytes = 0
+        self._by_id: Dict[str, int] = {}
+        self._by_filename: Dict[str, Set[int]] = {}
+        # Index địa danh: tên chuẩn hoá -> vị trí, và danh sách tên đã sắp xếp (tìm theo tiền tố)
+        self._landmarks: Dict[str, Set[int]] = {}
+        self._landmark_keys: List[str] = []
+        # sort -> (khoá đã sắp xếp, vị trí tương ứng); thứ tự ngày upload cũng là index ngày
+        self._orders: Dict[str, Tuple[List[Tuple], List[int]]] = {}
+
+        for item in items:
+            self._append_slot(item)
+            self._index_slot(len(self._slots) - 1, build=True)
+        self._landmark_keys = sorted(self._landmarks)
+        self._order(SORT_UPLOADED_AT)
+
+    # ===== Bảo trì index =====
+
+    def _append_slot(self, item: Dict) -> int:
+        seq = item.get("seq")
+        previous = self._seqs[-1] if self._seqs else 0
+        self._slots.append(item)
+        self._seqs.append(seq if _valid_seq(seq) and seq > previous else previous + 1)
+        self._norms.append("")
+        return len(self._slots) - 1
+
+    def _sort_key(self, sort: str, position: int) -> Tuple:
+        item = self._slots[position]
+        seq = self._seqs[position]
+        if sort == SORT_UPLOADED_AT:
+            return (item.get("uploaded_at") or "", _item_key(item), seq)
+        if sort == SORT_LANDMARK:
+            return (self._norms[position], item.get("uploaded_at") or "", _item_key(item), seq)
+        return (seq,)
+
+    def _order(self, sort: str) -> Tuple[List[Tuple], List[int]]:
+        """Thứ tự theo sort; dựng lần đầu khi cần, sau đó được cập nhật cùng item"""
+        order = self._orders.get(sort)
+        if order is None:
+            keyed = sorted((self._sort_key(sort, position), position)
+                           for position, item in enumerate(self._slots) if item is not None)
+            order = self._orders[sort] = ([key for key, _ in keyed], [position for _, position in keyed])
+        return order
+
+    def _index_slot(self, position: int, build: bool = False):
+        item = self._slots[position]
+        norm = normalize_landmark(item.get("landmark"))
+        self._norms[position] = norm
+        self._live += 1
+        self._total_bytes += item.get("size") or 0
+        if item.get("id"):
+            self._by_id[item["id"]] = position
+        self._by_filename.setdefault(item.get("filename") or "", set()).add(position)
+
+        positions = self._landmarks.get(norm)
+        if positions is None:
+            positions = self._landmarks[norm] = set()
+            if not build:
+                self._landmark_keys.insert(bisect_left(self._landmark_keys, norm), norm)
+        positions.add(position)
+
+        if build:
+            return
+        for sort, (keys, order_positions) in self._orders.items():
+            key = self._sort_key(sort, position)
+            i = bisect_right(keys, key)
+            keys.insert(i, key)
+            order_positions.insert(i, position)
+
+    def _unindex_slot(self, position: int):
+        item = self._slots[position]
+        for sort, (keys, order_positions) in self._orders.items():
+            i = bisect_left(keys, self._sort_key(sort, position))
+            del keys[i]
+            del order_positions[i]
+
+        norm = self._norms[position]
+        positions = self._landmarks[norm]
+        positions.discard(position)
+        if not positions:
+            del self._landmarks[norm]
+            del self._landmark_keys[bisect_left(self._landmark_keys, norm)]
+
+        filename = item.get("filename") or ""
+        self._by_filename[filename].discard(position)
+        if not self._by_filename[filename]:
+            del self._by_filename[filename]
+        if item.get("id") and self._by_id.get(item["id"]) == position:
+            del self._by_id[item["id"]]
+        self._total_bytes -= item.get("size") or 0
+        self._live -= 1
+
+    def add(self, item: Dict) -> int:
+        """Thêm item vào cuối album, trả về vị trí"""
+        with self._lock:
+            position = self._append_slot(item)
+            self._index_slot(position)
+            return position
+
+    def _locate(self, item: Dict) -> Optional[int]:
+        """Vị trí của đúng object item này (item dùng chung với danh sách album của AlbumStore)"""
+        for position in self._by_filename.get(item.get("filename") or "", ()):
+            if self._slots[position] is item:
+                return position
+        return None
+
+    def remove(self, item: Dict) -> bool:
+        with self._lock:
+            position = self._locate(item)
+            if position is None:
+                return False
+            self._unindex_slot(position)
+            self._slots[position] = None
+            return True
+
+    def replace(self, old: Dict, new: Dict) -> bool:
+        """Thay item bằng bản mới ở cùng vị trí (vd. khi có kết quả nhận dạng)"""
+        with self._lock:
+            position = self._locate(old)
+            if position is None:
+                return False
+            self._unindex_slot(position)
+            # Giữ seq cũ: sửa item không đổi vị trí trong album
+            self._slots[position] = new
+            self._index_slot(position)
+            return True
+
+    # ===== Truy cập item =====
+
+    def __len__(self) -> int:
+        return self._live
+
+    @property
+    def tombstones(self) -> int:
+        return len(self._slots) - self._live
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, position: int) -> Optional[Dict]:
+        return self._slots[position]
+
+    def find_by_id(self, item_id: str) -> Optional[Dict]:
+        position = self._by_id.get(item_id)
+        return self._slots[position] if position is not None else None
+
+    def find_by_filename(self, filename: str) -> Optional[Dict]:
+        """Ảnh đầu tiên trong album có tên file này"""
+        with self._lock:
+            positions = self._by_filename.get(filename)
+            return self._slots[min(positions)] if positions else None
+
+    def items(self) -> List[Dict]:
+        """Các item còn lại theo thứ tự trong album"""
+        with self._lock:
+            return [item for item in self._slots if item is not None]
+
+    # ===== Tìm kiếm =====
+
+    def match_landmarks(self, query: str) -> List[str]:
+        """
+        Tên địa danh (chuẩn hoá) khớp với query: chứa query (không phân biệt dấu, hoa thường),
+        nếu không có thì lấy các tên gần giống nhất
+        """
+        needle = normalize_landmark(query)
+        if not needle:
+            return []
+        with self._lock:
+            # Tiền tố tìm bằng bisect; chứa ở giữa thì quét danh sách tên địa danh (ít hơn nhiều so với số ảnh)
+            start = bisect_left(self._landmark_keys, needle)
+            end = bisect_left(self._landmark_keys, needle + _PREFIX_END)
+            matches = self._landmark_keys[start:end]
+            matches += [key for key in self._landmark_keys[:start] + self._landmark_keys[end:] if needle in key]
+            if not matches:
+                matches = difflib.get_close_matches(needle, self._landmark_keys, n=FUZZY_MATCHES, cutoff=FUZZY_CUTOFF)
+            return matches
+
+    def landmark_positions(self, query: str) -> Set[int]:
+        with self._lock:
+            positions: Set[int] = set()
+            for key in self.match_landmarks(query):
+                positions |= self._landmarks[key]
+            return positions
+
+    def date_positions(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> Set[int]:
+        """Vị trí các ảnh upload trong khoảng [date_from, date_to] (YYYY-MM-DD, tính cả hai đầu)"""
+        with self._lock:
+            keys, positions = self._order(SORT_UPLOADED_AT)
+            # uploaded_at là chuỗi ISO nên thứ tự chuỗi trùng thứ tự thời gian
+            start = bisect_left(keys, (date_from,)) if date_from else 0
+            end = bisect_left(keys, (date_to + _PREFIX_END,)) if date_to else len(keys)
+            return set(positions[start:end])
+
+    def date_bounds(self) -> Tuple[str, str]:
+        """(uploaded_at sớm nhất, muộn nhất); ("", "") nếu album rỗng"""
+        with self._lock:
+            keys, _ = self._order(SORT_UPLOADED_AT)
+            if not keys:
+                return "", ""
+            return keys[0][0], keys[-1][0]
+
+    def landmark_groups(self) -> Dict[str, List[int]]:
+        """
+        Tên địa danh -> vị trí các ảnh (theo thứ tự trong album).
+        Các cách viết khác nhau (dấu, hoa thường) gộp chung, tên hiển thị lấy từ ảnh đầu tiên.
+        """
+        with self._lock:
+            groups: Dict[str, List[int]] = {}
+            for positions in self._landmarks.values():
+                ordered = sorted(positions)
+                name = self._slots[ordered[0]].get("landmark") or UNKNOWN_LANDMARK
+                groups.setdefault(name, []).extend(ordered)
+            return groups
+
+    # ===== Phân trang =====
+
+    def _iter_positions(self, sort: str, order: str, after: Optional[Tuple],
+                        candidates: Optional[Set[int]]) -> Iterable[int]:
+        """Vị trí item theo thứ tự, bắt đầu ngay sau khoá `after` (cursor)"""
+        if candidates is not None:
+            # Chỉ sắp xếp tập kết quả của bộ lọc
+            keyed = sorted((self._sort_key(sort, position), position) for position in candidates)
+            keys, positions = [key for key, _ in keyed], [position for _, position in keyed]
+        elif sort == SORT_POSITION:
+            # Thứ tự gốc: slot đã tăng dần theo seq, bisect thẳng trên _seqs
+            keys, positions = self._seqs, range(len(self._slots))
+            after = after[0] if after is not None else None
+        else:
+            keys, positions = self._order(sort)
+
+        if order == "asc":
+            start = 0 if after is None else bisect_right(keys, after)
+            indices = range(max(0, start), len(positions))
+        else:
+            end = len(positions) if after is None else bisect_left(keys, after)
+            indices = range(min(end, len(positions)) - 1, -1, -1)
+        # Duyệt theo chỉ số (không cắt list) để mỗi trang chỉ tốn O(limit)
+        return (positions[i] for i in indices)
+
+    def page(self, sort: str = SORT_POSITION, order: str = "asc", cursor: Optional[str] = None,
+             limit: Optional[int] = None, fields: Optional[Iterable[str]] = None,
+             candidates: Optional[Set[int]] = None) -> Dict:
+        """
+        Một trang kết quả: {"images", "positions", "next_cursor", "has_more"}
+        (positions: vị trí của từng ảnh, để caller đọc field không có trong projection).
+        candidates: tập vị trí đã lọc bằng landmark_positions/date_positions (None = cả album).
+        """
+        after = decode_cursor(cursor, sort, order) if cursor else None
+        with self._lock:
+            images, positions, has_more = [], [], False
+            for position in self._iter_positions(sort, order, after, candidates):
+                item = self._slots[position]
+                if item is None:
+                    continue
+                if limit is not None and len(images) >= limit:
+                    has_more = True
+                    break
+                images.append(project(item, fields))
+                positions.append(position)
+
+            next_cursor = None
+            if has_more and positions:
+                next_cursor = encode_cursor(sort, order, self._sort_key(sort, positions[-1]))
+        return {"images": images, "positions": positions, "next_cursor": next_cursor, "has_more": has_more}
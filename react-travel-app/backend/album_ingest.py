@@ -0,0 +1,181 @@
+"""
+Album Ingest Module - Pipeline thêm nhiều ảnh vào album cùng lúc
+- Đọc, kiểm tra và decode ảnh trong thread pool (không block event loop)
+- Nhận dạng địa danh song song, giới hạn bởi semaphore cho mỗi lần upload
+  (và giới hạn chung của model_client)
+- Tiến độ từng file (đã decode, đã nhận dạng) được báo ngay khi file đó xong, không chờ file khác
+- Mỗi ảnh được ghi vào album ngay khi nó và mọi ảnh đứng trước đã xử lý xong (chỉ bước commit
+  theo đúng thứ tự upload, ảnh xong sớm chờ ảnh trước), kết quả trả về theo từng file
+"""
+
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from PIL import Image
+
+from ai_client import model_client
+from blob_store import blob_store
+from districts import find_district
+from image_derivatives import derivative_store
+from vision_preprocess import vision_preprocessor
+
+# Số file xử lý đồng thời trong một lần upload (đọc -> decode -> nhận dạng -> ghi)
+INGEST_MAX_PARALLEL = int(os.getenv('INGEST_MAX_PARALLEL', '8'))
+# Số thread decode/lưu ảnh dùng chung cho mọi upload
+INGEST_DECODE_WORKERS = int(os.getenv('INGEST_DECODE_WORKERS', '4'))
+
+# Sự kiện ingest_uploads yield: tiến độ (theo thứ tự xong) và kết quả cuối của từng file
+STAGE_DECODED = "decoded"
+STAGE_RECOGNIZED = "recognized"
+STAGE_DONE = "done"
+
+_decode_executor = ThreadPoolExecutor(max_workers=INGEST_DECODE_WORKERS, thread_name_prefix="album-ingest")
+
+
+def prepare_upload(filename: str, content_type: str, image_bytes: bytes, album_name: str,
+                   gps_reader: Callable, decode: bool) -> Dict:
+    """
+    Chạy trong thread pool: kiểm tra ảnh hợp lệ, lưu vào blob store (kèm thumbnail), đọc GPS.
+    Trả về {"item": item chưa có kết quả nhận dạng, "image": PIL image (nếu decode=True)}.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    if decode:
+        # Chỉ decode ở độ phân giải gửi cho model (xoay theo EXIF, thu nhỏ, JPEG draft)
+        image = vision_preprocessor.prepare(image)
+        image.load()
+    else:
+        image.verify()
+
+    gps = gps_reader(BytesIO(image_bytes))
+    image_hash = blob_store.put(image_bytes)
+    try:
+        # Thumbnail cho gallery; ảnh đã decode cho model thì dùng luôn, khỏi decode lại
+        derivative_store.generate(image_hash, image=image if decode else None)
+    except Exception as e:
+        # Không chặn upload: derivative sẽ được tạo lazily khi có request
+        print(f"[ADD IMAGES] Cannot create derivatives for {filename}: {e}")
+
+    item = {
+        "id": uuid.uuid4().hex,
+        "filename": filename,
+        "image_hash": image_hash,
+        "size": len(image_bytes),
+        "content_type": content_type,
+        "uploaded_at": datetime.now().isoformat(),
+        "album_name": album_name,
+        "landmark": "N/A",
+        "description": "",
+        "confidence": "low",
+        "gps": {"lat": gps[0], "lon": gps[1]} if gps else None,
+        "district": find_district(*gps) if gps else None
+    }
+    return {"item": item, "image": image if decode else None}
+
+
+async def ingest_uploads(files: List, album_name: str, commit: Callable[[Dict], None],
+                         gps_reader: Callable, recognize: Optional[Callable] = None,
+                         max_parallel: int = INGEST_MAX_PARALLEL) -> AsyncIterator[Dict]:
+    """
+    Xử lý các UploadFile song song, yield các sự kiện:
+    - {"index", "filename", "stage": STAGE_DECODED / STAGE_RECOGNIZED}: ngay khi file đó decode /
+      nhận dạng xong (theo thứ tự xong, không chờ file đứng trước)
+    - {"index", "filename", "stage": STAGE_DONE, "success", "item"} hoặc {..., "success": False, "error"}:
+      kết quả cuối; file lỗi được báo ngay, file thành công được báo sau khi commit.
+    commit(item) được gọi (trong thread pool) lần lượt theo thứ tự upload, nên thứ tự ảnh
+    trong album (gallery, ZIP, sort position) giống như khi thêm từng ảnh một.
+    recognize(image_pil) -> dict; None thì không nhận dạng.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+    events: asyncio.Queue = asyncio.Queue()
+
+    def progress(index: int, file, stage: str):
+        events.put_nowait({"index": index, "filename": file.filename, "stage": stage})
+
+    async def process(index: int, file) -> Dict:
+        result = {"index": index, "filename": file.filename, "stage": STAGE_DONE, "success": False}
+        if not (file.content_type or "").startswith('image/'):
+            result["error"] = "Không phải file ảnh"
+            return result
+
+        async with semaphore:
+            try:
+                image_bytes = await file.read()
+                try:
+                    prepared = await loop.run_in_executor(
+                        _decode_executor, prepare_upload, file.filename, file.content_type,
+                        image_bytes, album_name, gps_reader, recognize is not None
+                    )
+                except Exception as e:
+                    print(f"[ADD IMAGES] Invalid image {file.filename}: {e}")
+                    result["error"] = "Ảnh không hợp lệ hoặc bị hỏng"
+                    return result
+                item = prepared["item"]
+                progress(index, file, STAGE_DECODED)
+
+                if recognize is not None:
+                    try:
+                        recognition = await model_client.run(recognize, prepared["image"])
+                        item["landmark"] = recognition.get("landmark", "N/A")
+                        item["description"] = recognition.get("description", "")
+                        item["confidence"] = recognition.get("confidence", "low")
+                    except Exception as e:
+                        item["landmark"] = "Không rõ địa danh"
+                        item["description"] = f"Lỗi: {str(e)[:50]}"
+                        item["confidence"] = "low"
+                    progress(index, file, STAGE_RECOGNIZED)
+
+                result.update(success=True, item=item)
+            except Exception as e:
+                result["error"] = str(e)
+            return result
+
+    async def run(index: int, file):
+        events.put_nowait(await process(index, file))
+
+    async def commit_result(result: Dict) -> Dict:
+        if not result["success"]:
+            return result
+        item = result["item"]
+        # Thời điểm thêm vào album, tăng dần theo thứ tự upload như khi thêm tuần tự
+        item["uploaded_at"] = datetime.now().isoformat()
+        try:
+            await loop.run_in_executor(_decode_executor, commit, item)
+        except Exception as e:
+            return {"index": result["index"], "filename": result["filename"], "stage": STAGE_DONE,
+                    "success": False, "error": str(e)}
+        print(f"[ADD IMAGES] ✓ {result['filename']} -> {item['landmark']} (blob {item['image_hash'][:12]})")
+        return result
+
+    tasks = [asyncio.ensure_future(run(index, file)) for index, file in enumerate(files)]
+    # Ảnh xử lý xong chờ commit / index của file lỗi (không cần commit)
+    ready: Dict[int, Dict] = {}
+    failed = set()
+    next_index = 0
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await events.get()
+            if event["stage"] != STAGE_DONE:
+                yield event
+                continue
+            remaining -= 1
+            if event["success"]:
+                ready[event["index"]] = event
+            else:
+                failed.add(event["index"])
+                yield event
+            # Ảnh xong sớm được giữ lại tới khi các ảnh đứng trước đã commit
+            while next_index in ready or next_index in failed:
+                if next_index in ready:
+                    yield await commit_result(ready.pop(next_index))
+                next_index += 1
+    finally:
+        # Client ngắt kết nối giữa chừng: huỷ các file chưa xử lý xong
+        for task in tasks:
+            task.cancel()
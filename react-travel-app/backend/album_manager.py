@@ -1,19 +1,96 @@
 import json
+import os
+import time
 from datetime import datetime
 from io import BytesIO
-from zipfile import ZipFile, ZIP_DEFLATED
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
+from album_index import AlbumIndex
 # import streamlit as st  # Not needed for FastAPI
 
+ZIP_CHUNK_SIZE = 64 * 1024
+
+# Định dạng đã nén sẵn: DEFLATE gần như không giảm dung lượng, chỉ tốn CPU
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".zip"}
+
+class _ZipStreamBuffer:
+    """File-like object chỉ ghi: giữ các chunk ZipFile vừa ghi cho đến khi được lấy ra."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _unique_arcname(filename, used_names):
+    """Tránh trùng tên file trong ZIP: a.jpg, a (1).jpg, a (2).jpg..."""
+    name = filename.replace('/', '_').replace('\\', '_')
+    if name not in used_names:
+        used_names.add(name)
+        return name
+    stem, ext = os.path.splitext(name)
+    i = 1
+    while f"{stem} ({i}){ext}" in used_names:
+        i += 1
+    name = f"{stem} ({i}){ext}"
+    used_names.add(name)
+    return name
+
+def _iter_zip_raw(entries):
+    buf = _ZipStreamBuffer()
+    used_names = set()
+    with ZipFile(buf, "w") as zf:
+        for filename, source in entries:
+            arcname = _unique_arcname(filename, used_names)
+            zinfo = ZipInfo(arcname, date_time=time.localtime()[:6])
+            ext = os.path.splitext(arcname)[1].lower()
+            zinfo.compress_type = ZIP_STORED if ext in STORED_EXTENSIONS else ZIP_DEFLATED
+
+            with zf.open(zinfo, "w") as dest:
+                if isinstance(source, (bytes, bytearray)):
+                    view = memoryview(source)
+                    for start in range(0, len(view), ZIP_CHUNK_SIZE):
+                        dest.write(view[start:start + ZIP_CHUNK_SIZE])
+                        yield buf.drain()
+                else:
+                    with open(source, "rb") as f:
+                        while True:
+                            chunk = f.read(ZIP_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            dest.write(chunk)
+                            yield buf.drain()
+            yield buf.drain()
+    # Central directory được ghi khi đóng ZipFile
+    yield buf.drain()
+
+def iter_zip_chunks(entries):
+    """
+    Tạo file ZIP dạng stream, trả về từng chunk bytes ngay khi ghi xong.
+    
+    Args:
+        entries: Iterable các tuple (filename, source), source là bytes
+                 hoặc đường dẫn file trên đĩa (đọc theo từng chunk)
+    
+    Bộ nhớ dùng luôn bị giới hạn ở cỡ một chunk, không phụ thuộc kích thước album.
+    Ảnh JPEG/PNG... được lưu ZIP_STORED, các file khác dùng ZIP_DEFLATED.
+    """
+    for chunk in _iter_zip_raw(entries):
+        if chunk:
+            yield chunk
+
 def zip_album(album_name, items):
-    """Tạo file ZIP chứa tất cả ảnh trong album."""
-    buf = BytesIO()
-    with ZipFile(buf, "w", ZIP_DEFLATED) as zf:
-        for item in items:
-            zf.writestr(item["filename"], item["bytes"])
-    buf.seek(0)
-    return buf
+    """Tạo file ZIP chứa tất cả ảnh trong album (generator trả về từng chunk)."""
+    return iter_zip_chunks((item["filename"], item["bytes"]) for item in items)
 
 def create_pdf_album(album_items):
     """Tạo file PDF từ album ảnh với thông tin chi tiết."""
@@ -148,29 +225,34 @@ def add_images_to_album(album_storage, album_name, files, recognize_function=Non
     album_storage[album_name] = bucket
     return success_count, len(files), errors
 
+def _as_index(items):
+    """AlbumIndex của album: dùng luôn nếu đã là index (AlbumStore), ngược lại dựng từ danh sách item."""
+    return items if isinstance(items, AlbumIndex) else AlbumIndex(items)
+
 def filter_album_items(items, search_landmark=None, search_date=None):
-    """Lọc các item trong album theo tiêu chí."""
-    filtered_items = items
+    """Lọc các item trong album theo tiêu chí (tra index địa danh/ngày, không quét cả album)."""
+    index = _as_index(items)
+    positions = None
     
     if search_landmark:
-        filtered_items = [i for i in filtered_items 
-                         if search_landmark.lower() in i.get('landmark', '').lower()]
+        positions = index.landmark_positions(search_landmark)
     
     if search_date:
-        filtered_items = [i for i in filtered_items 
-                         if datetime.fromisoformat(i['uploaded_at']).date() == search_date]
+        day = search_date.isoformat() if hasattr(search_date, 'isoformat') else str(search_date)
+        by_date = index.date_positions(day, day)
+        positions = by_date if positions is None else positions & by_date
     
-    return filtered_items
+    if positions is None:
+        return index.items()
+    return [index.get(position) for position in sorted(positions)]
 
 def group_items_by_landmark(items):
-    """Nhóm các item theo địa danh."""
-    groups = {}
-    for item in items:
-        landmark = item.get('landmark', 'Chưa nhận dạng')
-        if landmark not in groups:
-            groups[landmark] = []
-        groups[landmark].append(item)
-    return groups
+    """Nhóm các item theo địa danh (đọc từ index địa danh của album)."""
+    index = _as_index(items)
+    return {
+        landmark: [index.get(position) for position in positions]
+        for landmark, positions in index.landmark_groups().items()
+    }
 
 def sort_items_by_date(items, reverse=True):
     """Sắp xếp các item theo ngày tải lên."""
@@ -178,18 +260,19 @@ def sort_items_by_date(items, reverse=True):
 
 def get_album_stats(album_storage):
     """Lấy thống kê tổng quan về các album."""
+    indexes = {album_name: _as_index(items) for album_name, items in album_storage.items()}
     stats = {
-        "total_albums": len(album_storage),
-        "total_images": sum(len(items) for items in album_storage.values()),
+        "total_albums": len(indexes),
+        "total_images": sum(len(index) for index in indexes.values()),
         "albums_detail": {}
     }
     
-    for album_name, items in album_storage.items():
-        landmarks = set(item.get('landmark', 'N/A') for item in items)
+    for album_name, index in indexes.items():
+        landmarks = list(index.landmark_groups())
         stats["albums_detail"][album_name] = {
-            "image_count": len(items),
+            "image_count": len(index),
             "landmark_count": len(landmarks),
-            "landmarks": list(landmarks)
+            "landmarks": landmarks
         }
     
     return stats
@@ -0,0 +1,478 @@
+"""
+Album Store Module - Lưu album theo từng user (sharded) thay vì một file Users_album.json duy nhất
+Mỗi user có một file shard riêng; index.json chỉ ánh xạ email -> shard
+nên chi phí mỗi request chỉ phụ thuộc vào dữ liệu của chính user đó.
+Shard đã parse được cache trong bộ nhớ (LRU, kiểm tra lại bằng os.stat) cùng với
+AlbumIndex của từng album để phân trang/tìm kiếm không phải đọc lại cả album.
+Các thao tác theo item (add_item, update_item, remove_item) cập nhật AlbumIndex
+tại chỗ; save/update ghi cả shard nên index được dựng lại khi cần.
+Mỗi item có "seq" tăng dần theo thứ tự trong album (cursor phân trang dựa vào seq);
+item cũ chưa có seq được gán khi đọc shard và lưu lại ở lần ghi tiếp theo.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Set, Tuple, TypeVar
+import logging
+
+from album_index import AlbumIndex, assign_sequence, next_sequence
+from blob_store import guess_image_type
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+# Số shard (user) giữ trong bộ nhớ
+ALBUM_SHARD_CACHE_SIZE = int(os.getenv('ALBUM_SHARD_CACHE_SIZE', '32'))
+# Dựng lại AlbumIndex khi số slot rỗng (ảnh đã xoá) vượt quá số ảnh còn lại và ngưỡng này
+ALBUM_INDEX_COMPACT_MIN = 64
+
+T = TypeVar("T")
+
+
+def _write_json_atomic(path: str, data) -> None:
+    """Ghi JSON ra file tạm rồi os.replace để không bao giờ để lại file ghi dở."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class AlbumStore:
+    """
+    Lưu trữ album theo shard cho từng user
+    - Mỗi user: <root_dir>/<sha1(email)>.json chứa {album_name: [items]}
+    - index.json: {"version": 1, "users": {email: shard_file}}
+    - Index chỉ được ghi lại khi có user mới, không ghi lại ở mỗi request
+    """
+
+    def __init__(self, root_dir: str = "Users_album", cache_size: int = ALBUM_SHARD_CACHE_SIZE):
+        self.root_dir = root_dir
+        self.cache_size = cache_size
+        self.index_file = os.path.join(root_dir, "index.json")
+        os.makedirs(root_dir, exist_ok=True)
+
+        self._index_lock = Lock()
+        self._user_locks: Dict[str, Lock] = {}
+        self._user_locks_lock = Lock()
+
+        # email -> {"signature", "albums", "indexes": {album_name: AlbumIndex}}; albums chỉ đọc
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._cache_lock = Lock()
+        self._cache_stats = {"hits": 0, "misses": 0}
+
+        self._index = self._load_index()
+
+    # ===== Index =====
+
+    def _load_index(self) -> Dict:
+        """Tải index từ file"""
+        if not os.path.exists(self.index_file):
+            return {"version": INDEX_VERSION, "users": {}}
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data.setdefault("users", {})
+            return data
+        except json.JSONDecodeError as e:
+            logger.error(f"Album index corrupted, rebuilding from shards: {e}")
+            return self._rebuild_index()
+
+    def _shard_files(self) -> List[str]:
+        return [name for name in os.listdir(self.root_dir)
+                if name.endswith(".json") and name != "index.json" and not name.startswith(".tmp_")]
+
+    def _read_shard_email(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root_dir, name), "r", encoding="utf-8") as f:
+                return json.load(f)["user_email"]
+        except Exception:
+            return None
+
+    def _rebuild_index(self) -> Dict:
+        """Dựng lại index từ các shard hiện có (mỗi shard lưu kèm email của user)"""
+        users = {}
+        for name in self._shard_files():
+            user_email = self._read_shard_email(name)
+            if user_email:
+                users[user_email] = name
+        return {"version": INDEX_VERSION, "users": users}
+
+    def _merge_disk_index_locked(self):
+        """Gộp user mà process khác đã ghi vào index.json; gọi khi đang giữ _index_lock"""
+        for user_email, shard in self._load_index()["users"].items():
+            self._index["users"].setdefault(user_email, shard)
+
+    def refresh_index(self) -> int:
+        """
+        Nạp thêm user do process (uvicorn worker) khác tạo: từ index.json và từ các file shard
+        chưa có trong index. Trả về số user mới.
+        """
+        with self._index_lock:
+            before = len(self._index["users"])
+            self._merge_disk_index_locked()
+            known = set(self._index["users"].values())
+        missing = {}
+        for name in self._shard_files():
+            if name not in known:
+                user_email = self._read_shard_email(name)
+                if user_email:
+                    missing[user_email] = name
+        with self._index_lock:
+            for user_email, shard in missing.items():
+                self._index["users"].setdefault(user_email, shard)
+            return len(self._index["users"]) - before
+
+    def _register_user(self, user_email: str) -> str:
+        """Thêm user vào index nếu chưa có, trả về tên file shard"""
+        with self._index_lock:
+            shard = self._index["users"].get(user_email)
+            if shard is None:
+                shard = self.shard_name(user_email)
+                # Không ghi đè user mà process khác vừa thêm vào index.json
+                self._merge_disk_index_locked()
+                self._index["users"][user_email] = shard
+                _write_json_atomic(self.index_file, self._index)
+            return shard
+
+    @staticmethod
+    def shard_name(user_email: str) -> str:
+        """Tên file shard cố định theo email"""
+        return hashlib.sha1(user_email.encode("utf-8")).hexdigest() + ".json"
+
+    def _shard_path(self, user_email: str) -> str:
+        shard = self._index["users"].get(user_email) or self.shard_name(user_email)
+        return os.path.join(self.root_dir, shard)
+
+    def _user_lock(self, user_email: str) -> Lock:
+        with self._user_locks_lock:
+            lock = self._user_locks.get(user_email)
+            if lock is None:
+                lock = self._user_locks[user_email] = Lock()
+            return lock
+
+    # ===== Public API =====
+
+    def list_users(self) -> List[str]:
+        """Danh sách email có album"""
+        with self._index_lock:
+            return list(self._index["users"].keys())
+
+    # ===== Shard cache =====
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        # Ghi atomic bằng os.replace tạo inode mới nên inode cũng là một phần của signature
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _remember(self, user_email: str, signature: Optional[Tuple], albums: Dict[str, List[Dict]]) -> Dict:
+        # Gán seq xác định theo thứ tự danh sách nên đọc lại cùng file luôn ra cùng seq
+        for items in albums.values():
+            assign_sequence(items)
+        entry = {"signature": signature, "albums": albums, "indexes": {}}
+        if signature is None:
+            return entry
+        with self._cache_lock:
+            self._cache[user_email] = entry
+            self._cache.move_to_end(user_email)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _cached_shard(self, user_email: str) -> Dict:
+        """Entry cache của shard (đọc lại file nếu đã bị process khác sửa); gọi khi đang giữ user lock"""
+        path = self._shard_path(user_email)
+        signature = self._signature(path)
+        with self._cache_lock:
+            entry = self._cache.get(user_email)
+            if entry is not None and entry["signature"] == signature:
+                self._cache.move_to_end(user_email)
+                self._cache_stats["hits"] += 1
+                return entry
+            self._cache_stats["misses"] += 1
+
+        if signature is None:
+            return self._remember(user_email, None, {})
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                shard = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.error(f"Album shard corrupted for {user_email}: {e}")
+            return self._remember(user_email, None, {})
+        return self._remember(user_email, signature, shard.get("albums", {}))
+
+    def _read_shard(self, user_email: str) -> Dict[str, List[Dict]]:
+        """Bản sao album của user (copy từng item) để caller sửa thoải mái"""
+        albums = self._cached_shard(user_email)["albums"]
+        return {name: [dict(item) for item in items] for name, items in albums.items()}
+
+    def _write_shard(self, user_email: str, path: str, albums: Dict[str, List[Dict]]):
+        """Ghi shard và cập nhật cache luôn (không phải parse lại ở request sau); gọi khi đang giữ user lock"""
+        _write_json_atomic(path, {"user_email": user_email, "albums": albums})
+        self._remember(user_email, self._signature(path), albums)
+
+    def _modify(self, user_email: str, change: Callable[[Dict], T]) -> T:
+        """
+        Sửa trực tiếp entry cache (albums + indexes) rồi ghi shard, giữ nguyên các index.
+        change(entry) phải thay dict item bằng dict mới chứ không sửa tại chỗ (reader đang dùng item cũ).
+        """
+        shard = self._register_user(user_email)
+        path = os.path.join(self.root_dir, shard)
+        with self._user_lock(user_email):
+            entry = self._cached_shard(user_email)
+            try:
+                result = change(entry)
+                _write_json_atomic(path, {"user_email": user_email, "albums": entry["albums"]})
+            except Exception:
+                # Cache có thể đã lệch với file: bỏ để lần sau đọc lại
+                with self._cache_lock:
+                    self._cache.pop(user_email, None)
+                raise
+            signature = self._signature(path)
+            if entry["signature"] is None:
+                self._remember(user_email, signature, entry["albums"])
+            else:
+                entry["signature"] = signature
+        return result
+
+    def load(self, user_email: str) -> Dict[str, List[Dict]]:
+        """Tải toàn bộ album của một user (chỉ đọc shard của user đó)"""
+        with self._user_lock(user_email):
+            return self._read_shard(user_email)
+
+    def save(self, user_email: str, albums: Dict[str, List[Dict]]) -> None:
+        """Ghi lại shard của một user (caller không được sửa `albums` sau khi save)"""
+        shard = self._register_user(user_email)
+        path = os.path.join(self.root_dir, shard)
+        with self._user_lock(user_email):
+            self._write_shard(user_email, path, albums)
+
+    def update(self, user_email: str, mutate: Callable[[Dict[str, List[Dict]]], T]) -> T:
+        """
+        Đọc - sửa - ghi shard của một user trong cùng một lock,
+        để nhiều request/task ghi cùng lúc không ghi đè thay đổi của nhau.
+        """
+        shard = self._register_user(user_email)
+        path = os.path.join(self.root_dir, shard)
+        with self._user_lock(user_email):
+            albums = self._read_shard(user_email)
+            result = mutate(albums)
+            self._write_shard(user_email, path, albums)
+        return result
+
+    def ensure_album(self, user_email: str, album_name: str) -> bool:
+        """Tạo album rỗng nếu chưa có (không ghi gì nếu đã có), trả về True nếu vừa tạo"""
+        with self._user_lock(user_email):
+            if album_name in self._cached_shard(user_email)["albums"]:
+                return False
+
+        def change(entry):
+            # Request khác có thể vừa tạo album giữa lần kiểm tra trên và lúc giữ lock
+            if album_name in entry["albums"]:
+                return False
+            entry["albums"][album_name] = []
+            return True
+
+        return self._modify(user_email, change)
+
+    def delete_album(self, user_email: str, album_name: str) -> bool:
+        def change(entry):
+            entry["indexes"].pop(album_name, None)
+            return entry["albums"].pop(album_name, None) is not None
+
+        return self._modify(user_email, change)
+
+    def add_item(self, user_email: str, album_name: str, item: Dict) -> None:
+        """Thêm một ảnh vào cuối album (tạo album nếu chưa có)"""
+        def change(entry):
+            items = entry["albums"].setdefault(album_name, [])
+            item["seq"] = next_sequence(items)
+            items.append(item)
+            index = entry["indexes"].get(album_name)
+            if index is not None:
+                index.add(item)
+
+        self._modify(user_email, change)
+
+    def update_item(self, user_email: str, item_id: str, changes: Dict) -> Optional[str]:
+        """Cập nhật các field của item có id này, trả về tên album chứa item (None nếu không thấy)"""
+        def change(entry):
+            for album_name, items in entry["albums"].items():
+                for i, item in enumerate(items):
+                    if item.get("id") == item_id:
+                        items[i] = {**item, **changes}
+                        index = entry["indexes"].get(album_name)
+                        if index is not None:
+                            index.replace(item, items[i])
+                        return album_name
+            return None
+
+        return self._modify(user_email, change)
+
+    def remove_item(self, user_email: str, album_name: str, filename: str) -> Optional[int]:
+        """
+        Xoá ảnh đầu tiên có tên file này khỏi album.
+        Trả về số ảnh còn lại; None nếu album hoặc ảnh không tồn tại.
+        """
+        with self._user_lock(user_email):
+            items = self._cached_shard(user_email)["albums"].get(album_name)
+            if items is None or not any(item.get("filename") == filename for item in items):
+                return None
+
+        def change(entry):
+            items = entry["albums"].get(album_name) or []
+            for i, item in enumerate(items):
+                if item.get("filename") == filename:
+                    del items[i]
+                    index = entry["indexes"].get(album_name)
+                    if index is not None:
+                        index.remove(item)
+                    return len(items)
+            return None
+
+        return self._modify(user_email, change)
+
+    def album_index(self, user_email: str, album_name: str) -> Optional[AlbumIndex]:
+        """
+        AlbumIndex của một album (None nếu album không tồn tại), dựng lần đầu và cache
+        tới khi shard bị ghi lại toàn bộ. Item trong index dùng chung với cache: chỉ đọc.
+        """
+        with self._user_lock(user_email):
+            entry = self._cached_shard(user_email)
+            index = entry["indexes"].get(album_name)
+            if index is not None and index.tombstones > max(ALBUM_INDEX_COMPACT_MIN, len(index)):
+                index = None
+            if index is None:
+                items = entry["albums"].get(album_name)
+                if items is None:
+                    return None
+                index = entry["indexes"][album_name] = AlbumIndex(items)
+            return index
+
+    def album_indexes(self, user_email: str) -> Dict[str, AlbumIndex]:
+        """AlbumIndex của mọi album của user (thống kê, nhóm theo địa danh)"""
+        with self._user_lock(user_email):
+            names = list(self._cached_shard(user_email)["albums"])
+        indexes = {}
+        for name in names:
+            index = self.album_index(user_email, name)
+            if index is not None:
+                indexes[name] = index
+        return indexes
+
+    def referenced_hashes(self) -> Set[str]:
+        """Hash blob mà ảnh trong album của mọi user đang dùng (phần mark của blob_gc)"""
+        # Index trong bộ nhớ có thể thiếu user do worker khác tạo: blob của họ không được coi là mồ côi
+        self.refresh_index()
+        hashes = set()
+        for user_email in self.list_users():
+            with self._user_lock(user_email):
+                albums = self._cached_shard(user_email)["albums"]
+                for items in albums.values():
+                    hashes.update(item["image_hash"] for item in items if item.get("image_hash"))
+        return hashes
+
+    def get_cache_stats(self) -> Dict:
+        with self._cache_lock:
+            lookups = self._cache_stats["hits"] + self._cache_stats["misses"]
+            return {
+                **self._cache_stats,
+                "cached_users": len(self._cache),
+                "hit_rate": round(self._cache_stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+    # ===== Migration =====
+
+    def is_migrated(self) -> bool:
+        return bool(self._index.get("migrated_from"))
+
+    def migrate_from_file(self, legacy_file: str) -> int:
+        """
+        Chuyển dữ liệu từ Users_album.json (một file cho tất cả user) sang shard.
+        Chỉ chạy một lần; file cũ được giữ nguyên để có thể rollback.
+        Trả về số user đã chuyển.
+        """
+        if self.is_migrated() or not os.path.exists(legacy_file):
+            return 0
+
+        try:
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                all_albums = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.error(f"Cannot migrate {legacy_file}: {e}")
+            return 0
+
+        migrated = 0
+        with self._index_lock:
+            for user_email, albums in all_albums.items():
+                # Không ghi đè shard đã có dữ liệu mới hơn
+                shard = self._index["users"].get(user_email) or self.shard_name(user_email)
+                path = os.path.join(self.root_dir, shard)
+                if not os.path.exists(path):
+                    _write_json_atomic(path, {"user_email": user_email, "albums": albums})
+                    migrated += 1
+                self._index["users"][user_email] = shard
+
+            self._index["migrated_from"] = os.path.abspath(legacy_file)
+            _write_json_atomic(self.index_file, self._index)
+
+        logger.info(f"Migrated albums of {migrated} users from {legacy_file}")
+        return migrated
+
+    def migrate_inline_images(self, blob_store) -> int:
+        """
+        Chuyển ảnh base64 nằm trong item (image_data / bytes) sang blob store,
+        item chỉ còn giữ image_hash. Chỉ chạy một lần.
+        Trả về số ảnh đã chuyển.
+        """
+        if self._index.get("inline_images_migrated"):
+            return 0
+
+        migrated = 0
+        for user_email in self.list_users():
+            albums = self.load(user_email)
+            changed = False
+            for items in albums.values():
+                for item in items:
+                    if item.get("image_hash"):
+                        continue
+                    encoded = item.get("image_data") or item.get("bytes")
+                    if not isinstance(encoded, str) or not encoded:
+                        continue
+                    if "base64," in encoded:
+                        encoded = encoded.split("base64,", 1)[1]
+                    try:
+                        image_bytes = base64.b64decode(encoded)
+                    except Exception as e:
+                        logger.warning(f"Skip undecodable image {item.get('filename')}: {e}")
+                        continue
+                    item["image_hash"] = blob_store.put(image_bytes)
+                    item["size"] = len(image_bytes)
+                    item["content_type"] = guess_image_type(image_bytes)
+                    item.pop("image_data", None)
+                    item.pop("bytes", None)
+                    changed = True
+                    migrated += 1
+            if changed:
+                self.save(user_email, albums)
+
+        with self._index_lock:
+            self._index["inline_images_migrated"] = True
+            _write_json_atomic(self.index_file, self._index)
+
+        logger.info(f"Moved {migrated} inline album images to blob store")
+        return migrated
@@ -0,0 +1,85 @@
+"""
+Benchmark: thời gian lấy một trang 50 ảnh khi album lớn dần
+so sánh cách cũ (đọc shard, copy và lọc cả album) với AlbumIndex + cursor.
+
+Chạy: python bench_album_pagination.py
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from album_store import AlbumStore
+
+ALBUM_SIZES = [500, 5000, 20000]
+PAGE_SIZE = 50
+ROUNDS = 20
+LANDMARKS = ["Chợ Bến Thành", "Nhà thờ Đức Bà", "Landmark 81", "Dinh Độc Lập", "Bưu điện Thành phố"]
+
+
+def make_items(n):
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "id": f"{i:032x}",
+            "filename": f"img_{i}.jpg",
+            "image_hash": f"{i:064x}",
+            "uploaded_at": (start + timedelta(minutes=i * 7 % (n * 3))).isoformat(),
+            "landmark": LANDMARKS[i % len(LANDMARKS)],
+            "description": "Mô tả " * 20,
+            "confidence": "high",
+        }
+        for i in range(n)
+    ]
+
+
+def bench_full_scan(store, user_email):
+    """Cách cũ: đọc shard từ đĩa rồi sắp xếp cả album để lấy một trang"""
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        with open(store._shard_path(user_email), "r", encoding="utf-8") as f:
+            items = json.load(f)["albums"]["big"]
+        items = sorted(items, key=lambda item: item["uploaded_at"], reverse=True)
+        page = [dict(item) for item in items[len(items) // 2:len(items) // 2 + PAGE_SIZE]]
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def bench_cursor(store, user_email):
+    """Cách mới: index cache theo shard, cursor trỏ vào giữa album"""
+    index = store.album_index(user_email, "big")
+    cursor = None
+    # Đi tới giữa album để lấy cursor
+    for _ in range(len(index) // 2 // PAGE_SIZE):
+        cursor = index.page("uploaded_at", "desc", cursor, PAGE_SIZE)["next_cursor"]
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        index = store.album_index(user_email, "big")
+        page = index.page("uploaded_at", "desc", cursor, PAGE_SIZE)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    print("=" * 70)
+    print(f"BENCHMARK ALBUM PAGINATION (ms / trang {PAGE_SIZE} ảnh)")
+    print("=" * 70)
+    print(f"{'items':>8} {'full scan':>14} {'cursor':>14} {'speedup':>10}")
+
+    for n_items in ALBUM_SIZES:
+        workdir = tempfile.mkdtemp(prefix="bench_pagination_")
+        try:
+            store = AlbumStore(os.path.join(workdir, "Users_album"))
+            user_email = "bench@example.com"
+            store.save(user_email, {"big": make_items(n_items)})
+
+            scan_ms = bench_full_scan(store, user_email)
+            cursor_ms = bench_cursor(store, user_email)
+            print(f"{n_items:>8} {scan_ms:>14.2f} {cursor_ms:>14.3f} {scan_ms / cursor_ms:>9.0f}x")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
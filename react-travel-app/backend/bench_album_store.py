@@ -0,0 +1,82 @@
+"""
+Benchmark: chi phí một request album (load + save của một user)
+so sánh file Users_album.json đơn khối với AlbumStore sharded, khi số user tăng dần.
+
+Chạy: python bench_album_store.py
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from album_store import AlbumStore
+
+USER_COUNTS = [10, 100, 1000]
+ALBUMS_PER_USER = 3
+ITEMS_PER_ALBUM = 5
+PAYLOAD = "x" * 2000  # Giả lập metadata + dữ liệu ảnh nhỏ
+ROUNDS = 20
+
+
+def make_albums():
+    return {
+        f"album_{a}": [
+            {"filename": f"img_{i}.jpg", "image_data": PAYLOAD, "landmark": "N/A"}
+            for i in range(ITEMS_PER_ALBUM)
+        ]
+        for a in range(ALBUMS_PER_USER)
+    }
+
+
+def bench_monolithic(path, user_email):
+    """Cách cũ: đọc và ghi lại toàn bộ file để sửa album của một user"""
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        with open(path, "r", encoding="utf-8") as f:
+            all_albums = json.load(f)
+        albums = all_albums.get(user_email, {})
+        albums.setdefault("new_album", [])
+        all_albums[user_email] = albums
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(all_albums, f, ensure_ascii=False, indent=4)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def bench_sharded(store, user_email):
+    """Cách mới: chỉ đọc/ghi shard của user"""
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        albums = store.load(user_email)
+        albums.setdefault("new_album", [])
+        store.save(user_email, albums)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    print("=" * 70)
+    print("BENCHMARK ALBUM STORE (ms / request)")
+    print("=" * 70)
+    print(f"{'users':>8} {'monolithic':>14} {'sharded':>14}")
+
+    for n_users in USER_COUNTS:
+        workdir = tempfile.mkdtemp(prefix="bench_albums_")
+        try:
+            legacy_file = os.path.join(workdir, "Users_album.json")
+            all_albums = {f"user{u}@example.com": make_albums() for u in range(n_users)}
+            with open(legacy_file, "w", encoding="utf-8") as f:
+                json.dump(all_albums, f)
+
+            store = AlbumStore(os.path.join(workdir, "Users_album"))
+            store.migrate_from_file(legacy_file)
+
+            target = f"user{n_users // 2}@example.com"
+            mono_ms = bench_monolithic(legacy_file, target)
+            shard_ms = bench_sharded(store, target)
+            print(f"{n_users:>8} {mono_ms:>14.2f} {shard_ms:>14.2f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: haversine scalar (math, từng điểm một) so với geo_distance
+(NumPy, cả mảng trong một lần gọi) ở 1k, 10k, 100k điểm.
+
+Chạy: python bench_geo_distance.py
+"""
+import random
+import time
+
+import numpy as np
+
+from geo_distance import CoordinateArray, haversine_km
+
+SIZES = [1_000, 10_000, 100_000]
+QUERIES = 20
+REPEAT = 3
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    """Phiên bản cũ trong main.py"""
+    import math
+    R = 6371.0  # Bán kính Trái Đất (km)
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    return R * c
+
+
+def timed(func):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rng = random.Random(42)
+    queries = [(rng.uniform(8.5, 23.0), rng.uniform(102.0, 109.5)) for _ in range(QUERIES)]
+    query_lats = [lat for lat, _ in queries]
+    query_lons = [lon for _, lon in queries]
+
+    print("=" * 78)
+    print(f"BENCHMARK: distances from {QUERIES} query points to N points (ms per query)")
+    print("=" * 78)
+    print(f"{'points':>8} {'scalar':>10} {'haversine_km':>14} {'cached':>10} {'matrix':>10} {'speedup':>9}")
+
+    for size in SIZES:
+        points = [(rng.uniform(8.5, 23.0), rng.uniform(102.0, 109.5)) for _ in range(size)]
+        lats = np.array([lat for lat, _ in points])
+        lons = np.array([lon for _, lon in points])
+        coordinates = CoordinateArray(lats, lons)
+
+        scalar = timed(lambda: [[scalar_haversine(qlat, qlon, lat, lon) for lat, lon in points]
+                                for qlat, qlon in queries])
+        plain = timed(lambda: [haversine_km(qlat, qlon, lats, lons) for qlat, qlon in queries])
+        cached = timed(lambda: [coordinates.distances_from(qlat, qlon) for qlat, qlon in queries])
+        matrix = timed(lambda: coordinates.distance_matrix(query_lats, query_lons))
+
+        expected = [scalar_haversine(queries[0][0], queries[0][1], lat, lon) for lat, lon in points]
+        assert np.allclose(coordinates.distances_from(*queries[0]), expected)
+
+        per_query = lambda seconds: seconds / QUERIES * 1000
+        print(f"{size:>8,} {per_query(scalar):>10.3f} {per_query(plain):>14.3f} {per_query(cached):>10.3f} "
+              f"{per_query(matrix):>10.3f} {scalar / cached:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Load test: độ trễ của endpoint thường (/api/destinations) khi có nhiều
+request nhận dạng ảnh đang chờ model.
+
+Lời gọi vision được thay bằng hàm sleep (giả lập round trip tới OpenAI),
+nên script chạy được mà không cần mạng hay API key thật.
+
+Chạy: python bench_model_client.py
+"""
+import asyncio
+import os
+import statistics
+import time
+from io import BytesIO
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import httpx
+from PIL import Image
+
+import main
+
+MODEL_LATENCY = 2.0       # Giây cho một lời gọi vision giả lập
+RECOGNITION_REQUESTS = 16
+PROBE_REQUESTS = 200
+
+
+def fake_vision_call(image_pil):
+    time.sleep(MODEL_LATENCY)
+    return {"landmark": "Landmark 81", "description": "", "confidence": "high",
+            "lat": None, "lon": None, "address": None}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def probe(client, n):
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        r = await client.get("/api/destinations")
+        r.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def recognize(client, image_bytes):
+    files = {"file": ("test.jpg", image_bytes, "image/jpeg")}
+    r = await client.post("/api/recognize/landmark", files=files)
+    return r.status_code
+
+
+async def run():
+    main.get_landmark_with_confidence = fake_vision_call
+
+    buf = BytesIO()
+    Image.new("RGB", (64, 64), "blue").save(buf, format="JPEG")
+    image_bytes = buf.getvalue()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        baseline = await probe(client, PROBE_REQUESTS)
+
+        start = time.perf_counter()
+        recognition = asyncio.gather(*[recognize(client, image_bytes) for _ in range(RECOGNITION_REQUESTS)])
+        loaded = await probe(client, PROBE_REQUESTS)
+        statuses = await recognition
+        elapsed = time.perf_counter() - start
+
+    print("=" * 70)
+    print("LOAD TEST: /api/destinations latency (ms)")
+    print("=" * 70)
+    print(f"{'':>24} {'p50':>10} {'p99':>10}")
+    print(f"{'idle':>24} {statistics.median(baseline):>10.2f} {percentile(baseline, 99):>10.2f}")
+    print(f"{'recognition in flight':>24} {statistics.median(loaded):>10.2f} {percentile(loaded, 99):>10.2f}")
+    print()
+    print(f"{RECOGNITION_REQUESTS} recognition calls ({MODEL_LATENCY}s each): "
+          f"{elapsed:.1f}s total, statuses={sorted(set(statuses))}")
+    print(f"Model client stats: {main.model_client.get_stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
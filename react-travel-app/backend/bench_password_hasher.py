@@ -0,0 +1,56 @@
+"""
+Benchmark: chi phí scrypt theo n và số lần verify/giây của pool băm mật khẩu,
+để chọn PASSWORD_SCRYPT_N vừa đủ chậm với kẻ tấn công mà vẫn đạt số đăng nhập/giây cần thiết.
+
+Chạy: python bench_password_hasher.py
+      TARGET_LOGINS_PER_SEC=50 python bench_password_hasher.py
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from password_hasher import PasswordHasher, PASSWORD_HASH_WORKERS, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P
+
+N_VALUES = [2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15, 2 ** 16]
+LOGINS = 40
+TARGET_LOGINS_PER_SEC = float(os.getenv('TARGET_LOGINS_PER_SEC', '20'))
+
+
+def main():
+    print("=" * 70)
+    print(f"BENCHMARK PASSWORD HASHING (scrypt r={PASSWORD_SCRYPT_R} p={PASSWORD_SCRYPT_P}, "
+          f"{PASSWORD_HASH_WORKERS} workers)")
+    print("=" * 70)
+    print(f"{'n':>8} {'mem MB':>8} {'ms/hash':>10} {'logins/s':>10}")
+
+    recommended = None
+    for n in N_VALUES:
+        hasher = PasswordHasher(n=n)
+        stored = hasher.hash("correct horse battery staple")
+
+        start = time.perf_counter()
+        hasher.verify("correct horse battery staple", stored)
+        single_ms = (time.perf_counter() - start) * 1000
+
+        # Nhiều request đăng nhập cùng lúc (như các thread của FastAPI)
+        with ThreadPoolExecutor(max_workers=LOGINS) as clients:
+            start = time.perf_counter()
+            results = list(clients.map(lambda _: hasher.verify("correct horse battery staple", stored)[0],
+                                       range(LOGINS)))
+            logins_per_sec = LOGINS / (time.perf_counter() - start)
+
+        assert all(results)
+        mem_mb = 128 * n * PASSWORD_SCRYPT_R / (1024 * 1024)
+        print(f"{n:>8} {mem_mb:>8.0f} {single_ms:>10.1f} {logins_per_sec:>10.1f}")
+        if logins_per_sec >= TARGET_LOGINS_PER_SEC:
+            recommended = n
+
+    print("-" * 70)
+    if recommended:
+        print(f"n lớn nhất đạt {TARGET_LOGINS_PER_SEC:g} đăng nhập/giây: PASSWORD_SCRYPT_N={recommended}")
+    else:
+        print(f"Không n nào đạt {TARGET_LOGINS_PER_SEC:g} đăng nhập/giây, tăng PASSWORD_HASH_WORKERS")
+
+
+if __name__ == "__main__":
+    main()
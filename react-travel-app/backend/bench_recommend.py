@@ -0,0 +1,88 @@
+"""
+Benchmark: recommend() quét tuần tự (compatibality_rate cho từng địa điểm)
+so với inverted index (DestinationIndex) trên dữ liệu tổng hợp.
+
+Chạy: python bench_recommend.py
+"""
+import os
+import random
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from ai_recommend import compatibality_rate, _prepare_destination
+from destination_index import DestinationIndex
+
+SIZES = [10_000, 100_000]
+QUERIES = ["mua sắm", "cà phê", "bảo tàng lịch sử", "vui chơi", "chợ đêm", "ẩm thực đường phố",
+           "bao", "cong vien", "nha tho", "khong co gi"]
+REPEAT = 3
+
+WORDS = ["chợ", "bến", "thành", "bảo", "tàng", "công", "viên", "nhà", "thờ", "phố", "đi", "bộ",
+         "quán", "cà", "phê", "lẩu", "nướng", "sông", "cầu", "chùa", "đình", "tháp", "đảo", "biển"]
+TAGS = ["mua sắm", "cà phê", "ẩm thực", "vui chơi", "lịch sử", "văn hoá", "thiên nhiên", "chợ đêm",
+        "đường phố", "tôn giáo", "kiến trúc", "gia đình", "check-in", "giải trí", "nghỉ dưỡng"]
+
+
+def make_destinations(n, seed=42):
+    rng = random.Random(seed)
+    raw = []
+    for i in range(n):
+        raw.append({
+            "name": " ".join(rng.sample(WORDS, 3)) + f" {i}",
+            "tags": rng.sample(TAGS, 3),
+            "rating": round(rng.uniform(3.5, 5.0), 1),
+        })
+    return [_prepare_destination(d) for d in raw]
+
+
+def linear_recommend(preference, destinations):
+    """recommend() trước khi có index"""
+    preference = preference.lower()
+    results = []
+    for dest in destinations:
+        score = compatibality_rate(preference, dest)
+        if score > 0:
+            results.append((dest, score))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return [d[0] for d in results[:5]]
+
+
+def timed(func):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print("=" * 70)
+    print("BENCHMARK: recommend() linear scan vs inverted index")
+    print("=" * 70)
+    print(f"{'destinations':>12} {'build (ms)':>12} {'linear (ms/q)':>15} {'index (ms/q)':>14} {'speedup':>9}")
+
+    for size in SIZES:
+        destinations = make_destinations(size)
+
+        start = time.perf_counter()
+        index = DestinationIndex(destinations)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        linear = timed(lambda: [linear_recommend(q, destinations) for q in QUERIES]) / len(QUERIES)
+        indexed = timed(lambda: [index.search(q) for q in QUERIES]) / len(QUERIES)
+
+        # Với truy vấn khớp chính xác, index phải trả về đúng kết quả cũ
+        for q in QUERIES:
+            old = [d["name"] for d in linear_recommend(q, destinations)]
+            new = [d["name"] for d in index.search(q)]
+            if len(old) == 5:
+                assert old == new, (q, old, new)
+
+        print(f"{size:>12,} {build_ms:>12.1f} {linear * 1000:>15.3f} {indexed * 1000:>14.3f} "
+              f"{linear / indexed:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
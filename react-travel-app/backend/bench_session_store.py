@@ -0,0 +1,65 @@
+"""
+Benchmark: đăng nhập khi số session đã đạt tối đa (mỗi lần phải loại session cũ nhất)
+so sánh cách cũ (dict + min() theo login_time) với MemorySessionBackend và SQLiteSessionBackend.
+
+Chạy: python bench_session_store.py
+"""
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from session_store import MemorySessionBackend, SQLiteSessionBackend
+
+SESSION_COUNTS = [100, 1000, 10000]
+LOGINS = 500
+SQLITE_LOGINS = 100
+
+
+def old_login(sessions, username, max_sessions):
+    """Cách cũ trong ConcurrentLoginManager.login_user"""
+    if len(sessions) >= max_sessions:
+        oldest = min(sessions.items(), key=lambda x: x[1]["login_time"])
+        del sessions[oldest[0]]
+    sessions[username] = {"username": username, "login_time": datetime.now(), "last_activity": datetime.now()}
+
+
+def time_backend(backend, n_sessions, logins):
+    now = time.time()
+    for i in range(n_sessions):
+        backend.put(f"user{i}", {"username": f"user{i}"}, now, n_sessions)
+    start = time.perf_counter()
+    for i in range(logins):
+        backend.put(f"new{i}", {"username": f"new{i}"}, now, n_sessions)
+    elapsed = (time.perf_counter() - start) / logins * 1e6
+    assert backend.count(now) == n_sessions
+    return elapsed
+
+
+def main():
+    print("=" * 70)
+    print("BENCHMARK SESSION EVICTION (µs / login khi đầy)")
+    print("=" * 70)
+    print(f"{'sessions':>8} {'dict+min':>12} {'memory':>12} {'sqlite':>12}")
+
+    for n_sessions in SESSION_COUNTS:
+        sessions = {}
+        for i in range(n_sessions):
+            old_login(sessions, f"user{i}", n_sessions)
+        start = time.perf_counter()
+        for i in range(LOGINS):
+            old_login(sessions, f"new{i}", n_sessions)
+        old_us = (time.perf_counter() - start) / LOGINS * 1e6
+
+        memory_us = time_backend(MemorySessionBackend(3600, 86400), n_sessions, LOGINS)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteSessionBackend(3600, 86400, db_file=os.path.join(tmp, "sessions.db"))
+            sqlite_us = time_backend(backend, n_sessions, SQLITE_LOGINS)
+            backend.close()
+
+        print(f"{n_sessions:>8} {old_us:>12.1f} {memory_us:>12.2f} {sqlite_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
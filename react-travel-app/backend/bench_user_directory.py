@@ -0,0 +1,59 @@
+"""
+Benchmark: tìm user khi đăng nhập (theo username, email, phần trước @ của email)
+so sánh cách cũ (duyệt tuần tự danh sách user) với UserDirectory (hash index).
+
+Chạy: python bench_user_directory.py
+"""
+import random
+import time
+
+from user_directory import UserDirectory
+
+USER_COUNTS = [1000, 10000, 100000]
+LOOKUPS = 200
+
+
+def make_users(n):
+    return [
+        {"name": f"User {i}", "username": f"user{i}", "email": f"mail{i}@example.com",
+         "password": "x" * 64, "status": "active"}
+        for i in range(n)
+    ]
+
+
+def linear_find(users, username):
+    """Cách cũ trong login_user"""
+    return next((u for u in users if u.get("username") == username or u.get("email") == username
+                 or (u.get("email", "").split("@")[0] == username)), None)
+
+
+def main():
+    print("=" * 70)
+    print("BENCHMARK USER LOOKUP (µs / lookup)")
+    print("=" * 70)
+    print(f"{'users':>8} {'linear':>14} {'indexed':>14} {'build ms':>10}")
+
+    random.seed(0)
+    for n_users in USER_COUNTS:
+        users = make_users(n_users)
+        queries = [random.choice([f"user{i}", f"mail{i}@example.com", f"mail{i}"])
+                   for i in (random.randrange(n_users) for _ in range(LOOKUPS))]
+
+        start = time.perf_counter()
+        directory = UserDirectory({"users": users})
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        expected = [linear_find(users, q) for q in queries]
+        linear_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+
+        start = time.perf_counter()
+        found = [directory.find_login(q) for q in queries]
+        indexed_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+
+        assert found == expected
+        print(f"{n_users:>8} {linear_us:>14.1f} {indexed_us:>14.2f} {build_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
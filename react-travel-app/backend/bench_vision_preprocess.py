@@ -0,0 +1,83 @@
+"""
+Benchmark: encode ảnh gửi cho vision model
+- cũ: encode JPEG nguyên độ phân giải
+- mới: vision_preprocess (xoay EXIF, draft + thu nhỏ về VISION_MAX_EDGE, cache payload)
+
+Ảnh thử là ảnh tổng hợp cỡ ảnh điện thoại (12 MP) có EXIF orientation.
+Chạy: python bench_vision_preprocess.py
+"""
+import base64
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from vision_preprocess import VisionPreprocessor
+
+SIZES = [(1600, 1200), (4032, 3024)]
+REPEAT = 5
+
+
+def make_photo(width, height, seed=0):
+    """JPEG tổng hợp (gradient + nhiễu) với EXIF orientation = 6 (xoay 90 độ)"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    noise = rng.normal(0, 25, size=(height, width, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+def old_encode(image_bytes):
+    """encode_image_base64 trước đây"""
+    image_pil = Image.open(BytesIO(image_bytes))
+    buffered = BytesIO()
+    image_pil.save(buffered, format="JPEG")
+    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+
+
+def timed(func):
+    best, result = float("inf"), None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print("=" * 78)
+    print("BENCHMARK: vision payload (ms, KB of JPEG sent)")
+    print("=" * 78)
+    print(f"{'source':>12} {'file KB':>9} {'old ms':>8} {'old KB':>8} {'new ms':>8} {'new KB':>8} "
+          f"{'cached ms':>10} {'sent size':>11}")
+
+    for width, height in SIZES:
+        image_bytes = make_photo(width, height)
+        preprocessor = VisionPreprocessor()
+
+        old_ms, old_payload = timed(lambda: old_encode(image_bytes))
+        new_ms, new_payload = timed(lambda: preprocessor.encode_base64(Image.open(BytesIO(image_bytes))))
+
+        image = Image.open(BytesIO(image_bytes))
+        preprocessor.encode_base64(image)
+        cached_ms, _ = timed(lambda: preprocessor.encode_base64(image))
+
+        sent = Image.open(BytesIO(base64.b64decode(new_payload)))
+        print(f"{f'{width}x{height}':>12} {len(image_bytes) / 1024:>9.0f} {old_ms * 1000:>8.1f} "
+              f"{len(base64.b64decode(old_payload)) / 1024:>8.0f} {new_ms * 1000:>8.1f} "
+              f"{len(base64.b64decode(new_payload)) / 1024:>8.0f} {cached_ms * 1000:>10.3f} "
+              f"{f'{sent.width}x{sent.height}':>11}")
+
+    print()
+    print(f"Stats (last run): {preprocessor.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Blob GC Module - Dọn blob (và derivative thumb/medium) không còn ảnh album hay post nào dùng
+- Blob content-addressed dùng chung giữa các album/user/post nên không xoá ngay khi xoá ảnh:
+  mark = gom image_hash từ mọi shard album và mọi post, sweep = xoá blob không có trong tập đó
+- Sau khi xoá ảnh/album/post chỉ sweep các hash vừa bị bỏ; collect() không có candidates quét cả blob store
+  (dọn blob mồ côi từ trước, chạy nền lúc khởi động)
+- Blob put trong BLOB_GC_GRACE_SECONDS gần nhất không bị xoá: upload đã ghi blob nhưng chưa commit item
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import logging
+
+from blob_store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+BLOB_GC_GRACE_SECONDS = float(os.getenv('BLOB_GC_GRACE_SECONDS', '600'))
+BLOB_GC_ON_STARTUP = os.getenv('BLOB_GC_ON_STARTUP', 'true').lower() == 'true'
+
+
+class BlobCollector:
+    """
+    sources: các hàm trả về tập hash đang được tham chiếu. Thiếu một nguồn thì blob của nguồn đó
+    bị coi là mồ côi, nên khi không đủ nguồn (module không load được) phải tạo với enabled=False.
+    """
+
+    def __init__(self, store: BlobStore, sources: List[Callable[[], Iterable[str]]],
+                 grace_seconds: float = BLOB_GC_GRACE_SECONDS, enabled: bool = True):
+        self.store = store
+        self.sources = sources
+        self.grace_seconds = grace_seconds
+        self.enabled = enabled
+
+        # Mỗi lần chỉ một sweep (sweep nền lúc khởi động và sweep sau request xoá không chồng nhau)
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "full_runs": 0, "checked": 0, "deleted": 0, "kept_recent": 0,
+                       "freed_bytes": 0, "errors": 0}
+
+    def referenced(self) -> Set[str]:
+        """Mark: mọi hash đang được tham chiếu"""
+        hashes = set()
+        for source in self.sources:
+            hashes.update(source())
+        return hashes
+
+    def collect(self, candidates: Optional[Iterable[str]] = None) -> int:
+        """
+        Xoá các blob trong candidates (None = toàn bộ blob store) không còn được tham chiếu.
+        Trả về số blob đã xoá.
+        """
+        if not self.enabled:
+            return 0
+        if candidates is not None:
+            candidates = {h for h in candidates if self.store.is_valid_hash(h)}
+            if not candidates:
+                return 0
+
+        with self._lock:
+            try:
+                # Mark trước khi liệt kê blob: blob put sau thời điểm này còn mới, được grace period giữ lại
+                referenced = self.referenced()
+                deleted = 0
+                for blob_hash in (candidates if candidates is not None else list(self.store.hashes())):
+                    if blob_hash in referenced:
+                        continue
+                    self._stats["checked"] += 1
+                    try:
+                        if self.store.age(blob_hash) < self.grace_seconds:
+                            self._stats["kept_recent"] += 1
+                            continue
+                    except FileNotFoundError:
+                        continue
+                    self._stats["freed_bytes"] += self.store.delete(blob_hash)
+                    deleted += 1
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"Blob GC failed: {e}")
+                return 0
+            self._stats["runs"] += 1
+            if candidates is None:
+                self._stats["full_runs"] += 1
+            self._stats["deleted"] += deleted
+        if deleted:
+            print(f"[BLOB GC] Deleted {deleted} unreferenced blob(s)")
+        return deleted
+
+    def collect_in_background(self) -> Optional[threading.Thread]:
+        """Quét toàn bộ blob store trong thread nền"""
+        if not self.enabled:
+            return None
+        thread = threading.Thread(target=self.collect, name="blob-gc", daemon=True)
+        thread.start()
+        return thread
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "enabled": self.enabled, "grace_seconds": self.grace_seconds}
@@ -0,0 +1,129 @@
+"""
+Blob Serving Module - Trả file ảnh từ blob store trực tiếp từ đĩa
+- ETag (= SHA-256 của nội dung) và Last-Modified để trình duyệt nhận 304
+- Hỗ trợ Range (một khoảng byte) để tải từng phần ảnh lớn; Range nhiều khoảng
+  hoặc sai cú pháp bị bỏ qua (trả cả file), 416 chỉ khi khoảng nằm ngoài file
+- Không đọc toàn bộ ảnh vào bộ nhớ Python
+"""
+
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+# Ảnh có thể bị thay khi user xoá rồi upload lại cùng tên file,
+# nên luôn revalidate; nhờ ETag, lần xem lại chỉ tốn một response 304 rỗng.
+CACHE_CONTROL = "private, no-cache"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+class _RangeNotSatisfiable(Exception):
+    """Range đúng cú pháp nhưng nằm ngoài file (trả 416)"""
+
+
+def _parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse header Range một khoảng ("bytes=0-99", "bytes=100-", "bytes=-100").
+    Trả về (start, end) bao gồm cả end. Header sai cú pháp hoặc nhiều khoảng trả về None:
+    theo RFC 9110 server được bỏ qua Range và trả cả file (200).
+    Raise _RangeNotSatisfiable nếu khoảng hợp lệ nhưng không có byte nào trong file.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_str, dash, end_str = spec.strip().partition("-")
+    start_str, end_str = start_str.strip(), end_str.strip()
+    if not dash or not (start_str or end_str) or not all(part.isdigit() for part in (start_str, end_str) if part):
+        return None
+    if not start_str:
+        # Suffix range: n byte cuối
+        length = int(end_str)
+        if length == 0 or file_size == 0:
+            raise _RangeNotSatisfiable()
+        return max(file_size - length, 0), file_size - 1
+    start = int(start_str)
+    end = int(end_str) if end_str else file_size - 1
+    if end_str and start > end:
+        return None
+    if start >= file_size:
+        raise _RangeNotSatisfiable()
+    return start, min(end, file_size - 1)
+
+
+def _iter_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(request: Request, path: str, etag: str, media_type: str) -> Response:
+    """Trả file với hỗ trợ conditional request (304) và Range (206)."""
+    stat_result = os.stat(path)
+    file_size = stat_result.st_size
+    quoted_etag = f'"{etag}"'
+    headers = {
+        "ETag": quoted_etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    # Conditional GET: If-None-Match được ưu tiên hơn If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, quoted_etag):
+            return Response(status_code=304, headers=headers)
+    elif _not_modified_since(request.headers.get("if-modified-since", ""), stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == quoted_etag):
+        try:
+            byte_range = _parse_range(range_header, file_size)
+        except _RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{file_size}"},
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
@@ -0,0 +1,139 @@
+"""
+Blob Store Module - Lưu ảnh (album, social post) dưới dạng file nhị phân trên đĩa,
+định danh theo SHA-256 của nội dung (content-addressed)
+- Ảnh trùng nội dung chỉ được lưu một lần (dedup)
+- Metadata (album item, post) chỉ giữ hash, không giữ base64
+- Blob không còn được tham chiếu được dọn bởi blob_gc (mark-and-sweep)
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+from typing import Iterator, Optional
+
+BLOBS_DIR = os.path.join(os.path.dirname(__file__), 'blobs')
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Magic bytes -> content type
+_IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+
+def guess_image_type(data: bytes, default: str = "image/jpeg") -> str:
+    """Đoán content type của ảnh từ vài byte đầu"""
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return default
+
+
+class BlobStore:
+    """
+    Lưu blob theo đường dẫn <root>/<hash[:2]>/<hash>
+    File được ghi atomic và không bao giờ bị sửa sau khi ghi, nên có thể
+    serve trực tiếp từ đĩa.
+    """
+
+    def __init__(self, root_dir: str = BLOBS_DIR):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+
+    @staticmethod
+    def is_valid_hash(blob_hash: str) -> bool:
+        return bool(blob_hash) and bool(_HASH_RE.match(blob_hash))
+
+    def path(self, blob_hash: str) -> str:
+        """Đường dẫn file của blob"""
+        if not self.is_valid_hash(blob_hash):
+            raise ValueError(f"Invalid blob hash: {blob_hash!r}")
+        return os.path.join(self.root_dir, blob_hash[:2], blob_hash)
+
+    def exists(self, blob_hash: str) -> bool:
+        return self.is_valid_hash(blob_hash) and os.path.exists(self.path(blob_hash))
+
+    def put(self, data: bytes) -> str:
+        """Lưu bytes, trả về SHA-256 hex. Không ghi lại nếu blob đã tồn tại."""
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(blob_hash)
+        if os.path.exists(path):
+            # Cập nhật mtime: blob_gc không xoá blob vừa được put lại trong lúc item chưa commit
+            try:
+                os.utime(path)
+                return blob_hash
+            except FileNotFoundError:
+                pass
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_hash
+
+    def get(self, blob_hash: str) -> Optional[bytes]:
+        """Đọc toàn bộ blob (dùng khi thật sự cần bytes trong bộ nhớ)"""
+        if not self.exists(blob_hash):
+            return None
+        with open(self.path(blob_hash), "rb") as f:
+            return f.read()
+
+    def size(self, blob_hash: str) -> int:
+        return os.path.getsize(self.path(blob_hash))
+
+    def age(self, blob_hash: str) -> float:
+        """Số giây từ lần put gần nhất của blob"""
+        return time.time() - os.path.getmtime(self.path(blob_hash))
+
+    def hashes(self) -> Iterator[str]:
+        """Duyệt hash của mọi blob đang có trên đĩa (bỏ qua derivative và file tạm)"""
+        for prefix in sorted(os.listdir(self.root_dir)):
+            directory = os.path.join(self.root_dir, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if self.is_valid_hash(name) and name.startswith(prefix):
+                    yield name
+
+    def delete(self, blob_hash: str) -> int:
+        """Xoá blob cùng các derivative (<hash>.<size>.<ext>), trả về số byte giải phóng"""
+        path = self.path(blob_hash)
+        directory = os.path.dirname(path)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return 0
+        freed = 0
+        for name in names:
+            if name == blob_hash or name.startswith(blob_hash + "."):
+                file_path = os.path.join(directory, name)
+                try:
+                    freed += os.path.getsize(file_path)
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+        return freed
+
+    def content_type(self, blob_hash: str) -> str:
+        """Content type của blob, đọc từ header file"""
+        with open(self.path(blob_hash), "rb") as f:
+            return guess_image_type(f.read(16))
+
+
+# Global instance
+blob_store = BlobStore()
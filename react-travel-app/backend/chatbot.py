@@ -9,10 +9,14 @@ class TravelChatbot:
     """
     
     def __init__(self):
-        self.destinations = loadDestination()
         self.conversation_history = []
         self.chat_sessions = {}
     
+    @property
+    def destinations(self) -> List[dict]:
+        """Danh sách địa điểm hiện tại (luôn theo catalog mới nhất khi database.json thay đổi)."""
+        return loadDestination()
+    
     def format_destinations_for_ai(self, destinations: List[dict]) -> str:
         """
         Chuyển danh sách địa điểm thành chuỗi để gửi cho AI.
@@ -5,16 +5,24 @@ Sử dụng threading locks để đảm bảo thread-safety khi đọc/ghi dữ
 
 import json
 import os
-import hashlib
 from threading import Lock
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from password_hasher import password_hasher
+from session_store import SessionStore
+from user_directory import UserDirectory
+from write_behind import WriteBehindBuffer
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# last_login được gom trong bộ nhớ và ghi Users.json theo lô (giây / số user chờ ghi)
+LOGIN_ACTIVITY_FLUSH_INTERVAL = float(os.getenv('LOGIN_ACTIVITY_FLUSH_INTERVAL', '5'))
+LOGIN_ACTIVITY_FLUSH_MAX = int(os.getenv('LOGIN_ACTIVITY_FLUSH_MAX', '200'))
+
 class ConcurrentLoginManager:
     """
     Quản lý đăng nhập với hỗ trợ xử lý đồng thời
@@ -23,8 +31,10 @@ class ConcurrentLoginManager:
     - Rate limiting per user
     """
     
-    def __init__(self, users_file: str = "Users.json", max_concurrent_users: int = 100):
-        self.users_file = users_file
+    def __init__(self, users_file: str = "Users.json", max_concurrent_users: int = 100,
+                 session_store: Optional[SessionStore] = None):
+        # Đường dẫn tuyệt đối: thread write-behind / atexit ghi file sau khi cwd có thể đã đổi
+        self.users_file = os.path.abspath(users_file)
         self.max_concurrent_users = max_concurrent_users
         
         # Thread locks để đảm bảo thread-safety
@@ -32,38 +42,55 @@ class ConcurrentLoginManager:
         self._cache_lock = Lock()  # Lock cho in-memory cache
         self._login_attempts_lock = Lock()  # Lock cho login attempts tracking
         
-        # In-memory cache để giảm I/O
-        self._users_cache: Dict = {}
-        self._cache_timestamp = 0
-        self._cache_ttl = 300  # Cache hết hạn sau 5 phút
+        # In-memory user directory (hash index) để giảm I/O; đọc lại khi file bị sửa từ nơi khác
+        self._directory: Optional[UserDirectory] = None
+        self._directory_signature: Optional[Tuple] = None
+        
+        # Write-behind cho last_login: đăng nhập không ghi lại cả file mỗi lần
+        self._activity = WriteBehindBuffer(
+            self._flush_activity,
+            interval=LOGIN_ACTIVITY_FLUSH_INTERVAL,
+            max_pending=LOGIN_ACTIVITY_FLUSH_MAX,
+            name="login-activity"
+        )
         
         # Rate limiting - theo dõi login attempts
         self._login_attempts: Dict[str, List[datetime]] = {}
         self._max_login_attempts = 5
         self._login_attempt_window = 300  # 5 phút
         
-        # Active sessions
-        self._active_sessions: Dict[str, Dict] = {}
-        self._session_lock = Lock()
+        # Active sessions: idle/absolute timeout, backend chọn bằng SESSION_BACKEND (memory/sqlite)
+        self._sessions = session_store or SessionStore()
         
         logger.info(f"ConcurrentLoginManager initialized with max_concurrent_users={max_concurrent_users}")
     
     def _hash_password(self, password: str) -> str:
-        """Mã hóa mật khẩu"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """Mã hóa mật khẩu (scrypt có salt, chạy trong pool của password_hasher)"""
+        return password_hasher.hash(password)
+    
+    def _file_signature(self) -> Optional[Tuple]:
+        try:
+            stat = os.stat(self.users_file)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    def _read_users_file(self) -> Tuple[Dict, Optional[Tuple]]:
+        """Đọc file (raise nếu JSON hỏng), trả về (data, signature của file đã đọc)"""
+        with self._file_lock:
+            signature = self._file_signature()
+            if signature is None:
+                logger.warning(f"Users file not found: {self.users_file}")
+                return {"users": []}, None
+            with open(self.users_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            logger.info(f"Loaded {len(data.get('users', []))} users from file")
+            return data, signature
     
     def _load_users_from_file(self) -> Dict:
         """Tải users từ file với thread-safety"""
         try:
-            with self._file_lock:
-                if not os.path.exists(self.users_file):
-                    logger.warning(f"Users file not found: {self.users_file}")
-                    return {"users": []}
-                
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    logger.info(f"Loaded {len(data.get('users', []))} users from file")
-                    return data
+            return self._read_users_file()[0]
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error: {e}")
             return {"users": []}
@@ -77,36 +104,64 @@ class ConcurrentLoginManager:
             with self._file_lock:
                 with open(self.users_file, 'w', encoding='utf-8') as f:
                     json.dump(data, f, ensure_ascii=False, indent=4)
-                    logger.info(f"Saved {len(data.get('users', []))} users to file")
-                    return True
+                logger.info(f"Saved {len(data.get('users', []))} users to file")
+                # Directory trong bộ nhớ đã chứa thay đổi: ghi nhận signature mới để không đọc lại file
+                if self._directory is not None and self._directory.data is data:
+                    self._directory_signature = self._file_signature()
+                    # File vừa ghi đã có mọi last_login đang chờ
+                    self._activity.discard(self._activity.pending())
+                return True
         except Exception as e:
             logger.error(f"Error saving users: {e}")
             return False
     
-    def get_users_cached(self) -> Dict:
-        """Lấy users với caching để giảm I/O"""
-        with self._cache_lock:
-            current_time = datetime.now().timestamp()
-            
-            # Nếu cache còn hợp lệ, trả về cache
-            if self._users_cache and (current_time - self._cache_timestamp) < self._cache_ttl:
-                logger.info("Returning users from cache")
-                return self._users_cache.copy()
-        
-        # Cache hết hạn hoặc trống, load từ file
-        data = self._load_users_from_file()
-        
+    def _get_directory_locked(self) -> UserDirectory:
+        """Directory hiện tại, gọi khi đang giữ _cache_lock (mỗi lần chỉ tốn một os.stat)"""
+        signature = self._file_signature()
+        if self._directory is not None and signature == self._directory_signature:
+            return self._directory
+        try:
+            data, signature = self._read_users_file()
+        except Exception as e:
+            # File đang được ghi dở (main.save_users) hoặc hỏng: dùng tạm bản cũ, lần sau đọc lại
+            logger.error(f"Error loading users: {e}")
+            if self._directory is not None:
+                return self._directory
+            data, signature = {"users": []}, None
+        self._directory = UserDirectory(data)
+        self._directory_signature = signature
+        # File bị ghi từ nơi khác: áp lại các last_login chưa kịp ghi
+        self._apply_activity(self._directory, self._activity.pending())
+        return self._directory
+    
+    @staticmethod
+    def _apply_activity(directory: UserDirectory, batch: Dict):
+        for username, last_login in batch.items():
+            user = directory.get(username) or directory.get_by_email(username)
+            if user is not None:
+                user["last_login"] = last_login
+    
+    def _flush_activity(self, batch: Dict):
+        """Ghi một lô last_login (gọi từ thread write-behind)"""
         with self._cache_lock:
-            self._users_cache = data.copy()
-            self._cache_timestamp = datetime.now().timestamp()
-        
-        return data
+            directory = self._get_directory_locked()
+            self._apply_activity(directory, batch)
+            if not self._save_users_to_file(directory.data):
+                raise IOError(f"Cannot write {self.users_file}")
+        logger.info(f"Flushed last_login of {len(batch)} users")
     
-    def _invalidate_cache(self):
-        """Xóa cache khi có thay đổi"""
+    def flush_activity(self) -> int:
+        """Ghi ngay các last_login đang chờ (vd. trước khi tắt server)"""
+        return self._activity.flush()
+    
+    def get_directory(self) -> UserDirectory:
+        """User directory với hash index (dùng chung, không copy: chỉ đọc)"""
         with self._cache_lock:
-            self._users_cache = {}
-            self._cache_timestamp = 0
+            return self._get_directory_locked()
+    
+    def get_users_cached(self) -> Dict:
+        """Lấy users với caching để giảm I/O (dữ liệu dùng chung, không được sửa)"""
+        return self.get_directory().data
     
     def _check_rate_limit(self, username: str) -> Tuple[bool, str]:
         """Kiểm tra rate limiting cho login attempts"""
@@ -154,14 +209,6 @@ class ConcurrentLoginManager:
         if len(password) < 6:
             return False, "Mật khẩu phải ít nhất 6 ký tự"
         
-        # Load users
-        data = self.get_users_cached()
-        users = data.get("users", [])
-        
-        # Kiểm tra username đã tồn tại
-        if any(u["username"] == username for u in users):
-            return False, "Tên đăng nhập đã tồn tại"
-        
         # Thêm user mới
         new_user = {
             "name": name,
@@ -173,15 +220,22 @@ class ConcurrentLoginManager:
             "status": "active"
         }
         
-        users.append(new_user)
-        data["users"] = users
-        
-        # Lưu file và invalidate cache
-        if self._save_users_to_file(data):
-            self._invalidate_cache()
-            logger.info(f"User registered successfully: {username}")
-            return True, "Đăng ký thành công"
-        else:
+        # Kiểm tra và thêm trong cùng lock để hai request đăng ký trùng tên không cùng lọt qua
+        with self._cache_lock:
+            directory = self._get_directory_locked()
+            
+            # Kiểm tra username đã tồn tại
+            if directory.get(username) is not None:
+                return False, "Tên đăng nhập đã tồn tại"
+            
+            directory.add(new_user)
+            
+            # Lưu file, directory giữ nguyên (đã có user mới)
+            if self._save_users_to_file(directory.data):
+                logger.info(f"User registered successfully: {username}")
+                return True, "Đăng ký thành công"
+            # Ghi lỗi: bỏ directory để lần sau đọc lại từ file
+            self._directory = None
             return False, "Lỗi khi lưu dữ liệu"
     
     def login_user(self, username: str, password: str) -> Tuple[bool, str, Optional[Dict]]:
@@ -201,13 +255,12 @@ class ConcurrentLoginManager:
             return False, message, None
         
         # Load users (có thể từ cache)
-        data = self.get_users_cached()
-        users = data.get("users", [])
+        directory = self.get_directory()
         
-        logger.info(f"🔍 Total users in database: {len(users)}")
+        logger.info(f"🔍 Total users in database: {len(directory)}")
         
-        # Tìm user theo username HOẶC email
-        user = next((u for u in users if u.get("username") == username or u.get("email") == username or (u.get("email", "").split("@")[0] == username)), None)
+        # Tìm user theo username HOẶC email (hash index, O(1))
+        user = directory.find_login(username)
         
         if not user:
             logger.warning(f"❌ User not found: '{username}'")
@@ -217,12 +270,9 @@ class ConcurrentLoginManager:
         logger.info(f"✅ User found: {user.get('email')} (username: {user.get('username')})")
         
         # Kiểm tra mật khẩu
-        hashed_password = self._hash_password(password)
-        logger.info(f"🔐 Password comparison:")
-        logger.info(f"   Stored hash: {user['password']}")
-        logger.info(f"   Input hash:  {hashed_password}")
-        logger.info(f"   Match: {user['password'] == hashed_password}")
-        if user["password"] != hashed_password:
+        matched, needs_rehash = password_hasher.verify(password, user.get("password", ""))
+        logger.info(f"🔐 Password match: {matched}")
+        if not matched:
             self._record_login_attempt(username)
             return False, "Mật khẩu không chính xác", None
         
@@ -233,32 +283,34 @@ class ConcurrentLoginManager:
         # Đăng nhập thành công
         self._clear_login_attempts(username)
         
-        # Cập nhật last_login
-        user["last_login"] = datetime.now().isoformat()
-        if self._save_users_to_file(data):
-            self._invalidate_cache()
+        # Hash cũ (SHA-256 không salt hoặc tham số scrypt cũ): băm lại bằng tham số hiện tại
+        new_hash = password_hasher.hash(password) if needs_rehash else None
         
-        # Tạo session
+        # Cập nhật last_login trong bộ nhớ, ghi file theo lô (write-behind)
+        user_key = user.get("username") or user.get("email")
+        last_login = {user_key: datetime.now().isoformat()}
+        with self._cache_lock:
+            # Áp vào directory hiện tại (có thể vừa được đọc lại từ file) rồi mới đưa vào hàng chờ ghi
+            directory = self._get_directory_locked()
+            self._apply_activity(directory, last_login)
+            current = directory.get(user_key) or directory.get_by_email(user_key)
+            if new_hash and current is not None:
+                # Đổi hash mật khẩu thì ghi file ngay (kèm cả last_login đang chờ)
+                current["password"] = new_hash
+                if self._save_users_to_file(directory.data):
+                    logger.info(f"Password hash upgraded for user: {user_key}")
+            else:
+                for key, value in last_login.items():
+                    self._activity.put(key, value)
+        
+        # Tạo session (đủ max_concurrent_users thì session đăng nhập sớm nhất bị loại)
         session_info = {
             "username": username,
             "name": user.get("name"),
-            "email": user.get("email"),
-            "login_time": datetime.now(),
-            "last_activity": datetime.now()
+            "email": user.get("email")
         }
-        
-        with self._session_lock:
-            # Kiểm tra active sessions
-            if len(self._active_sessions) >= self.max_concurrent_users:
-                # Loại bỏ session cũ nhất
-                oldest_session = min(
-                    self._active_sessions.items(),
-                    key=lambda x: x[1]["login_time"]
-                )
-                del self._active_sessions[oldest_session[0]]
-                logger.warning(f"Removed oldest session: {oldest_session[0]}")
-            
-            self._active_sessions[username] = session_info
+        for evicted in self._sessions.create(username, session_info, self.max_concurrent_users):
+            logger.warning(f"Removed oldest session: {evicted}")
         
         logger.info(f"User logged in successfully: {username}")
         return True, "Đăng nhập thành công", {
@@ -269,39 +321,34 @@ class ConcurrentLoginManager:
     
     def logout_user(self, username: str) -> bool:
         """Đăng xuất user"""
-        with self._session_lock:
-            if username in self._active_sessions:
-                del self._active_sessions[username]
-                logger.info(f"User logged out: {username}")
-                return True
+        if self._sessions.delete(username):
+            logger.info(f"User logged out: {username}")
+            return True
         return False
     
     def get_active_sessions_count(self) -> int:
         """Lấy số lượng active sessions"""
-        with self._session_lock:
-            return len(self._active_sessions)
+        return self._sessions.count()
     
     def get_active_sessions(self) -> List[str]:
         """Lấy danh sách active sessions"""
-        with self._session_lock:
-            return list(self._active_sessions.keys())
+        return self._sessions.keys()
     
     def is_user_online(self, username: str) -> bool:
         """Kiểm tra user có online không"""
-        with self._session_lock:
-            return username in self._active_sessions
+        return self._sessions.get(username) is not None
     
     def update_user_activity(self, username: str):
         """Cập nhật last_activity của user"""
-        with self._session_lock:
-            if username in self._active_sessions:
-                self._active_sessions[username]["last_activity"] = datetime.now()
+        self._sessions.touch(username)
+    
+    def activity_due(self, username: str) -> bool:
+        """update_user_activity có phải ghi session store không (kiểm tra trong bộ nhớ, không I/O)"""
+        return self._sessions.touch_due(username)
     
     def get_user_info(self, username: str) -> Optional[Dict]:
         """Lấy thông tin user"""
-        data = self.get_users_cached()
-        users = data.get("users", [])
-        user = next((u for u in users if u["username"] == username), None)
+        user = self.get_directory().get(username)
         
         if user:
             # Không trả về password hash
@@ -316,38 +363,48 @@ class ConcurrentLoginManager:
         if len(new_password) < 6:
             return False, "Mật khẩu phải ít nhất 6 ký tự"
         
-        data = self.get_users_cached()
-        users = data.get("users", [])
-        user = next((u for u in users if u["username"] == username), None)
-        
+        user = self.get_directory().get(username)
         if not user:
             return False, "User không tồn tại"
         
-        # Kiểm tra old password
-        if user["password"] != self._hash_password(old_password):
+        # Kiểm tra old password (KDF chạy ngoài lock)
+        if not password_hasher.verify(old_password, user.get("password", ""))[0]:
             return False, "Mật khẩu cũ không chính xác"
+        new_hash = self._hash_password(new_password)
         
-        # Cập nhật password
-        user["password"] = self._hash_password(new_password)
-        
-        if self._save_users_to_file(data):
-            self._invalidate_cache()
-            logger.info(f"Password updated for user: {username}")
-            return True, "Cập nhật mật khẩu thành công"
-        else:
+        with self._cache_lock:
+            directory = self._get_directory_locked()
+            user = directory.get(username)
+            if not user:
+                return False, "User không tồn tại"
+            
+            # Cập nhật password (username/email không đổi nên index giữ nguyên)
+            user["password"] = new_hash
+            
+            if self._save_users_to_file(directory.data):
+                logger.info(f"Password updated for user: {username}")
+                return True, "Cập nhật mật khẩu thành công"
+            self._directory = None
             return False, "Lỗi khi cập nhật mật khẩu"
     
+    def close(self):
+        """Ghi nốt last_login đang chờ và dừng các thread nền (không chờ tới atexit)"""
+        self._activity.stop()
+        self._sessions.stop()
+    
     def get_statistics(self) -> Dict:
         """Lấy thống kê"""
-        data = self.get_users_cached()
-        users = data.get("users", [])
+        directory = self.get_directory()
         active_count = self.get_active_sessions_count()
         
         return {
-            "total_users": len(users),
+            "total_users": len(directory),
             "active_sessions": active_count,
             "max_concurrent_users": self.max_concurrent_users,
-            "cache_status": "valid" if self._users_cache else "invalid"
+            "cache_status": "valid" if self._directory_signature is not None else "invalid",
+            "activity_write_behind": self._activity.get_stats(),
+            "password_hasher": password_hasher.get_stats(),
+            "session_store": self._sessions.get_stats()
         }
 
 
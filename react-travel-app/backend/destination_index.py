@@ -0,0 +1,87 @@
+"""
+Destination Index Module - Inverted index cho gợi ý địa điểm theo từ khoá
+- token (đã bỏ dấu, chữ thường) -> posting list các vị trí địa điểm
+- Truy vấn = giao các posting list, hỗ trợ prefix match ("thao" khớp "thao cam vien", "bao" khớp "bao tang")
+- Chọn top-k bằng heap thay vì sắp xếp toàn bộ
+"""
+
+import heapq
+from bisect import bisect_left
+from typing import Dict, FrozenSet, List
+
+import unidecode
+
+# Điểm = 10 + số từ khớp chính xác (khớp đủ mọi từ thì bằng compatibality_rate).
+# Từ chỉ khớp theo prefix không được cộng, nên kết quả khớp chính xác luôn đứng trước.
+BASE_SCORE = 10
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hoá chuỗi tìm kiếm: bỏ dấu, chữ thường"""
+    return unidecode.unidecode(text.lower())
+
+
+class DestinationIndex:
+    """Index bất biến dựng từ danh sách địa điểm đã chuẩn hoá (có search_words/search_phrases)"""
+
+    def __init__(self, destinations: List[Dict]):
+        self.destinations = destinations
+
+        postings: Dict[str, set] = {}
+        for position, dest in enumerate(destinations):
+            tokens = set(dest.get("search_words", ()))
+            for phrase in dest.get("search_phrases", ()):
+                tokens.update(phrase.split())
+            for token in tokens:
+                postings.setdefault(token, set()).add(position)
+
+        self._postings: Dict[str, FrozenSet[int]] = {token: frozenset(p) for token, p in postings.items()}
+        # Token sắp xếp để tìm theo prefix bằng bisect
+        self._tokens: List[str] = sorted(self._postings)
+
+    def __len__(self) -> int:
+        return len(self.destinations)
+
+    def _prefix_matches(self, word: str) -> FrozenSet[int]:
+        """Vị trí các địa điểm có token bắt đầu bằng word (bao gồm token trùng khớp)"""
+        start = bisect_left(self._tokens, word)
+        end = start
+        while end < len(self._tokens) and self._tokens[end].startswith(word):
+            end += 1
+        if end - start == 1:
+            return self._postings[self._tokens[start]]
+        matches = set()
+        for token in self._tokens[start:end]:
+            matches.update(self._postings[token])
+        return frozenset(matches)
+
+    def search(self, preference: str, limit: int = 5) -> List[Dict]:
+        """
+        Địa điểm khớp TẤT CẢ các từ trong preference (chính xác hoặc theo prefix),
+        sắp xếp theo điểm giảm dần; cùng điểm thì giữ thứ tự trong database.
+        """
+        words = set(normalize_text(preference).split())
+        if not words or limit <= 0:
+            return []
+
+        per_word = []
+        for word in words:
+            matches = self._prefix_matches(word)
+            if not matches:
+                return []
+            per_word.append((matches, self._postings.get(word, frozenset())))
+
+        # Giao từ posting list nhỏ nhất để tập ứng viên giảm nhanh nhất
+        per_word.sort(key=lambda item: len(item[0]))
+        candidates = set(per_word[0][0])
+        for matches, _ in per_word[1:]:
+            candidates &= matches
+            if not candidates:
+                return []
+
+        def rank(position):
+            score = BASE_SCORE + sum(1 for _, exact_postings in per_word if position in exact_postings)
+            return (-score, position)
+
+        best = heapq.nsmallest(limit, candidates, key=rank)
+        return [self.destinations[position] for position in best]
@@ -0,0 +1,96 @@
+"""
+Districts Module - Bảng quận/huyện từ vn_provinces_coords.csv, đọc một lần cho cả process
+- Toạ độ tâm quận giữ trong CoordinateArray (NumPy) để gán quận gần nhất theo lô
+- Tự đọc lại khi file CSV thay đổi
+"""
+
+import csv
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from geo_distance import CoordinateArray
+from reloadable import ReloadableFile
+
+logger = logging.getLogger(__name__)
+
+DISTRICTS_FILE = os.path.join(os.path.dirname(__file__), 'vn_provinces_coords.csv')
+
+# Điểm cách tâm quận gần nhất xa hơn ngưỡng này coi như ngoài khu vực (không gán quận)
+MAX_DISTRICT_DISTANCE_KM = 30.0
+
+
+class DistrictTable:
+    """Snapshot bất biến của bảng quận/huyện"""
+
+    def __init__(self, districts: List[Dict]):
+        self.districts = districts
+        self.codes: List[str] = [d['district'] for d in districts]
+        self.by_code: Dict[str, Dict] = {d['district']: d for d in districts}
+        self._centroids = CoordinateArray([d['lat'] for d in districts], [d['lon'] for d in districts])
+
+    def __len__(self) -> int:
+        return len(self.districts)
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[Dict, float]]:
+        """Quận có tâm gần (lat, lon) nhất và khoảng cách (km); None nếu ngoài khu vực"""
+        if not self.districts:
+            return None
+        rows, distances = self._centroids.nearest([lat], [lon])
+        if distances[0] > MAX_DISTRICT_DISTANCE_KM:
+            return None
+        return self.districts[int(rows[0])], float(distances[0])
+
+    def assign(self, points: Iterable[Tuple[Optional[float], Optional[float]]]) -> List[Optional[str]]:
+        """Mã quận cho từng toạ độ (None nếu thiếu toạ độ hoặc ngoài khu vực), tính trong một lần"""
+        points = list(points)
+        codes: List[Optional[str]] = [None] * len(points)
+        valid = [i for i, (lat, lon) in enumerate(points) if lat and lon]
+        if not valid or not self.districts:
+            return codes
+
+        rows, distances = self._centroids.nearest([points[i][0] for i in valid],
+                                                  [points[i][1] for i in valid])
+        for i, row, distance in zip(valid, rows, distances):
+            if distance <= MAX_DISTRICT_DISTANCE_KM:
+                codes[i] = self.codes[int(row)]
+        return codes
+
+
+def _build_table(path: str) -> DistrictTable:
+    districts = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                if row.get('district') and row.get('name') and row.get('lat') and row.get('lon'):
+                    try:
+                        districts.append({
+                            'district': row['district'].strip(),
+                            'name': row['name'].strip(),
+                            'lat': float(row['lat']),
+                            'lon': float(row['lon'])
+                        })
+                    except ValueError:
+                        # Bỏ qua dòng có lat/lon không hợp lệ
+                        continue
+    except OSError as e:
+        logger.warning(f"Cannot load districts from {path}: {e}")
+    logger.info(f"District table built with {len(districts)} districts")
+    return DistrictTable(districts)
+
+
+_table = ReloadableFile(DISTRICTS_FILE, _build_table)
+
+
+def get_district_table() -> DistrictTable:
+    """Bảng quận hiện tại (đọc lại nếu file CSV đã thay đổi)"""
+    return _table.get()
+
+
+def find_district(lat: Optional[float], lon: Optional[float]) -> Optional[str]:
+    """Mã quận gần (lat, lon) nhất, None nếu không xác định được"""
+    if not (lat and lon):
+        return None
+    match = get_district_table().nearest(lat, lon)
+    return match[0]['district'] if match else None
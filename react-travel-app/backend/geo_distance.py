@@ -0,0 +1,71 @@
+"""
+Geo Distance Module - Tính khoảng cách haversine theo lô bằng NumPy
+- haversine_km: khoảng cách giữa các điểm/mảng điểm (broadcast như NumPy)
+- CoordinateArray: mảng toạ độ cố định với radian và cos(vĩ độ) tính sẵn,
+  tính khoảng cách từ một hoặc nhiều điểm tới toàn bộ mảng trong một lần gọi
+"""
+
+import math
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def _haversine(lat_rad, lon_rad, cos_lat, other_lat_rad, other_lon_rad, other_cos_lat):
+    """Haversine trên toạ độ đã đổi sang radian (chấp nhận số hoặc mảng)"""
+    a = (np.sin((other_lat_rad - lat_rad) / 2) ** 2
+         + cos_lat * other_cos_lat * np.sin((other_lon_rad - lon_rad) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Khoảng cách (km) giữa (lat1, lon1) và (lat2, lon2), toạ độ theo độ.
+    Tham số có thể là số hoặc mảng NumPy; kết quả broadcast theo NumPy.
+    """
+    lat1_rad, lat2_rad = np.radians(lat1), np.radians(lat2)
+    return _haversine(lat1_rad, np.radians(lon1), np.cos(lat1_rad),
+                      lat2_rad, np.radians(lon2), np.cos(lat2_rad))
+
+
+class CoordinateArray:
+    """Mảng toạ độ (lat, lon) bất biến, giữ sẵn radian và cos(vĩ độ)"""
+
+    def __init__(self, lats: Iterable[float], lons: Iterable[float]):
+        self.lat_rad = np.radians(np.asarray(lats, dtype=np.float64))
+        self.lon_rad = np.radians(np.asarray(lons, dtype=np.float64))
+        self.cos_lat = np.cos(self.lat_rad)
+
+    @classmethod
+    def from_points(cls, points: Iterable[Tuple[float, float]]) -> "CoordinateArray":
+        points = list(points)
+        return cls([lat for lat, _ in points], [lon for _, lon in points])
+
+    def __len__(self) -> int:
+        return len(self.lat_rad)
+
+    def distances_from(self, lat: float, lon: float, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Khoảng cách (km) từ một điểm tới mọi toạ độ, hoặc chỉ các dòng trong rows"""
+        lat_rad = math.radians(lat)
+        if rows is None:
+            return _haversine(lat_rad, math.radians(lon), math.cos(lat_rad),
+                              self.lat_rad, self.lon_rad, self.cos_lat)
+        return _haversine(lat_rad, math.radians(lon), math.cos(lat_rad),
+                          self.lat_rad[rows], self.lon_rad[rows], self.cos_lat[rows])
+
+    def distance_matrix(self, lats: Iterable[float], lons: Iterable[float]) -> np.ndarray:
+        """Ma trận khoảng cách (km) shape (số điểm truy vấn, len(self))"""
+        query_lat = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+        query_lon = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+        return _haversine(query_lat, query_lon, np.cos(query_lat),
+                          self.lat_rad[None, :], self.lon_rad[None, :], self.cos_lat[None, :])
+
+    def nearest(self, lats: Iterable[float], lons: Iterable[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Với mỗi điểm truy vấn: (chỉ số toạ độ gần nhất, khoảng cách km)"""
+        if len(self) == 0:
+            raise ValueError("CoordinateArray is empty")
+        matrix = self.distance_matrix(lats, lons)
+        rows = np.argmin(matrix, axis=1)
+        return rows, matrix[np.arange(len(rows)), rows]
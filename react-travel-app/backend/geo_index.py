@@ -0,0 +1,124 @@
+"""
+Geo Index Module - Index không gian cho toạ độ địa điểm
+- Chia toạ độ thành lưới ô vuông theo độ (grid bucket), mỗi ô giữ danh sách điểm
+- Truy vấn bán kính chỉ xét các ô giao với bounding box của vòng tròn tìm kiếm
+- Khoảng cách chính xác (haversine) tính theo lô bằng geo_distance trên tập ứng viên
+- k-nearest: nới bán kính gấp đôi cho đến khi đủ k điểm
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from geo_distance import EARTH_RADIUS_KM, CoordinateArray
+
+# Độ dài 1 độ vĩ (km)
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Nửa chu vi Trái Đất: bán kính lớn hơn thì mọi điểm đều nằm trong
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+DEFAULT_CELL_DEGREES = 0.1  # ~11 km theo vĩ độ
+
+
+class GeoIndex:
+    """
+    Index bất biến trên danh sách toạ độ (lat, lon).
+    Điểm thiếu toạ độ (None/0) được bỏ qua. Kết quả trả về vị trí trong danh sách gốc.
+    """
+
+    def __init__(self, points: Iterable[Tuple[Optional[float], Optional[float]]],
+                 cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._columns_per_turn = round(360 / cell_degrees)
+
+        positions, lats, lons = [], [], []
+        for position, (lat, lon) in enumerate(points):
+            if lat and lon:
+                positions.append(position)
+                lats.append(float(lat))
+                lons.append(float(lon))
+
+        self._positions = np.array(positions, dtype=np.int64)
+        self._coordinates = CoordinateArray(lats, lons)
+
+        # (ô vĩ độ, ô kinh độ) -> chỉ số trong các mảng trên
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for row, (lat, lon) in enumerate(zip(lats, lons)):
+            cells.setdefault(self._cell(lat, lon), []).append(row)
+        self._cells = {cell: np.array(rows, dtype=np.int64) for cell, rows in cells.items()}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _wrap_column(self, col: int) -> int:
+        """Đưa chỉ số cột về một vòng kinh độ, để ô hai bên kinh tuyến 180 liền nhau"""
+        half = self._columns_per_turn // 2
+        return (col + half) % self._columns_per_turn - half
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), self._wrap_column(math.floor(lon / self.cell_degrees)))
+
+    def _candidate_rows(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Chỉ số các điểm nằm trong những ô giao với bounding box của vòng tròn"""
+        lat_delta = radius_km / KM_PER_DEGREE
+        min_lat, max_lat = lat - lat_delta, lat + lat_delta
+        if min_lat <= -90 or max_lat >= 90:
+            return np.arange(len(self._positions))
+        # Kinh độ co lại theo cos(vĩ độ); lấy vĩ độ xa xích đạo nhất trong box
+        cos_edge = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+        lon_delta = radius_km / (KM_PER_DEGREE * cos_edge)
+        if lon_delta >= 180:
+            return np.arange(len(self._positions))
+
+        min_row = math.floor(min_lat / self.cell_degrees)
+        max_row = math.floor(max_lat / self.cell_degrees)
+        # Cột chưa wrap, có thể vượt ra ngoài [-180, 180) khi box cắt kinh tuyến 180
+        min_col = math.floor((lon - lon_delta) / self.cell_degrees)
+        max_col = math.floor((lon + lon_delta) / self.cell_degrees)
+
+        box_cells = (max_row - min_row + 1) * (max_col - min_col + 1)
+        if box_cells <= len(self._cells):
+            chunks = []
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    rows = self._cells.get((row, self._wrap_column(col)))
+                    if rows is not None:
+                        chunks.append(rows)
+        else:
+            # Bán kính lớn: duyệt các ô có dữ liệu thay vì mọi ô trong box
+            chunks = [rows for (row, col), rows in self._cells.items()
+                      if min_row <= row <= max_row
+                      and (col - min_col) % self._columns_per_turn <= max_col - min_col]
+
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(chunks))
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """Các điểm cách (lat, lon) không quá radius_km: [(vị trí, khoảng cách km)], gần nhất trước"""
+        if len(self._positions) == 0 or radius_km < 0:
+            return []
+        rows = self._candidate_rows(lat, lon, radius_km)
+        if len(rows) == 0:
+            return []
+
+        distances = self._coordinates.distances_from(lat, lon, rows)
+        inside = distances <= radius_km
+        rows, distances = rows[inside], distances[inside]
+        order = np.lexsort((self._positions[rows], distances))
+        return [(int(self._positions[rows[i]]), float(distances[i])) for i in order]
+
+    def nearest(self, lat: float, lon: float, k: int,
+                max_radius_km: Optional[float] = None) -> List[Tuple[int, float]]:
+        """k điểm gần (lat, lon) nhất, có thể giới hạn trong max_radius_km"""
+        if k <= 0 or len(self._positions) == 0:
+            return []
+        limit = MAX_DISTANCE_KM if max_radius_km is None else min(max_radius_km, MAX_DISTANCE_KM)
+        radius = min(self.cell_degrees * KM_PER_DEGREE, limit)
+        while True:
+            # within() trả về mọi điểm trong bán kính, nên k điểm đầu chắc chắn là gần nhất
+            found = self.within(lat, lon, radius)
+            if len(found) >= k or radius >= limit:
+                return found[:k]
+            radius = min(radius * 2, limit)
@@ -0,0 +1,304 @@
+"""
+Geocode Cache Module - Geocoding offline trước, Nominatim sau cùng
+- Gazetteer offline dựng từ database.json (địa danh) và vn_provinces_coords.csv (quận/huyện)
+- Cache bền vững (file JSON) theo ô lat/lon làm tròn và theo tên đã chuẩn hoá
+- LRU eviction, cache cả kết quả "không tìm thấy" (negative cache, TTL ngắn hơn);
+  lỗi mạng chỉ được nhớ GEOCODE_ERROR_TTL giây để Nominatim gặp sự cố không làm hỏng tra cứu cả ngày
+- Một geolocator Nominatim dùng chung, giới hạn 1 request/giây theo chính sách của Nominatim
+"""
+
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from districts import DISTRICTS_FILE, get_district_table
+from geo_index import GeoIndex
+from landmark_catalog import DATABASE_FILE, get_landmark_catalog, normalize_name
+from reloadable import ReloadableFile
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_CACHE_FILE = os.getenv('GEOCODE_CACHE_FILE', os.path.join(os.path.dirname(__file__), 'geocode_cache.json'))
+# Số chữ số thập phân khi làm tròn toạ độ: 3 ~ ô 110 m
+GEOCODE_CELL_PRECISION = int(os.getenv('GEOCODE_CELL_PRECISION', '3'))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', '10000'))
+GEOCODE_CACHE_TTL = float(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = float(os.getenv('GEOCODE_NEGATIVE_TTL', str(24 * 3600)))
+# Sau lỗi mạng/timeout: không gọi lại Nominatim cho cùng key trong khoảng này (giây)
+GEOCODE_ERROR_TTL = float(os.getenv('GEOCODE_ERROR_TTL', '60'))
+# GEOCODE_OFFLINE=1: không gọi Nominatim (chạy test / môi trường không có mạng)
+GEOCODE_OFFLINE = os.getenv('GEOCODE_OFFLINE', '0') == '1'
+
+NOMINATIM_USER_AGENT = "travel_app_recognizer"
+NOMINATIM_TIMEOUT = 5
+NOMINATIM_MIN_INTERVAL = 1.0
+
+# Ảnh chụp cách địa danh trong database không quá ngưỡng này thì lấy luôn địa chỉ địa danh
+LANDMARK_MATCH_RADIUS_KM = 0.3
+DEFAULT_CITY = "TP. Hồ Chí Minh"
+
+
+class GeocodeCache:
+    """
+    Cache {key -> kết quả geocoding}, key dạng "rev:lat,lon" hoặc "fwd:tên chuẩn hoá".
+    Kết quả None được lưu như negative entry với TTL riêng; put(..., ttl=) đặt TTL cho từng entry
+    (vd. lỗi mạng).
+    """
+
+    def __init__(self, cache_file: str, max_entries: int = 10000, ttl: float = 30 * 24 * 3600,
+                 negative_ttl: float = 24 * 3600, save_interval: float = 30.0):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.save_interval = save_interval
+
+        self._lock = Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._dirty = False
+        self._last_save = 0.0
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+        self._load()
+
+    @staticmethod
+    def reverse_key(lat: float, lon: float, precision: int = GEOCODE_CELL_PRECISION) -> str:
+        return f"rev:{round(lat, precision):.{precision}f},{round(lon, precision):.{precision}f}"
+
+    @staticmethod
+    def forward_key(name: str) -> str:
+        return f"fwd:{' '.join(normalize_name(name).split())}"
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        ttl = entry.get("ttl")
+        if ttl is None:
+            ttl = self.negative_ttl if entry["value"] is None else self.ttl
+        return now - entry["created_at"] > ttl
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(found, value); found=True với value=None nghĩa là đã biết là không tìm thấy"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._dirty = True
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats["hits" if entry["value"] is not None else "negative_hits"] += 1
+            return True, entry["value"]
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None):
+        entry = {"value": value, "created_at": time.time()}
+        if ttl is not None:
+            entry["ttl"] = ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._dirty = True
+        if time.time() - self._last_save >= self.save_interval:
+            self.save()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits = self._stats["hits"] + self._stats["negative_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Cannot load geocode cache {self.cache_file}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, entry in data.get("entries", []):
+                if not self._expired(entry, now):
+                    self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        logger.info(f"Loaded {len(self._entries)} geocode cache entries")
+
+    def save(self):
+        """Ghi cache ra file (atomic), theo thứ tự LRU"""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = list(self._entries.items())
+            self._dirty = False
+            self._last_save = time.time()
+
+        directory = os.path.dirname(self.cache_file) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except Exception as e:
+            logger.error(f"Cannot save geocode cache: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class Gazetteer:
+    """Danh bạ địa điểm offline: địa danh trong database và tâm các quận/huyện"""
+
+    def __init__(self, landmarks, district_table):
+        self._landmarks = [info for info in landmarks if info.get("lat") and info.get("lon")]
+        self._landmark_index = GeoIndex((info["lat"], info["lon"]) for info in self._landmarks)
+        self._district_table = district_table
+
+        # Tên quận (mã và tên hiển thị) -> quận
+        self._districts_by_name: Dict[str, Dict] = {}
+        for district in district_table.districts:
+            for name in (district["district"], district["name"]):
+                self._districts_by_name.setdefault(normalize_name(name), district)
+
+    @staticmethod
+    def _landmark_address(info: Dict) -> str:
+        parts = [info.get("name"), info.get("location")]
+        province = info.get("province")
+        if province and province not in (info.get("location") or ""):
+            parts.append(province)
+        return ", ".join(part for part in parts if part)
+
+    @staticmethod
+    def _district_address(district: Dict) -> str:
+        return f"{district['name']}, {DEFAULT_CITY}"
+
+    def reverse_landmark(self, lat: float, lon: float) -> Optional[str]:
+        """Địa chỉ của địa danh trong database nằm ngay tại (lat, lon)"""
+        found = self._landmark_index.nearest(lat, lon, 1, LANDMARK_MATCH_RADIUS_KM)
+        if not found:
+            return None
+        return self._landmark_address(self._landmarks[found[0][0]])
+
+    def reverse_district(self, lat: float, lon: float) -> Optional[str]:
+        """Tên quận/huyện chứa (lat, lon) - địa chỉ thô dùng khi không có mạng"""
+        match = self._district_table.nearest(lat, lon)
+        return self._district_address(match[0]) if match else None
+
+    def forward(self, name: str) -> Optional[Dict]:
+        """Toạ độ của một quận/huyện theo tên (địa danh đã được landmark catalog xử lý)"""
+        district = self._districts_by_name.get(normalize_name(name).strip())
+        if district is None:
+            return None
+        return {"lat": district["lat"], "lon": district["lon"], "address": self._district_address(district)}
+
+
+def _build_gazetteer(path: str) -> Gazetteer:
+    gazetteer = Gazetteer(get_landmark_catalog().by_name.values(), get_district_table())
+    logger.info("Offline gazetteer built")
+    return gazetteer
+
+
+class CachedGeocoder:
+    """Geocoding: gazetteer offline -> cache -> Nominatim (một geolocator dùng chung)"""
+
+    def __init__(self, cache: GeocodeCache, offline: bool = False, error_ttl: float = GEOCODE_ERROR_TTL):
+        self.cache = cache
+        self.offline = offline
+        self.error_ttl = error_ttl
+        self._gazetteer = ReloadableFile(DATABASE_FILE, _build_gazetteer, extra_paths=[DISTRICTS_FILE])
+        self._geolocator = None
+        self._network_lock = Lock()
+        self._last_request = 0.0
+        self._stats = {"gazetteer_hits": 0, "network_calls": 0, "network_errors": 0}
+
+    def _nominatim(self, method: str, *args, **kwargs):
+        """Gọi Nominatim tuần tự, cách nhau ít nhất NOMINATIM_MIN_INTERVAL giây"""
+        with self._network_lock:
+            if self._geolocator is None:
+                from geopy.geocoders import Nominatim
+                self._geolocator = Nominatim(user_agent=NOMINATIM_USER_AGENT, timeout=NOMINATIM_TIMEOUT)
+            wait = NOMINATIM_MIN_INTERVAL - (time.time() - self._last_request)
+            if wait > 0:
+                time.sleep(wait)
+            self._stats["network_calls"] += 1
+            try:
+                return getattr(self._geolocator, method)(*args, **kwargs)
+            finally:
+                self._last_request = time.time()
+
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        """Toạ độ -> địa chỉ"""
+        gazetteer = self._gazetteer.get()
+        address = gazetteer.reverse_landmark(lat, lon)
+        if address:
+            self._stats["gazetteer_hits"] += 1
+            return address
+
+        key = self.cache.reverse_key(lat, lon)
+        found, address = self.cache.get(key)
+        if not found and not self.offline:
+            try:
+                location = self._nominatim("reverse", (lat, lon), language="vi")
+                address = location.address if location else None
+                self.cache.put(key, address)
+            except Exception as e:
+                # Lỗi mạng: chỉ nhớ error_ttl giây để không gọi lại liên tục, không như "không tìm thấy"
+                self._stats["network_errors"] += 1
+                print(f"[GEOCODE] Reverse geocoding error: {e}")
+                self.cache.put(key, None, ttl=self.error_ttl)
+
+        # Không có địa chỉ chi tiết thì trả về quận/huyện gần nhất
+        return address or gazetteer.reverse_district(lat, lon)
+
+    def geocode(self, name: str) -> Optional[Dict]:
+        """Tên địa điểm -> {"lat", "lon", "address"}"""
+        info = self._gazetteer.get().forward(name)
+        if info is not None:
+            self._stats["gazetteer_hits"] += 1
+            return info
+
+        key = self.cache.forward_key(name)
+        found, info = self.cache.get(key)
+        if found or self.offline:
+            # Trả về bản sao để caller sửa không ảnh hưởng cache
+            return dict(info) if info else None
+        try:
+            # Thêm "Vietnam" để tìm kiếm chính xác hơn
+            location = self._nominatim("geocode", f"{name}, Vietnam", language="vi")
+            info = {"lat": location.latitude, "lon": location.longitude, "address": location.address} if location else None
+            self.cache.put(key, info)
+        except Exception as e:
+            self._stats["network_errors"] += 1
+            print(f"[GEOCODE] Geocoding error: {e}")
+            self.cache.put(key, None, ttl=self.error_ttl)
+        return dict(info) if info else None
+
+    def get_stats(self) -> Dict:
+        return {**self._stats, "offline": self.offline, "cache": self.cache.get_stats()}
+
+
+# Global instance
+geocoder = CachedGeocoder(
+    GeocodeCache(
+        GEOCODE_CACHE_FILE,
+        max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+        ttl=GEOCODE_CACHE_TTL,
+        negative_ttl=GEOCODE_NEGATIVE_TTL
+    ),
+    offline=GEOCODE_OFFLINE
+)
@@ -0,0 +1,169 @@
+"""
+Image Derivatives Module - Bản thu nhỏ (thumb/medium) của ảnh trong blob store
+- Lưu cạnh file gốc: <root>/<hash[:2]>/<hash>.<size>.webp (JPEG nếu Pillow không có WebP)
+- Tạo khi ingest (từ ảnh đã decode sẵn) hoặc lazily ở lần request đầu tiên
+- Blob gốc bất biến nên derivative cũng bất biến, serve thẳng từ đĩa với ETag <hash>-<size>
+"""
+
+import os
+import tempfile
+import time
+from io import BytesIO
+from threading import Lock
+from typing import Dict, Iterable, Optional
+
+from PIL import Image, ImageOps, features
+
+from blob_store import BlobStore, blob_store
+
+# Tên size -> cạnh dài tối đa (px)
+DERIVATIVE_SIZES = {
+    "thumb": int(os.getenv('DERIVATIVE_THUMB_EDGE', '256')),
+    "medium": int(os.getenv('DERIVATIVE_MEDIUM_EDGE', '1024')),
+}
+DERIVATIVE_QUALITY = int(os.getenv('DERIVATIVE_QUALITY', '80'))
+# Các size tạo luôn khi ingest (phân cách bằng dấu phẩy, rỗng = chỉ tạo lazily)
+DERIVATIVE_EAGER_SIZES = [s.strip() for s in os.getenv('DERIVATIVE_EAGER_SIZES', 'thumb').split(',') if s.strip()]
+
+ORIGINAL_SIZE = "original"
+
+if features.check('webp'):
+    DERIVATIVE_FORMAT, DERIVATIVE_EXTENSION, DERIVATIVE_CONTENT_TYPE = "WEBP", "webp", "image/webp"
+else:
+    DERIVATIVE_FORMAT, DERIVATIVE_EXTENSION, DERIVATIVE_CONTENT_TYPE = "JPEG", "jpg", "image/jpeg"
+
+
+def is_valid_size(size: str) -> bool:
+    return size == ORIGINAL_SIZE or size in DERIVATIVE_SIZES
+
+
+class DerivativeStore:
+    """Tạo và tìm derivative của blob; mỗi (hash, size) chỉ được encode một lần dù nhiều request đồng thời"""
+
+    def __init__(self, store: BlobStore = blob_store, sizes: Dict[str, int] = DERIVATIVE_SIZES,
+                 quality: int = DERIVATIVE_QUALITY):
+        self.store = store
+        self.sizes = sizes
+        self.quality = quality
+
+        self._lock = Lock()
+        # (hash, size) -> Lock của lần tạo đang chạy
+        self._pending: Dict[tuple, Lock] = {}
+        self._stats = {"generated": 0, "lazy": 0, "eager": 0, "source_bytes": 0, "derivative_bytes": 0,
+                       "generate_ms": 0.0}
+
+    def path(self, blob_hash: str, size: str) -> str:
+        """Đường dẫn file derivative (cạnh blob gốc)"""
+        if size not in self.sizes:
+            raise ValueError(f"Unknown derivative size: {size!r}")
+        return f"{self.store.path(blob_hash)}.{size}.{DERIVATIVE_EXTENSION}"
+
+    def exists(self, blob_hash: str, size: str) -> bool:
+        return os.path.exists(self.path(blob_hash, size))
+
+    def _render(self, image: Image.Image, edge: int) -> bytes:
+        """Thu nhỏ ảnh (đã xoay đúng chiều) về cạnh dài <= edge và encode"""
+        if max(image.size) > edge:
+            image = image.copy()
+            image.thumbnail((edge, edge), Image.Resampling.BICUBIC, reducing_gap=2.0)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        if DERIVATIVE_FORMAT == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = BytesIO()
+        image.save(buffer, format=DERIVATIVE_FORMAT, quality=self.quality)
+        return buffer.getvalue()
+
+    def _open_source(self, blob_hash: str, edge: int) -> Image.Image:
+        """Mở blob gốc, JPEG được draft thẳng về gần kích thước cần; file được đóng trước khi trả về"""
+        with Image.open(self.store.path(blob_hash)) as image:
+            image.draft("RGB", (edge, edge))
+            # exif_transpose trả về ảnh mới khi có xoay; không xoay thì load() để đọc hết trước khi đóng file
+            transposed = ImageOps.exif_transpose(image)
+            transposed.load()
+            return transposed if transposed is not image else image.copy()
+
+    def _write(self, path: str, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _generate(self, blob_hash: str, size: str, source: Optional[Image.Image], kind: str) -> str:
+        path = self.path(blob_hash, size)
+        key = (blob_hash, size)
+        with self._lock:
+            pending = self._pending.setdefault(key, Lock())
+
+        with pending:
+            # Request khác vừa tạo xong trong lúc chờ lock
+            if os.path.exists(path):
+                return path
+            start = time.perf_counter()
+            edge = self.sizes[size]
+            try:
+                # Ảnh đã decode sẵn chỉ dùng được nếu còn đủ lớn cho size này
+                if source is None or max(source.size) < edge:
+                    source = self._open_source(blob_hash, edge)
+                data = self._render(source, edge)
+                self._write(path, data)
+            finally:
+                # Cả khi decode/ghi lỗi: không để lại lock trong _pending
+                with self._lock:
+                    self._pending.pop(key, None)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            with self._lock:
+                self._stats["generated"] += 1
+                self._stats[kind] += 1
+                self._stats["source_bytes"] += self.store.size(blob_hash)
+                self._stats["derivative_bytes"] += len(data)
+                self._stats["generate_ms"] += elapsed_ms
+        return path
+
+    def get_path(self, blob_hash: str, size: str) -> str:
+        """Đường dẫn derivative, tạo lazily nếu chưa có (blob gốc phải tồn tại)"""
+        path = self.path(blob_hash, size)
+        if os.path.exists(path):
+            return path
+        return self._generate(blob_hash, size, None, "lazy")
+
+    def get(self, blob_hash: str, size: str) -> Optional[bytes]:
+        """Bytes của derivative; None nếu blob gốc không tồn tại"""
+        if not self.store.exists(blob_hash):
+            return None
+        with open(self.get_path(blob_hash, size), "rb") as f:
+            return f.read()
+
+    def generate(self, blob_hash: str, sizes: Iterable[str] = DERIVATIVE_EAGER_SIZES,
+                 image: Optional[Image.Image] = None):
+        """
+        Tạo trước các derivative khi ingest. image: ảnh đã decode và xoay đúng chiều
+        (vd. kết quả vision_preprocessor.prepare) để khỏi decode lại blob gốc.
+        """
+        for size in sizes:
+            if size in self.sizes and not self.exists(blob_hash, size):
+                self._generate(blob_hash, size, image, "eager")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            generated = self._stats["generated"]
+            return {
+                **self._stats,
+                "generate_ms": round(self._stats["generate_ms"], 1),
+                "avg_generate_ms": round(self._stats["generate_ms"] / generated, 2) if generated else 0.0,
+                "bytes_saved": max(0, self._stats["source_bytes"] - self._stats["derivative_bytes"]),
+                "sizes": dict(self.sizes),
+                "format": DERIVATIVE_FORMAT,
+            }
+
+
+# Global instance
+derivative_store = DerivativeStore()
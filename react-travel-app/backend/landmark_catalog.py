@@ -0,0 +1,153 @@
+"""
+Landmark Catalog Module - Danh mục địa danh từ database.json, dựng một lần cho cả process
+- Index theo tên đã chuẩn hoá (unidecode + lowercase) cho exact match
+- Index n-gram (1-3 ký tự) cho partial match và fuzzy match
+- Tự dựng lại khi database.json thay đổi
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+import logging
+
+import unidecode
+
+from reloadable import ReloadableFile
+
+logger = logging.getLogger(__name__)
+
+DATABASE_FILE = os.path.join(os.path.dirname(__file__), 'database.json')
+
+NGRAM_SIZE = 3
+# Ngưỡng tương đồng trigram (Dice) để coi là fuzzy match
+FUZZY_MIN_SIMILARITY = 0.7
+
+
+def normalize_name(name: str) -> str:
+    """Chuẩn hoá tên để so sánh: bỏ dấu, chữ thường"""
+    return unidecode.unidecode(name.lower())
+
+
+def _ngrams(text: str, n: int) -> set:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class LandmarkCatalog:
+    """Snapshot bất biến của danh mục địa danh"""
+
+    def __init__(self, data: List[Dict]):
+        self.names: List[str] = [item.get("name", "") for item in data if item.get("name")]
+
+        # normalized_name -> info; key trùng thì item sau ghi đè (giống cách dựng dict cũ)
+        self.by_name: Dict[str, Dict] = {}
+        for item in data:
+            name = item.get("name", "")
+            self.by_name[normalize_name(name)] = {
+                "name": name,
+                "lat": item.get("lat"),
+                "lon": item.get("lon"),
+                "location": item.get("location"),
+                "province": item.get("province")
+            }
+
+        # Thứ tự key để partial match trả về đúng key đầu tiên như khi quét tuần tự
+        self._keys: List[str] = list(self.by_name.keys())
+        self._position: Dict[str, int] = {key: i for i, key in enumerate(self._keys)}
+
+        # n-gram (n = 1..3) -> tập vị trí key chứa n-gram đó
+        self._grams: Dict[str, set] = {}
+        for position, key in enumerate(self._keys):
+            for n in range(1, NGRAM_SIZE + 1):
+                for gram in _ngrams(key, n):
+                    self._grams.setdefault(gram, set()).add(position)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _keys_containing(self, text: str) -> set:
+        """Vị trí các key chứa text làm chuỗi con"""
+        n = min(len(text), NGRAM_SIZE)
+        postings = [self._grams.get(gram) for gram in _ngrams(text, n)]
+        if not postings or any(p is None for p in postings):
+            return set()
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return set()
+        if len(text) <= NGRAM_SIZE:
+            return candidates
+        return {p for p in candidates if text in self._keys[p]}
+
+    def _keys_inside(self, text: str) -> set:
+        """Vị trí các key là chuỗi con của text (duyệt chuỗi con của text, không phụ thuộc số key)"""
+        found = set()
+        for start in range(len(text)):
+            for end in range(start + 1, len(text) + 1):
+                position = self._position.get(text[start:end])
+                if position is not None:
+                    found.add(position)
+        return found
+
+    def _fuzzy(self, text: str) -> Optional[int]:
+        """Key có độ tương đồng trigram cao nhất (>= FUZZY_MIN_SIMILARITY)"""
+        grams = _ngrams(text, NGRAM_SIZE)
+        if not grams:
+            return None
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for position in self._grams.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        best, best_score = None, 0.0
+        for position, count in sorted(shared.items()):
+            key_grams = max(len(self._keys[position]) - NGRAM_SIZE + 1, 1)
+            score = 2 * count / (len(grams) + key_grams)
+            if score > best_score:
+                best, best_score = position, score
+        return best if best_score >= FUZZY_MIN_SIMILARITY else None
+
+    def find(self, landmark_name: str) -> Optional[Dict]:
+        """
+        Tìm địa danh theo tên:
+        1. Exact match theo tên chuẩn hoá
+        2. Partial match (tên tìm nằm trong key hoặc key nằm trong tên tìm), ưu tiên key đứng trước
+        3. Fuzzy match theo trigram
+        """
+        normalized = normalize_name(landmark_name)
+        info = self.by_name.get(normalized)
+        if info is not None:
+            return info
+        if not self._keys:
+            return None
+        if not normalized:
+            return self.by_name[self._keys[0]]
+
+        candidates = self._keys_containing(normalized) | self._keys_inside(normalized)
+        if candidates:
+            return self.by_name[self._keys[min(candidates)]]
+
+        position = self._fuzzy(normalized)
+        if position is not None:
+            return self.by_name[self._keys[position]]
+        return None
+
+
+def _build_catalog(path: str) -> LandmarkCatalog:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"[RECOGNIZE] Warning: Could not load database.json: {e}")
+        data = []
+    catalog = LandmarkCatalog(data)
+    logger.info(f"Landmark catalog built with {len(catalog)} entries")
+    return catalog
+
+
+_catalog = ReloadableFile(DATABASE_FILE, _build_catalog)
+
+
+def get_landmark_catalog() -> LandmarkCatalog:
+    """Catalog hiện tại (dựng lại nếu database.json đã thay đổi)"""
+    return _catalog.get()
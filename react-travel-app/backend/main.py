@@ -1,8 +1,11 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends, Header, Query
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends, Header, Query, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
 import json
 import math
 from io import BytesIO
@@ -10,19 +13,32 @@ import base64
 from datetime import datetime, timedelta
 from PIL import Image
 import os
-import hashlib
 import jwt
 import resend
+from album_store import AlbumStore
+from blob_store import blob_store
+from blob_gc import BlobCollector, BLOB_GC_ON_STARTUP
+from password_hasher import password_hasher
+from token_cache import TokenCache
+from blob_serving import serve_file
+from ai_client import model_client, ModelCallTimeout
+from album_ingest import ingest_uploads, STAGE_DONE
+from recognition_jobs import recognition_jobs
+from vision_preprocess import vision_preprocessor
+from album_index import InvalidCursor, MAX_PAGE_SIZE, SORT_FIELDS, SORT_ORDERS, SORT_POSITION, project
+from image_derivatives import derivative_store, is_valid_size, ORIGINAL_SIZE, DERIVATIVE_CONTENT_TYPE, DERIVATIVE_SIZES
+from districts import get_district_table
 
 # Import our modules
 try:
     from recognize import (
-        analyze_image, get_landmark_from_image, get_landmark_with_confidence,
-        detect_location, OPENAI_ENABLED
+        analyze_image, get_landmark_from_image, get_landmark_with_confidence, recognize_landmark,
+        detect_location, get_gps_from_image, get_strict_metrics, get_recognition_cache_stats, get_geocode_stats,
+        get_vision_preprocess_stats, OPENAI_ENABLED
     )
-    from ai_recommend import recommend, loadDestination, ai_recommend
+    from ai_recommend import recommend, loadDestination, ai_recommend, get_destination_catalog
     from album_manager import (
-        zip_album, create_album_item, filter_album_items, 
+        zip_album, iter_zip_chunks, create_album_item, filter_album_items, 
         group_items_by_landmark, sort_items_by_date, add_images_to_album,
         get_album_stats
     )
@@ -38,16 +54,32 @@ except ImportError as e:
         return "Module not available"
     def get_landmark_with_confidence(*args, **kwargs):
         return {"landmark": "Module not available", "description": "", "confidence": "low"}
+    def recognize_landmark(*args, **kwargs):
+        return get_landmark_with_confidence(*args, **kwargs)
     def detect_location(*args, **kwargs):
         return "Module not available"
+    def get_gps_from_image(*args, **kwargs):
+        return None
+    def get_strict_metrics():
+        return {}
+    def get_recognition_cache_stats():
+        return {}
+    def get_geocode_stats():
+        return {}
+    def get_vision_preprocess_stats():
+        return {}
     def recommend(*args, **kwargs):
         return []
     def loadDestination():
         return []
+    def get_destination_catalog():
+        raise RuntimeError("Module not available")
     def ai_recommend(*args, **kwargs):
         return "Module not available"
     def zip_album(*args, **kwargs):
         return None
+    def iter_zip_chunks(*args, **kwargs):
+        return iter(())
     def create_album_item(*args, **kwargs):
         return {}
     def filter_album_items(*args, **kwargs):
@@ -66,27 +98,114 @@ except ImportError as e:
     class ConcurrentLoginManager:
         pass
     login_manager = None
+    social_feed_manager = None
     OPENAI_ENABLED = False
 
-app = FastAPI(title="Vietnam Travel App API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Migrate dữ liệu cũ và chạy các tác vụ nền khi server khởi động (import main không ghi file nào)"""
+    run_startup_migrations()
+    resubmit_pending_recognitions()
+    recognition_jobs.start(run_recognition_job, apply_recognition_result)
+    yield
+    recognition_jobs.stop()
+
+app = FastAPI(title="Vietnam Travel App API", lifespan=lifespan)
 
 # ===== Authentication Configuration =====
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30
+
+# Cache JWT đã xác thực, dùng chung cho verify_token / verify_token_from_string / get_current_user_email
+token_cache = TokenCache(SECRET_KEY, ALGORITHM)
 USERS_FILE = "Users.json"
-USERS_ALBUM_FILE = "Users_album.json"
+USERS_ALBUM_FILE = "Users_album.json"  # File cũ, chỉ dùng để migrate một lần
+USERS_ALBUM_DIR = "Users_album"
 REVIEWS_FILE = "Reviews.json"
 FAVORITES_FILE = "Favorites.json"
 
+# Album lưu theo shard từng user; migrate từ Users_album.json ở lần chạy đầu (xem run_startup_migrations)
+album_store = AlbumStore(USERS_ALBUM_DIR)
+
+# Dọn blob (và thumb/medium) không còn ảnh album/post nào dùng.
+# Không load được social feed thì không biết blob nào thuộc post nên tắt GC.
+blob_collector = BlobCollector(
+    blob_store,
+    [album_store.referenced_hashes] + ([social_feed_manager.referenced_hashes] if social_feed_manager else []),
+    enabled=social_feed_manager is not None,
+)
+
+def run_startup_migrations():
+    """Chuyển dữ liệu cũ sang định dạng mới (album shard, ảnh base64 -> blob store) rồi dọn blob mồ côi."""
+    album_store.migrate_from_file(USERS_ALBUM_FILE)
+    album_store.migrate_inline_images(blob_store)
+    if social_feed_manager:
+        migrated = social_feed_manager.migrate_inline_images()
+        if migrated:
+            print(f"[SOCIAL] Migrated {migrated} inline post image(s) to blob store")
+    if BLOB_GC_ON_STARTUP:
+        blob_collector.collect_in_background()
+
+# ===== Nhận dạng ảnh album chạy nền =====
+def run_recognition_job(job: dict) -> dict:
+    """Worker: nhận dạng ảnh của job; raise để queue thử lại với lỗi tạm thời (API, mạng)."""
+    with Image.open(blob_store.path(job["image_hash"])) as image_pil:
+        # Xoay/thu nhỏ (JPEG decode thẳng ở độ phân giải thấp) trước khi file đóng lại
+        image_pil = vision_preprocessor.prepare(image_pil)
+        image_pil.load()
+    # Qua model_client: chung giới hạn đồng thời và timeout với các request; lỗi API được raise để thử lại
+    return model_client.call(recognize_landmark, image_pil)
+
+def apply_recognition_result(job: dict):
+    """Ghi kết quả nhận dạng (hoặc lỗi cuối cùng) vào item có id = job id."""
+    result = job.get("result") or {
+        "landmark": "Không rõ địa danh",
+        "description": f"Lỗi: {(job.get('error') or '')[:50]}",
+        "confidence": "low"
+    }
+    
+    # Cập nhật đúng item đó, index địa danh của album được sửa tại chỗ
+    album_store.update_item(job["user_email"], job["id"], {
+        "landmark": result.get("landmark", "N/A"),
+        "description": result.get("description", ""),
+        "confidence": result.get("confidence", "low")
+    })
+
+def resubmit_pending_recognitions() -> int:
+    """
+    Tạo lại job cho item còn landmark = "pending" mà không có job (process dừng giữa add_item và submit,
+    hoặc trước khi file job kịp ghi). Trả về số job đã tạo.
+    """
+    resubmitted = 0
+    for user_email in album_store.list_users():
+        for album_name, items in album_store.load(user_email).items():
+            for item in items:
+                if item.get("landmark") != "pending" or not item.get("id") or recognition_jobs.get(item["id"]):
+                    continue
+                if item.get("image_hash"):
+                    recognition_jobs.submit(item["id"], user_email, album_name, item["image_hash"])
+                    resubmitted += 1
+                else:
+                    album_store.update_item(user_email, item["id"], {
+                        "landmark": "Không rõ địa danh",
+                        "description": "Lỗi: không tìm thấy ảnh để nhận dạng",
+                        "confidence": "low"
+                    })
+    if resubmitted:
+        print(f"[RECOGNITION JOBS] Resubmitted {resubmitted} pending items without a job")
+    return resubmitted
+
+# Worker nhận dạng được khởi động trong lifespan của app (xem lifespan)
+
 # ===== Helper Functions for User Management =====
 def hash_password(password: str) -> str:
-    """Mã hóa mật khẩu."""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Mã hóa mật khẩu (scrypt, xem password_hasher)."""
+    return password_hasher.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Kiểm tra mật khẩu."""
-    return hash_password(plain_password) == hashed_password
+    """Kiểm tra mật khẩu (nhận cả hash SHA-256 cũ)."""
+    return password_hasher.verify(plain_password, hashed_password)[0]
 
 def load_users() -> dict:
     """Tải danh sách người dùng từ file."""
@@ -105,15 +224,7 @@ def save_users(data: dict):
 
 def load_user_albums(user_email: str) -> dict:
     """Tải album của người dùng theo email."""
-    if not os.path.exists(USERS_ALBUM_FILE):
-        return {}
-    try:
-        with open(USERS_ALBUM_FILE, "r", encoding="utf-8") as f:
-            all_albums = json.load(f)
-    except json.JSONDecodeError:
-        return {}
-    
-    user_album = all_albums.get(user_email, {})
+    user_album = album_store.load(user_email)
     loaded_albums = {}
     for album_name, items in user_album.items():
         loaded_albums[album_name] = []
@@ -130,16 +241,7 @@ def load_user_albums(user_email: str) -> dict:
     return loaded_albums
 
 def save_user_albums(user_email: str, user_albums: dict):
-    """Lưu album của người dùng theo email."""
-    if os.path.exists(USERS_ALBUM_FILE):
-        try:
-            with open(USERS_ALBUM_FILE, "r", encoding="utf-8") as f:
-                all_albums_data = json.load(f)
-        except json.JSONDecodeError:
-            all_albums_data = {}
-    else:
-        all_albums_data = {}
-
+    """Lưu album của người dùng theo email (chỉ ghi shard của user đó)."""
     albums_to_save = {}
     for album_name, items in user_albums.items():
         albums_to_save[album_name] = []
@@ -150,9 +252,27 @@ def save_user_albums(user_email: str, user_albums: dict):
                 new_item['bytes'] = encoded_bytes
             albums_to_save[album_name].append(new_item)
 
-    all_albums_data[user_email] = albums_to_save
-    with open(USERS_ALBUM_FILE, "w", encoding="utf-8") as f:
-        json.dump(all_albums_data, f, indent=4, ensure_ascii=False)
+    album_store.save(user_email, albums_to_save)
+
+def read_item_image(item: dict, size: str = ORIGINAL_SIZE) -> Optional[bytes]:
+    """
+    Lấy bytes ảnh của album item từ blob store (hoặc base64 của dữ liệu cũ).
+    size = "thumb"/"medium": bản thu nhỏ (tạo lazily); dữ liệu cũ không có blob luôn trả ảnh gốc.
+    """
+    image_hash = item.get("image_hash")
+    if image_hash:
+        if size != ORIGINAL_SIZE:
+            return derivative_store.get(image_hash, size)
+        return blob_store.get(image_hash)
+    
+    encoded = item.get("image_data") or item.get("bytes")
+    if isinstance(encoded, bytes):
+        return encoded
+    if isinstance(encoded, str) and encoded:
+        if "base64," in encoded:
+            encoded = encoded.split("base64,", 1)[1]
+        return base64.b64decode(encoded)
+    return None
 
 def create_access_token(data: dict) -> str:
     """Tạo JWT token."""
@@ -162,61 +282,69 @@ def create_access_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """Token trong header "Bearer <token>", None nếu sai định dạng."""
+    parts = (authorization or "").split(" ")
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        return None
+    return parts[1]
+
+def _touch_user_activity(email: str):
+    try:
+        login_manager.update_user_activity(email)
+    except Exception as e:
+        print(f"[SESSION] Cannot update activity of {email}: {e}")
+
+def _record_activity(email: str):
+    """
+    Request đã xác thực = user đang hoạt động. Chỉ ghi session store (có thể là SQLite) khi đã quá
+    SESSION_TOUCH_INTERVAL kể từ lần ghi trước; gọi từ handler async thì ghi trong thread pool, không chờ.
+    """
+    if not login_manager or not login_manager.activity_due(email):
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Dependency sync / run_in_threadpool: đang ở thread worker, ghi luôn
+        _touch_user_activity(email)
+        return
+    loop.run_in_executor(None, _touch_user_activity, email)
+
+def _token_email(token: str, expired_detail: str, invalid_detail: str) -> str:
+    """Email trong JWT (claims lấy qua token_cache, chỉ decode lần đầu gặp token)."""
+    try:
+        payload = token_cache.verify(token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail=expired_detail)
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail=invalid_detail)
+    email: Optional[str] = payload.get("sub")  # Email được lưu trong "sub"
+    if email is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    _record_activity(email)
+    return email
+
 def verify_token(authorization: str = Header(None)) -> str:
     """Kiểm tra JWT token và trả về email."""
     if not authorization:
         raise HTTPException(status_code=401, detail="Token không được cung cấp")
-    
-    try:
-        # Extract token from "Bearer <token>"
-        parts = authorization.split(" ")
-        if len(parts) != 2 or parts[0].lower() != "bearer":
-            raise HTTPException(status_code=401, detail="Invalid token format")
-        
-        token = parts[1]
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")  # Lấy email từ token
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return email  # Trả về email
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token hết hạn")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Token không hợp lệ")
+    token = _bearer_token(authorization)
+    if token is None:
+        raise HTTPException(status_code=401, detail="Invalid token format")
+    return _token_email(token, "Token hết hạn", "Token không hợp lệ")
 
 def verify_token_from_string(token: str) -> str:
     """Kiểm tra JWT token từ string và trả về email."""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return email
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token hết hạn")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Token không hợp lệ")
+    return _token_email(token, "Token hết hạn", "Token không hợp lệ")
 
 def get_current_user_email(authorization: str = Header(None)) -> str:
     """Lấy email của user từ token."""
     if not authorization:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
-        parts = authorization.split(" ")
-        if len(parts) != 2 or parts[0].lower() != "bearer":
-            raise HTTPException(status_code=401, detail="Invalid token format")
-        
-        token = parts[1]
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")  # Email được lưu trong "sub"
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return email
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    token = _bearer_token(authorization)
+    if token is None:
+        raise HTTPException(status_code=401, detail="Invalid token format")
+    return _token_email(token, "Token expired", "Invalid token")
 
 # ===== Pydantic Models =====
 class RegisterRequest(BaseModel):
@@ -236,6 +364,7 @@ class LocationRequest(BaseModel):
     latitude: float
     longitude: float
     radius: int = 50
+    limit: Optional[int] = None  # Chỉ lấy k địa điểm gần nhất trong bán kính
 
 class AlbumCreateRequest(BaseModel):
     name: str
@@ -277,16 +406,6 @@ app.add_middleware(
 # In-memory album storage
 album_storage = {}
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Tính khoảng cách theo công thức haversine."""
-    import math
-    R = 6371.0  # Bán kính Trái Đất (km)
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
-
 # API Routes
 
 @app.get("/")
@@ -301,7 +420,9 @@ async def register(request: RegisterRequest):
     try:
         # Sử dụng concurrent login manager
         if login_manager:
-            success, message = login_manager.register_user(
+            # KDF chậm có chủ đích: chạy ngoài event loop
+            success, message = await run_in_threadpool(
+                login_manager.register_user,
                 name=request.fullname,
                 username=request.email.split("@")[0],
                 password=request.password,
@@ -344,7 +465,7 @@ async def register(request: RegisterRequest):
                 "fullname": request.fullname,
                 "email": request.email,
                 "phone": request.phone or "",
-                "password": hash_password(request.password),
+                "password": await password_hasher.hash_async(request.password),
                 "created_at": datetime.now().isoformat(),
                 "username": request.email.split("@")[0]
             }
@@ -375,7 +496,9 @@ async def login(request: LoginRequest):
     try:
         # Sử dụng concurrent login manager
         if login_manager:
-            success, message, user_info = login_manager.login_user(
+            # KDF chậm có chủ đích: chạy ngoài event loop
+            success, message, user_info = await run_in_threadpool(
+                login_manager.login_user,
                 username=request.email,  # Gửi toàn bộ email để tìm chính xác
                 password=request.password
             )
@@ -408,7 +531,8 @@ async def login(request: LoginRequest):
                     "message": "Email không tồn tại"
                 }
 
-            if not verify_password(request.password, user.get("password", "")):
+            matched, _ = await password_hasher.verify_async(request.password, user.get("password", ""))
+            if not matched:
                 return {
                     "success": False,
                     "message": "Mật khẩu không chính xác"
@@ -435,9 +559,12 @@ async def login(request: LoginRequest):
         }
 
 @app.post("/api/logout")
-async def logout(username: str = Depends(verify_token)):
+async def logout(username: str = Depends(verify_token), authorization: str = Header(None)):
     """Đăng xuất - Thread-safe"""
     try:
+        # Token đăng xuất không dùng lại được (kể cả khi đã nằm trong cache)
+        token_cache.revoke(_bearer_token(authorization))
+        
         if login_manager:
             login_manager.logout_user(username)
         
@@ -646,7 +773,7 @@ async def reset_password(request: ResetPasswordRequest):
             }
         
         # Hash and update password
-        user["password"] = hash_password(request.new_password)
+        user["password"] = await password_hasher.hash_async(request.new_password)
         save_users(data)
         
         # Remove token from store
@@ -700,8 +827,8 @@ async def recognize_landmark(file: UploadFile = File(...)):
         image_bytes = await file.read()
         image_pil = Image.open(BytesIO(image_bytes))
         
-        # Gọi OpenAI Vision API - trả về đầy đủ thông tin
-        result = get_landmark_with_confidence(image_pil)
+        # Gọi OpenAI Vision API trong thread pool - không block event loop
+        result = await model_client.run(get_landmark_with_confidence, image_pil)
         
         # Format coordinates và address
         lat = result.get("lat")
@@ -723,6 +850,8 @@ async def recognize_landmark(file: UploadFile = File(...)):
             "address": address or "Không có thông tin địa chỉ",
             "full_info": f"📍 {result.get('landmark', 'N/A')}\n🌍 Tọa độ: {coordinates_str}\n📮 Địa chỉ: {address or 'N/A'}" if lat else None
         }
+    except ModelCallTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -740,8 +869,8 @@ async def recognize_location(file: UploadFile = File(...)):
         file_obj = BytesIO(image_bytes)
         file_obj.name = file.filename
         
-        # Gọi OpenAI Vision API để nhận dạng địa điểm
-        result = get_landmark_with_confidence(image_pil)
+        # Gọi OpenAI Vision API để nhận dạng địa điểm (thread pool)
+        result = await model_client.run(get_landmark_with_confidence, image_pil)
         
         # Lấy thông tin
         lat = result.get("lat")
@@ -765,6 +894,8 @@ async def recognize_location(file: UploadFile = File(...)):
             "confidence": result.get("confidence", "low"),
             "display_text": f"🏛️ {landmark}\n📍 {coordinates_str}\n📮 {address or 'N/A'}" if lat else landmark
         }
+    except ModelCallTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -791,8 +922,10 @@ async def ai_recommend_api(request: InterestRequest):
     """Gợi ý địa điểm bằng AI."""
     try:
         destinations = loadDestination()
-        result = ai_recommend(request.interest, destinations)
+        result = await model_client.run(ai_recommend, request.interest, destinations)
         return {"success": True, "recommendation": result}
+    except ModelCallTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -800,34 +933,32 @@ async def ai_recommend_api(request: InterestRequest):
 async def recommend_nearby(request: LocationRequest):
     """Gợi ý địa điểm gần vị trí hiện tại."""
     try:
-        destinations = loadDestination()
-        results = []
+        catalog = get_destination_catalog()
+        # Index không gian: chỉ tính khoảng cách cho các điểm trong những ô lưới gần vị trí
+        if request.limit is not None:
+            matches = catalog.geo_index.nearest(request.latitude, request.longitude, request.limit, request.radius)
+        else:
+            matches = catalog.geo_index.within(request.latitude, request.longitude, request.radius)
         
-        for dest in destinations:
-            if dest.get("lat") and dest.get("lon"):
-                distance = haversine_distance(
-                    request.latitude, 
-                    request.longitude, 
-                    dest["lat"], 
-                    dest["lon"]
-                )
-                if distance <= request.radius:
-                    dest_copy = dest.copy()
-                    dest_copy["distance_km"] = round(distance, 2)
-                    results.append(dest_copy)
-        
-        # Sort by distance
-        results.sort(key=lambda x: x["distance_km"])
+        # Kết quả đã được sắp xếp theo khoảng cách
+        results = [
+            {**catalog.destinations[position], "distance_km": round(distance, 2)}
+            for position, distance in matches
+        ]
         return {"success": True, "destinations": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/destinations")
-async def get_all_destinations():
-    """Lấy tất cả địa điểm."""
-    try:
-        destinations = loadDestination()
-        return {"success": True, "destinations": destinations}
+async def get_all_destinations(district: Optional[str] = None):
+    """Lấy tất cả địa điểm, có thể lọc theo quận (vd: ?district=Quận 1)."""
+    try:
+        catalog = get_destination_catalog()
+        if district:
+            # Quận của từng địa điểm đã được gán sẵn khi dựng catalog
+            return {"success": True, "destinations": catalog.by_district.get(district.strip(), [])}
+        # Body JSON đã được serialize sẵn trong catalog
+        return Response(content=catalog.destinations_json, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -835,11 +966,8 @@ async def get_all_destinations():
 async def get_popular_destinations():
     """Lấy 6 địa điểm phổ biến dựa trên rating."""
     try:
-        destinations = loadDestination()
-        # Sắp xếp theo rating giảm dần và lấy 6 địa điểm đầu
-        sorted_destinations = sorted(destinations, key=lambda x: x.get('rating', 0), reverse=True)
-        popular = sorted_destinations[:6]
-        return {"success": True, "destinations": popular}
+        # 6 địa điểm rating cao nhất, đã sắp xếp và serialize sẵn trong catalog
+        return Response(content=get_destination_catalog().popular_json, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -847,24 +975,8 @@ async def get_popular_destinations():
 async def get_districts():
     """Lấy danh sách khu vực từ CSV."""
     try:
-        import csv
-        districts = []
-        csv_path = os.path.join(os.path.dirname(__file__), 'vn_provinces_coords.csv')
-        
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row.get('district') and row.get('name') and row.get('lat') and row.get('lon'):
-                    try:
-                        districts.append({
-                            'district': row['district'].strip(),
-                            'name': row['name'].strip(),
-                            'lat': float(row['lat']),
-                            'lon': float(row['lon'])
-                        })
-                    except ValueError:
-                        # Skip rows with invalid lat/lon
-                        continue
+        # Bảng quận đã được đọc sẵn (đọc lại khi CSV thay đổi)
+        districts = get_district_table().districts
         
         return {"success": True, "districts": districts}
     except Exception as e:
@@ -875,9 +987,8 @@ async def get_random_destinations(count: int = 4):
     """Lấy địa điểm random có rating cao."""
     try:
         import random
-        destinations = loadDestination()
-        # Lọc những địa điểm có rating >= 4.5
-        high_rated = [d for d in destinations if d.get('rating', 0) >= 4.5]
+        # Những địa điểm có rating >= 4.5 (lọc sẵn trong catalog)
+        high_rated = get_destination_catalog().high_rated
         # Random chọn count địa điểm
         selected = random.sample(high_rated, min(count, len(high_rated)))
         return {"success": True, "destinations": selected}
@@ -889,13 +1000,9 @@ async def get_random_destinations(count: int = 4):
 async def create_album(request: AlbumCreateRequest, user_email: str = Depends(verify_token)):
     """Tạo album mới cho user đã đăng nhập."""
     try:
-        user_albums = load_user_albums(user_email)
-        
-        if request.name in user_albums:
+        # Chỉ thêm album rỗng (trong user lock): không ghi đè kết quả nhận dạng nền, giữ các AlbumIndex đã cache
+        if not album_store.ensure_album(user_email, request.name):
             return {"success": False, "message": "Album đã tồn tại"}
-        
-        user_albums[request.name] = []
-        save_user_albums(user_email, user_albums)
         return {"success": True, "message": f"Đã tạo album '{request.name}'"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -918,7 +1025,7 @@ async def get_albums(user_email: str = Depends(verify_token)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/albums/{album_name}")
-async def delete_album(album_name: str, user_email: str = Depends(verify_token)):
+async def delete_album(album_name: str, background_tasks: BackgroundTasks, user_email: str = Depends(verify_token)):
     """Xóa album của user."""
     try:
         user_albums = load_user_albums(user_email)
@@ -931,53 +1038,45 @@ async def delete_album(album_name: str, user_email: str = Depends(verify_token))
         if album_name not in user_albums:
             return {"success": False, "message": f"Album không tồn tại. Available: {list(user_albums.keys())}"}
         
-        del user_albums[album_name]
-        save_user_albums(user_email, user_albums)
+        album_store.delete_album(user_email, album_name)
         print(f"[DELETE ALBUM] Successfully deleted album '{album_name}'")
+        # Xoá blob của album nếu không album/post nào khác còn dùng (sau khi trả response)
+        background_tasks.add_task(blob_collector.collect, [item.get("image_hash") for item in user_albums[album_name]])
         return {"success": True, "message": f"Đã xóa album '{album_name}'"}
     except Exception as e:
         print(f"[DELETE ALBUM] Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/albums/{album_name}/images/{filename}")
-async def delete_image_from_album(album_name: str, filename: str, user_email: str = Depends(verify_token)):
+async def delete_image_from_album(album_name: str, filename: str, background_tasks: BackgroundTasks,
+                                  user_email: str = Depends(verify_token)):
     """Xóa một ảnh cụ thể khỏi album."""
     try:
-        user_albums = load_user_albums(user_email)
-        
         print(f"[DELETE IMAGE] User: {user_email}")
         print(f"[DELETE IMAGE] Album: '{album_name}'")
         print(f"[DELETE IMAGE] Filename: '{filename}'")
         
-        if album_name not in user_albums:
+        index = album_store.album_index(user_email, album_name)
+        if index is None:
             print(f"[DELETE IMAGE] Album not found")
             return {"success": False, "message": f"Album '{album_name}' không tồn tại"}
         
-        # user_albums[album_name] is a list of image dictionaries
-        images = user_albums[album_name]
-        
-        print(f"[DELETE IMAGE] Current image count: {len(images)}")
-        print(f"[DELETE IMAGE] Images in album: {[img.get('filename') for img in images]}")
+        print(f"[DELETE IMAGE] Current image count: {len(index)}")
+        item = index.find_by_filename(filename)
         
-        # Find and remove the image
-        original_count = len(images)
-        images = [img for img in images if img.get("filename") != filename]
-        
-        if len(images) == original_count:
+        # Xoá item và cập nhật index của album tại chỗ
+        remaining = album_store.remove_item(user_email, album_name, filename)
+        if remaining is None:
             print(f"[DELETE IMAGE] Image not found in album")
             return {"success": False, "message": f"Ảnh '{filename}' không tồn tại trong album"}
+        if item is not None:
+            background_tasks.add_task(blob_collector.collect, [item.get("image_hash")])
         
-        # Update album with filtered images list
-        user_albums[album_name] = images
-        
-        # Save updated albums
-        save_user_albums(user_email, user_albums)
-        
-        print(f"[DELETE IMAGE] Successfully deleted. Remaining: {len(images)}")
+        print(f"[DELETE IMAGE] Successfully deleted. Remaining: {remaining}")
         return {
             "success": True, 
             "message": f"Đã xóa ảnh '{filename}' khỏi album '{album_name}'",
-            "remaining_count": len(images)
+            "remaining_count": remaining
         }
     except Exception as e:
         print(f"[DELETE IMAGE] Error: {str(e)}")
@@ -990,185 +1089,226 @@ async def add_image_to_album(
     album_name: str,
     files: List[UploadFile] = File(...),
     auto_recognize: bool = Form(True),
+    stream: bool = Form(False),
+    wait_recognition: bool = Form(False),
     user_email: str = Depends(verify_token)
 ):
-    """Thêm nhiều ảnh vào album với tùy chọn nhận dạng tự động."""
+    """
+    Thêm nhiều ảnh vào album với tùy chọn nhận dạng tự động.
+    Mặc định nhận dạng chạy nền: ảnh được lưu với landmark = "pending" và trả về ngay,
+    kết quả xem qua /api/recognition/jobs/{id} (id của item).
+    wait_recognition=true: nhận dạng song song ngay trong request.
+    stream=true trả về tiến độ từng file dạng NDJSON.
+    """
     try:
         print(f"[ADD IMAGES] User: {user_email}")
         print(f"[ADD IMAGES] Album name: '{album_name}'")
         print(f"[ADD IMAGES] Number of files: {len(files)}")
         print(f"[ADD IMAGES] Auto recognize: {auto_recognize}")
         
-        user_albums = load_user_albums(user_email)
+        recognize_now = auto_recognize and OPENAI_ENABLED and wait_recognition
+        recognize_later = auto_recognize and OPENAI_ENABLED and not wait_recognition
+        
+        def commit_item(item):
+            if recognize_later:
+                item["landmark"] = "pending"
+            # Ghi từng ảnh ngay khi xử lý xong (trong lock của user, index của album cập nhật tại chỗ)
+            album_store.add_item(user_email, album_name, item)
+            if recognize_later:
+                recognition_jobs.submit(item["id"], user_email, album_name, item["image_hash"])
         
         # Create album if not exists
-        if album_name not in user_albums:
+        if album_store.ensure_album(user_email, album_name):
             print(f"[ADD IMAGES] Creating new album: '{album_name}'")
-            user_albums[album_name] = []
         else:
-            print(f"[ADD IMAGES] Album exists with {len(user_albums[album_name])} images")
-        
-        success_count = 0
-        errors = []
-        
-        for file in files:
-            if not file.content_type.startswith('image/'):
-                errors.append(f"{file.filename}: Không phải file ảnh")
-                continue
-            
-            try:
-                image_bytes = await file.read()
-                landmark = "N/A"
-                description = ""
-                confidence = "low"
-                
-                if auto_recognize and OPENAI_ENABLED:
-                    try:
-                        image_pil = Image.open(BytesIO(image_bytes))
-                        # Use the new function that returns dict
-                        result = get_landmark_with_confidence(image_pil)
-                        landmark = result.get("landmark", "N/A")
-                        description = result.get("description", "")
-                        confidence = result.get("confidence", "low")
-                    except Exception as e:
-                        landmark = "Không rõ địa danh"
-                        description = f"Lỗi: {str(e)[:50]}"
-                        confidence = "low"
-                
-                # Encode image to base64
-                image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-                
-                item = {
-                    "filename": file.filename,
-                    "image_data": image_b64,
-                    "uploaded_at": datetime.now().isoformat(),
-                    "album_name": album_name,
-                    "landmark": landmark,
-                    "description": description,
-                    "confidence": confidence
-                }
-                
-                print(f"[DEBUG] Saving image to album: {file.filename}")
-                print(f"[DEBUG]   - Original bytes: {len(image_bytes)}")
-                print(f"[DEBUG]   - Base64 length: {len(image_b64)}")
-                print(f"[DEBUG]   - Has image_data: {'image_data' in item}")
-                
-                user_albums[album_name].append(item)
-                success_count += 1
-                
-            except Exception as e:
-                errors.append(f"{file.filename}: {str(e)}")
-        
-        # Save albums to file
-        save_user_albums(user_email, user_albums)
+            print(f"[ADD IMAGES] Album exists with {len(album_store.album_index(user_email, album_name))} images")
+        
+        # Decode trong thread pool, nhận dạng song song, commit từng ảnh
+        results = ingest_uploads(
+            files, album_name,
+            commit=commit_item,
+            gps_reader=get_gps_from_image,
+            recognize=get_landmark_with_confidence if recognize_now else None
+        )
         
-        print(f"[ADD IMAGES] Successfully added {success_count}/{len(files)} images")
-        if errors:
-            print(f"[ADD IMAGES] Errors: {errors}")
+        def summary(file_results):
+            file_results = sorted(file_results, key=lambda r: r["index"])
+            success_count = sum(1 for r in file_results if r["success"])
+            errors = [f"{r['filename']}: {r['error']}" for r in file_results if not r["success"]]
+            print(f"[ADD IMAGES] Successfully added {success_count}/{len(files)} images")
+            if errors:
+                print(f"[ADD IMAGES] Errors: {errors}")
+            return {
+                "success": True, 
+                "message": f"Đã thêm {success_count}/{len(files)} ảnh vào album '{album_name}'",
+                "added_count": success_count,
+                "total_count": len(files),
+                "errors": errors,
+                "results": file_results
+            }
         
-        return {
-            "success": True, 
-            "message": f"Đã thêm {success_count}/{len(files)} ảnh vào album '{album_name}'",
-            "added_count": success_count,
-            "total_count": len(files),
-            "errors": errors
-        }
+        if stream:
+            # NDJSON: tiến độ từng file ngay khi xong (stage decoded/recognized), kết quả cuối của từng file
+            # (stage done, ảnh thành công theo thứ tự upload), dòng cuối là tổng kết
+            async def progress():
+                file_results = []
+                async for event in results:
+                    if event["stage"] == STAGE_DONE:
+                        file_results.append(event)
+                    yield json.dumps({**event, "done": len(file_results), "total": len(files)}, ensure_ascii=False) + "\n"
+                yield json.dumps({**summary(file_results), "finished": True}, ensure_ascii=False) + "\n"
+            return StreamingResponse(progress(), media_type="application/x-ndjson")
+        
+        return summary([event async for event in results if event["stage"] == STAGE_DONE])
     except Exception as e:
         print(f"[ADD IMAGES] Exception: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def public_job(job: dict) -> dict:
+    """Thông tin job trả về cho client (bỏ email)."""
+    return {key: value for key, value in job.items() if key != "user_email"}
+
+@app.get("/api/recognition/jobs/{job_id}")
+async def get_recognition_job(job_id: str, user_email: str = Depends(verify_token)):
+    """Trạng thái nhận dạng nền của một ảnh (job_id = id của item trong album)."""
+    job = recognition_jobs.get(job_id)
+    if not job or job["user_email"] != user_email:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job nhận dạng")
+    return {"success": True, "job": public_job(job)}
+
+@app.get("/api/albums/{album_name}/recognition-jobs")
+async def get_album_recognition_jobs(album_name: str, user_email: str = Depends(verify_token)):
+    """Trạng thái nhận dạng nền của các ảnh trong album (dùng để polling)."""
+    jobs = recognition_jobs.list_jobs(user_email, album_name)
+    pending = sum(1 for job in jobs if job["status"] in ("queued", "running"))
+    return {"success": True, "pending": pending, "jobs": [public_job(job) for job in jobs]}
+
 @app.get("/api/albums/{album_name}/images")
 async def get_album_images(
     album_name: str, 
     include_images: bool = False,
     search_landmark: Optional[str] = None,
     search_date: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    size: str = ORIGINAL_SIZE,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = SORT_POSITION,
+    order: str = "asc",
+    fields: Optional[str] = None,
     user_email: str = Depends(verify_token)
 ):
-    """Lấy danh sách ảnh trong album của user."""
+    """
+    Lấy danh sách ảnh trong album của user.
+    size = "thumb"/"medium" khi include_images=True: trả bản thu nhỏ thay vì ảnh gốc (cho gallery).
+    Phân trang: limit + cursor (next_cursor của trang trước); sort = position/uploaded_at/landmark, order = asc/desc.
+    fields: danh sách field cách nhau bởi dấu phẩy (mặc định toàn bộ metadata).
+    Lọc: search_landmark (không phân biệt dấu, gần đúng nếu không có kết quả), search_date hoặc date_from/date_to (YYYY-MM-DD).
+    """
+    if not is_valid_size(size):
+        raise HTTPException(status_code=400, detail=f"size phải là một trong: {ORIGINAL_SIZE}, {', '.join(DERIVATIVE_SIZES)}")
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort phải là một trong: {', '.join(SORT_FIELDS)}")
+    if order not in SORT_ORDERS:
+        raise HTTPException(status_code=400, detail="order phải là asc hoặc desc")
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if search_date:
+        date_from = date_to = search_date
+    for value in (date_from, date_to):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Ngày phải có dạng YYYY-MM-DD")
     try:
-        user_albums = load_user_albums(user_email)
-        
-        if album_name not in user_albums:
-            return {"success": True, "images": [], "total": 0}
+        # Index được cache theo shard: không đọc/parse lại cả album ở mỗi trang
+        index = album_store.album_index(user_email, album_name)
+        if index is None:
+            return {"success": True, "images": [], "total": 0, "next_cursor": None, "has_more": False}
         
-        items = user_albums[album_name].copy()
-        
-        # Áp dụng filter nếu có
+        # Áp dụng filter nếu có: tra index địa danh/ngày, chi phí theo số kết quả
+        candidates = None
         if search_landmark:
-            items = [item for item in items if search_landmark.lower() in item.get('landmark', '').lower()]
-        
-        if search_date:
-            items = [item for item in items 
-                    if datetime.fromisoformat(item['uploaded_at']).date().isoformat() == search_date]
+            candidates = index.landmark_positions(search_landmark)
+        if date_from or date_to:
+            by_date = index.date_positions(date_from, date_to)
+            candidates = by_date if candidates is None else candidates & by_date
         
-        if not include_images:
-            # Loại bỏ data ảnh để giảm kích thước response
-            for item in items:
-                item.pop("image_data", None)
+        try:
+            page = index.page(sort=sort, order=order, cursor=cursor, limit=limit, fields=field_list, candidates=candidates)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        items = page["images"]
+        
+        if include_images:
+            # Chỉ đọc bytes ảnh khi client yêu cầu; tạo derivative là việc CPU nên chạy trong thread pool
+            for item, position in zip(items, page["positions"]):
+                source = index.get(position)
+                image_bytes = await run_in_threadpool(read_item_image, source, size)
+                item["image_data"] = base64.b64encode(image_bytes).decode('utf-8') if image_bytes else None
+                if size != ORIGINAL_SIZE and source.get("image_hash"):
+                    item["image_content_type"] = DERIVATIVE_CONTENT_TYPE
         
         return {
             "success": True, 
             "images": items,
-            "total": len(items),
-            "album_total": len(user_albums[album_name])
+            "total": len(index) if candidates is None else len(candidates),
+            "album_total": len(index),
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/albums/{album_name}/images/{filename}/view")
-async def view_album_image(album_name: str, filename: str, token: str = Query(...)):
-    """Serve ảnh từ album để hiển thị."""
+async def view_album_image(request: Request, album_name: str, filename: str, token: str = Query(...),
+                           size: str = ORIGINAL_SIZE):
+    """
+    Serve ảnh từ album để hiển thị (stream từ đĩa, hỗ trợ ETag/304 và Range).
+    size = "thumb"/"medium": bản thu nhỏ WebP lưu cạnh ảnh gốc.
+    """
+    if not is_valid_size(size):
+        raise HTTPException(status_code=400, detail=f"size phải là một trong: {ORIGINAL_SIZE}, {', '.join(DERIVATIVE_SIZES)}")
     try:
         # Verify token từ query parameter
         user_email = verify_token_from_string(token)
-        user_albums = load_user_albums(user_email)
+        # Chỉ cần metadata (chỉ đọc) nên dùng index đã cache, không copy cả album
+        index = album_store.album_index(user_email, album_name)
         
-        print(f"[VIEW IMAGE] User: {user_email}")
-        print(f"[VIEW IMAGE] Album: '{album_name}'")
-        print(f"[VIEW IMAGE] Filename: '{filename}'")
-        
-        if album_name not in user_albums:
+        if index is None:
             raise HTTPException(status_code=404, detail="Album không tồn tại")
         
         # Tìm ảnh trong album
-        images = user_albums[album_name]
-        image_item = None
-        for img in images:
-            if img.get("filename") == filename:
-                image_item = img
-                break
-        
+        image_item = index.find_by_filename(filename)
         if not image_item:
             raise HTTPException(status_code=404, detail="Ảnh không tồn tại trong album")
         
-        # Lấy image_data (base64)
-        image_data = image_item.get("image_data")
-        if not image_data:
-            raise HTTPException(status_code=404, detail="Dữ liệu ảnh không tồn tại")
-        
-        # Decode base64
-        import base64
-        from io import BytesIO
-        from fastapi.responses import StreamingResponse
-        
-        # Remove data URI prefix if exists
-        if "," in image_data:
-            image_data = image_data.split(",", 1)[1]
-        
-        image_bytes = base64.b64decode(image_data)
-        
         # Determine content type
-        content_type = "image/jpeg"
-        if filename.lower().endswith('.png'):
-            content_type = "image/png"
-        elif filename.lower().endswith('.gif'):
-            content_type = "image/gif"
-        elif filename.lower().endswith('.webp'):
-            content_type = "image/webp"
-        
+        content_type = image_item.get("content_type") or "image/jpeg"
+        if not image_item.get("content_type"):
+            if filename.lower().endswith('.png'):
+                content_type = "image/png"
+            elif filename.lower().endswith('.gif'):
+                content_type = "image/gif"
+            elif filename.lower().endswith('.webp'):
+                content_type = "image/webp"
+        
+        image_hash = image_item.get("image_hash")
+        if image_hash and blob_store.exists(image_hash):
+            if size != ORIGINAL_SIZE:
+                path = await run_in_threadpool(derivative_store.get_path, image_hash, size)
+                return serve_file(request, path, etag=f"{image_hash}-{size}", media_type=DERIVATIVE_CONTENT_TYPE)
+            return serve_file(request, blob_store.path(image_hash), etag=image_hash, media_type=content_type)
+        
+        # Dữ liệu cũ chưa được chuyển sang blob store
+        image_bytes = read_item_image(image_item)
+        if not image_bytes:
+            raise HTTPException(status_code=404, detail="Dữ liệu ảnh không tồn tại")
         return StreamingResponse(BytesIO(image_bytes), media_type=content_type)
         
     except HTTPException:
@@ -1178,8 +1318,6 @@ async def view_album_image(album_name: str, filename: str, token: str = Query(..
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/albums/{album_name}/download")
 async def download_album(album_name: str, user_email: str = Depends(verify_token)):
@@ -1196,80 +1334,32 @@ async def download_album(album_name: str, user_email: str = Depends(verify_token
         
         print(f"[DEBUG] Downloading album '{album_name}' with {len(items)} items")
         
-        # Debug: check first item structure
-        if items:
-            first_item = items[0]
-            print(f"[DEBUG] First item keys: {list(first_item.keys())}")
-            print(f"[DEBUG] First item has image_data: {'image_data' in first_item}")
-            print(f"[DEBUG] First item has bytes: {'bytes' in first_item}")
-            if 'image_data' in first_item:
-                img_data_len = len(first_item['image_data']) if first_item['image_data'] else 0
-                print(f"[DEBUG] image_data length: {img_data_len} chars")
-        
-        from zipfile import ZipFile, ZIP_DEFLATED
-        
-        buf = BytesIO()
-        added_count = 0
-        
-        with ZipFile(buf, "w", ZIP_DEFLATED) as zf:
-            for idx, item in enumerate(items):
-                try:
-                    filename = item.get("filename", f"image_{idx}.jpg")
-                    # Sanitize filename
-                    filename = filename.replace('/', '_').replace('\\', '_')
-                    
-                    image_bytes = None
-                    
-                    # Try different data formats
-                    # Priority 1: image_data (base64 string)
-                    if "image_data" in item and item["image_data"]:
-                        try:
-                            # Handle base64 encoded image
-                            img_data = item["image_data"]
-                            # Remove data URL prefix if present (data:image/jpeg;base64,...)
-                            if isinstance(img_data, str) and 'base64,' in img_data:
-                                img_data = img_data.split('base64,')[1]
-                            image_bytes = base64.b64decode(img_data)
-                            print(f"[DEBUG] Decoded base64 for {filename}: {len(image_bytes)} bytes")
-                        except Exception as e:
-                            print(f"[DEBUG] Failed to decode base64 for {filename}: {e}")
-                    
-                    # Priority 2: bytes field
-                    if image_bytes is None and "bytes" in item and item["bytes"]:
-                        # Use direct bytes
-                        if isinstance(item["bytes"], bytes):
-                            image_bytes = item["bytes"]
-                            print(f"[DEBUG] Using direct bytes for {filename}: {len(image_bytes)} bytes")
-                        elif isinstance(item["bytes"], str):
-                            # Maybe it's base64 string stored as bytes
-                            try:
-                                image_bytes = base64.b64decode(item["bytes"])
-                                print(f"[DEBUG] Decoded bytes field for {filename}: {len(image_bytes)} bytes")
-                            except:
-                                pass
-                    
-                    if image_bytes and len(image_bytes) > 0:
-                        zf.writestr(filename, image_bytes)
-                        added_count += 1
-                        print(f"[DEBUG] Added {filename} to ZIP")
-                    else:
-                        print(f"[DEBUG] Skipped {filename}: no valid image data")
-                        
-                except Exception as e:
-                    print(f"[ERROR] Error adding {item.get('filename', f'image_{idx}')}: {e}")
-                    continue
-        
-        buf.seek(0)
-        zip_data = buf.getvalue()
+        # Chỉ lấy các item có dữ liệu ảnh; ảnh trong blob store được đọc từ đĩa theo chunk
+        entries = []
+        for idx, item in enumerate(items):
+            filename = item.get("filename") or f"image_{idx}.jpg"
+            image_hash = item.get("image_hash")
+            if image_hash and blob_store.exists(image_hash):
+                entries.append((filename, blob_store.path(image_hash)))
+                continue
+            try:
+                image_bytes = read_item_image(item)
+            except Exception as e:
+                image_bytes = None
+                print(f"[DEBUG] Failed to read image for {filename}: {e}")
+            if image_bytes:
+                entries.append((filename, image_bytes))
+            else:
+                print(f"[DEBUG] Skipped {filename}: no valid image data")
         
-        print(f"[DEBUG] Created ZIP: {len(zip_data)} bytes, {added_count} images added")
+        print(f"[DEBUG] Streaming ZIP with {len(entries)}/{len(items)} images")
         
-        if len(zip_data) <= 100:  # ZIP header is at least 22 bytes, so empty ZIP is very small
-            raise HTTPException(status_code=400, detail=f"Không thể tạo file ZIP (chỉ thêm {added_count}/{len(items)} ảnh)")
+        if not entries:
+            raise HTTPException(status_code=400, detail=f"Không thể tạo file ZIP (chỉ thêm 0/{len(items)} ảnh)")
         
         safe_name = album_name.replace('/', '_').replace('"', '')
         return StreamingResponse(
-            BytesIO(zip_data),
+            iter_zip_chunks(entries),
             media_type="application/zip",
             headers={"Content-Disposition": f'attachment; filename="{safe_name}.zip"'}
         )
@@ -1314,27 +1404,27 @@ async def debug_album_storage(album_name: str):
 async def get_albums_stats(user_email: str = Depends(verify_token)):
     """Lấy thống kê tổng quan về các album của user."""
     try:
-        user_albums = load_user_albums(user_email)
+        # Đọc từ index của từng album: không duyệt lại mọi item
+        indexes = album_store.album_indexes(user_email)
         
         stats = {
-            "total_albums": len(user_albums),
-            "total_images": sum(len(items) for items in user_albums.values()),
+            "total_albums": len(indexes),
+            "total_images": sum(len(index) for index in indexes.values()),
             "albums": {}
         }
         
-        for album_name, items in user_albums.items():
+        for album_name, index in indexes.items():
             item_data = {
-                "image_count": len(items),
-                "last_modified": max((item.get("uploaded_at", "") for item in items), default=""),
-                "landmarks": list(set(item.get("landmark", "N/A") for item in items))
+                "image_count": len(index),
+                "last_modified": index.date_bounds()[1],
+                "landmarks": list(index.landmark_groups())
             }
             # Add debug info for first item
+            items = index.page(limit=1)["images"]
             if items:
                 first_item = items[0]
                 item_data["first_item_keys"] = list(first_item.keys())
-                item_data["first_item_data_type"] = type(first_item.get("image_data", "N/A")).__name__
-                if "image_data" in first_item:
-                    item_data["image_data_length"] = len(first_item.get("image_data", ""))
+                item_data["total_bytes"] = index.total_bytes
             stats["albums"][album_name] = item_data
         
         print(f"[DEBUG] Album stats: {stats}")
@@ -1345,23 +1435,19 @@ async def get_albums_stats(user_email: str = Depends(verify_token)):
 
 # Additional endpoint for grouping images by landmark
 @app.get("/api/albums/{album_name}/group-by-landmark")
-async def get_album_grouped_by_landmark(album_name: str):
+async def get_album_grouped_by_landmark(album_name: str, user_email: str = Depends(verify_token)):
     """Lấy ảnh trong album được nhóm theo địa danh."""
     try:
-        if album_name not in album_storage:
+        index = album_store.album_index(user_email, album_name)
+        if index is None:
             return {"success": True, "groups": {}}
         
-        items = album_storage[album_name]
-        groups = {}
-        
-        for item in items:
-            landmark = item.get('landmark', 'Chưa nhận dạng')
-            if landmark not in groups:
-                groups[landmark] = []
-            
-            # Tạo bản sao không có image_data để giảm kích thước
-            item_copy = {k: v for k, v in item.items() if k != "image_data"}
-            groups[landmark].append(item_copy)
+        groups = group_items_by_landmark(index)
+        # Tạo bản sao không có image_data để giảm kích thước
+        groups = {
+            landmark: [project(item) for item in items]
+            for landmark, items in groups.items()
+        }
         
         return {"success": True, "groups": groups}
     except Exception as e:
@@ -1735,7 +1821,7 @@ async def chatbot_chat(request: ChatbotMessageRequest):
         if not chatbot_instance:
             raise HTTPException(status_code=500, detail="Chatbot chưa được khởi tạo")
         
-        result = chatbot_instance.chat(request.message, use_ai=request.use_ai)
+        result = await model_client.run(chatbot_instance.chat, request.message, use_ai=request.use_ai)
         return result
     except Exception as e:
         return {
@@ -1899,7 +1985,8 @@ async def get_user_stats():
             stats = login_manager.get_statistics()
             return {
                 "status": "success",
-                "data": stats
+                "data": stats,
+                "token_cache": token_cache.get_stats()
             }
         else:
             return {
@@ -1912,6 +1999,21 @@ async def get_user_stats():
             "message": f"Lỗi: {str(e)}"
         }
 
+@app.get("/api/ai/stats")
+async def get_ai_stats():
+    """Thống kê lời gọi model (đang chạy, timeout, độ trễ trung bình)"""
+    return {
+        "status": "success",
+        "data": model_client.get_stats(),
+        "strict_landmark_variants": get_strict_metrics(),
+        "recognition_cache": get_recognition_cache_stats(),
+        "geocode": get_geocode_stats(),
+        "vision_preprocess": get_vision_preprocess_stats(),
+        "image_derivatives": derivative_store.get_stats(),
+        "blob_gc": blob_collector.get_stats(),
+        "recognition_jobs": recognition_jobs.get_stats()
+    }
+
 @app.get("/api/users/active-sessions")
 async def get_active_sessions():
     """Lấy danh sách active sessions"""
@@ -2026,17 +2128,17 @@ async def create_post(
         if not content and not image:
             raise HTTPException(status_code=400, detail="Please provide content or image")
         
-        image_data = None
+        image_hash = None
         if image:
-            # Đọc và encode ảnh thành base64
+            # Lưu ảnh vào blob store, post chỉ giữ hash
             image_bytes = await image.read()
-            image_data = f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode()}"
-            print(f"[SOCIAL] Image encoded, size: {len(image_data)} bytes")
+            image_hash = blob_store.put(image_bytes)
+            print(f"[SOCIAL] Image stored, size: {len(image_bytes)} bytes, hash: {image_hash}")
         
         post = social_feed_manager.create_post(
             user_email=user_email,
             content=content or "",
-            image_data=image_data,
+            image_hash=image_hash,
             location=location,
             user_avatar=user_avatar,
             user_fullname=user_fullname
@@ -2051,6 +2153,14 @@ async def create_post(
         print(f"[SOCIAL] Error creating post: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/social/images/{image_hash}")
+async def get_social_image(request: Request, image_hash: str):
+    """Serve ảnh của post từ blob store"""
+    if not blob_store.exists(image_hash):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return serve_file(request, blob_store.path(image_hash), etag=image_hash,
+                      media_type=blob_store.content_type(image_hash))
+
 @app.get("/api/social/posts")
 async def get_posts(limit: int = 20, offset: int = 0, authorization: str = Header(None)):
     """Lấy danh sách posts"""
@@ -2111,14 +2221,16 @@ async def get_user_posts(email: str, limit: int = 20, authorization: str = Heade
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/social/posts/{post_id}")
-async def delete_post(post_id: str, authorization: str = Header(None)):
+async def delete_post(post_id: str, background_tasks: BackgroundTasks, authorization: str = Header(None)):
     """Xóa post"""
     try:
         user_email = get_current_user_email(authorization)
         
+        post = social_feed_manager.get_post_by_id(post_id)
         success = social_feed_manager.delete_post(post_id, user_email)
         if not success:
             raise HTTPException(status_code=403, detail="You don't have permission to delete this post")
+        background_tasks.add_task(blob_collector.collect, [post.get("image_hash")])
         
         return {"success": True, "message": "Post deleted"}
     except HTTPException as e:
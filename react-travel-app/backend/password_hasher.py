@@ -0,0 +1,139 @@
+"""
+Password Hasher Module - Băm mật khẩu bằng scrypt (có salt, tốn bộ nhớ) trong thread pool giới hạn
+- hashlib.scrypt nhả GIL khi chạy nên thread pool chạy song song thật, và số worker
+  giới hạn luôn bộ nhớ dùng cùng lúc (mỗi lần băm ~128 * n * r byte)
+- Hàm sync (gọi từ thread của request) và async (gọi từ event loop) dùng chung pool
+- Hash SHA-256 cũ (64 ký tự hex, không salt) vẫn đăng nhập được, verify báo cần băm lại
+  để lần đăng nhập thành công tiếp theo chuyển sang scrypt
+- Tham số n/r/p chỉnh qua biến môi trường, đo bằng bench_password_hasher.py
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Tuple
+
+PASSWORD_SCRYPT_N = int(os.getenv('PASSWORD_SCRYPT_N', str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.getenv('PASSWORD_SCRYPT_R', '8'))
+PASSWORD_SCRYPT_P = int(os.getenv('PASSWORD_SCRYPT_P', '1'))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+SCHEME = "scrypt"
+
+_LEGACY_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def is_legacy_hash(stored: str) -> bool:
+    """Hash SHA-256 không salt của phiên bản cũ"""
+    return bool(stored) and bool(_LEGACY_SHA256_RE.match(stored))
+
+
+class PasswordHasher:
+    """Băm/kiểm tra mật khẩu: định dạng scrypt$n$r$p$salt$hash (base64)"""
+
+    def __init__(self, n: int = PASSWORD_SCRYPT_N, r: int = PASSWORD_SCRYPT_R, p: int = PASSWORD_SCRYPT_P,
+                 workers: int = PASSWORD_HASH_WORKERS):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._lock = Lock()
+        self._stats = {"hashes": 0, "verifies": 0, "legacy_verifies": 0, "failures": 0, "kdf_ms": 0.0}
+
+    @staticmethod
+    def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        # maxmem mặc định của OpenSSL (32 MB) không đủ khi tăng n/r
+        return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + 1024 * 1024, dklen=KEY_BYTES)
+
+    def _timed_scrypt(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        start = time.perf_counter()
+        key = self._scrypt(password, salt, n, r, p)
+        with self._lock:
+            self._stats["kdf_ms"] += (time.perf_counter() - start) * 1000
+        return key
+
+    # ===== Chạy trong pool =====
+
+    def _hash(self, password: str) -> str:
+        salt = secrets.token_bytes(SALT_BYTES)
+        key = self._timed_scrypt(password, salt, self.n, self.r, self.p)
+        with self._lock:
+            self._stats["hashes"] += 1
+        return f"{SCHEME}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def _verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        if is_legacy_hash(stored):
+            ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+            with self._lock:
+                self._stats["legacy_verifies"] += 1
+                self._stats["failures"] += not ok
+            return ok, ok
+
+        try:
+            scheme, n, r, p, salt, key = stored.split("$")
+            if scheme != SCHEME:
+                raise ValueError(scheme)
+            n, r, p = int(n), int(r), int(p)
+            expected = _b64decode(key)
+            actual = self._timed_scrypt(password, _b64decode(salt), n, r, p)
+        except (ValueError, AttributeError):
+            # Hash hỏng hoặc định dạng lạ: không bao giờ khớp
+            ok, n, r, p = False, self.n, self.r, self.p
+        else:
+            ok = hmac.compare_digest(actual, expected)
+
+        with self._lock:
+            self._stats["verifies"] += 1
+            self._stats["failures"] += not ok
+        # Tham số cũ (trước khi chỉnh n/r/p) thì băm lại theo tham số hiện tại
+        return ok, ok and (n, r, p) != (self.n, self.r, self.p)
+
+    # ===== Public API =====
+
+    def hash(self, password: str) -> str:
+        """Băm mật khẩu (block thread gọi, KDF chạy trong pool)"""
+        return self._executor.submit(self._hash, password).result()
+
+    def verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        """(khớp, cần băm lại) - cần băm lại khi hash là SHA-256 cũ hoặc tham số scrypt cũ"""
+        return self._executor.submit(self._verify, password, stored or "").result()
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self._executor.submit(self._hash, password))
+
+    async def verify_async(self, password: str, stored: str) -> Tuple[bool, bool]:
+        return await asyncio.wrap_future(self._executor.submit(self._verify, password, stored or ""))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            kdf_calls = self._stats["hashes"] + self._stats["verifies"]
+            return {
+                **self._stats,
+                "kdf_ms": round(self._stats["kdf_ms"], 1),
+                "avg_kdf_ms": round(self._stats["kdf_ms"] / kdf_calls, 2) if kdf_calls else 0.0,
+                "params": {"n": self.n, "r": self.r, "p": self.p},
+                "workers": self.workers,
+            }
+
+
+# Global instance
+password_hasher = PasswordHasher()
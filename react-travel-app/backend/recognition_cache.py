@@ -0,0 +1,242 @@
+"""
+Recognition Cache Module - Cache kết quả nhận dạng địa danh theo perceptual hash (dHash) của ảnh
+- Ảnh giống hệt hoặc gần giống (khoảng cách Hamming <= ngưỡng) dùng lại kết quả cũ
+- TTL + LRU eviction, lưu ra file JSON để giữ được sau khi restart
+- Thống kê hit/miss
+"""
+
+import copy
+import functools
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash: thu nhỏ ảnh xám về (hash_size+1) x hash_size,
+    mỗi bit = pixel bên trái sáng hơn pixel bên phải.
+    Không đổi khi ảnh bị resize, nén lại, chỉnh sáng nhẹ.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class RecognitionCache:
+    """
+    Cache {(kind, dhash) -> kết quả nhận dạng}.
+    Tìm ảnh gần giống bằng multi-index hashing: hash 64 bit được chia thành
+    (max_distance + 1) band; theo nguyên lý Dirichlet, hai hash cách nhau
+    <= max_distance bit chắc chắn trùng nhau ở ít nhất một band, nên chỉ cần
+    so khoảng cách với các entry trùng band thay vì quét toàn bộ cache.
+    """
+
+    def __init__(self, cache_file: str, max_distance: int = 4, ttl: float = 7 * 24 * 3600,
+                 max_entries: int = 5000, save_interval: float = 30.0):
+        self.cache_file = cache_file
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+
+        self._lock = Lock()
+        # key = f"{kind}:{hash_hex}" -> {"kind", "hash", "value", "created_at"}
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._bands: Dict[Tuple[str, int, int], set] = {}
+        self._band_count = max_distance + 1
+        self._band_bits = -(-HASH_BITS // self._band_count)  # ceil
+
+        self._dirty = False
+        self._last_save = 0.0
+        self._stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+        self._load()
+
+    # ===== Band index =====
+
+    def _band_keys(self, kind: str, hash_value: int):
+        mask = (1 << self._band_bits) - 1
+        for band in range(self._band_count):
+            yield (kind, band, (hash_value >> (band * self._band_bits)) & mask)
+
+    def _index_add(self, key: str, entry: Dict):
+        for band_key in self._band_keys(entry["kind"], entry["hash"]):
+            self._bands.setdefault(band_key, set()).add(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in self._band_keys(entry["kind"], entry["hash"]):
+            bucket = self._bands.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._bands[band_key]
+
+    # ===== Public API =====
+
+    @staticmethod
+    def _key(kind: str, hash_value: int) -> str:
+        return f"{kind}:{hash_value:016x}"
+
+    def get(self, kind: str, hash_value: int) -> Optional[Any]:
+        """Tìm kết quả của ảnh giống nhất trong ngưỡng; None nếu không có"""
+        now = time.time()
+        with self._lock:
+            key = self._key(kind, hash_value)
+            best_key, best_distance = None, None
+            if key in self._entries:
+                best_key, best_distance = key, 0
+            else:
+                candidates = set()
+                for band_key in self._band_keys(kind, hash_value):
+                    candidates.update(self._bands.get(band_key, ()))
+                for candidate in candidates:
+                    distance = hamming_distance(hash_value, self._entries[candidate]["hash"])
+                    if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                        best_key, best_distance = candidate, distance
+
+            if best_key is not None:
+                entry = self._entries[best_key]
+                if now - entry["created_at"] > self.ttl:
+                    self._remove(best_key)
+                    self._stats["expired"] += 1
+                    self._dirty = True
+                    best_key = None
+
+            if best_key is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self._stats["hits" if best_distance == 0 else "near_hits"] += 1
+            return copy.deepcopy(entry["value"])
+
+    def put(self, kind: str, hash_value: int, value: Any):
+        """Lưu kết quả, loại bỏ entry ít dùng nhất nếu vượt max_entries"""
+        with self._lock:
+            key = self._key(kind, hash_value)
+            self._remove(key)
+            entry = {"kind": kind, "hash": hash_value, "value": copy.deepcopy(value), "created_at": time.time()}
+            self._entries[key] = entry
+            self._index_add(key, entry)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._stats["evictions"] += 1
+            self._dirty = True
+        self._maybe_save()
+
+    def cached(self, kind: str, should_cache: Callable[[Any], bool] = lambda value: True,
+               preprocess: Optional[Callable[[Image.Image], Image.Image]] = None):
+        """
+        Decorator cho hàm nhận dạng f(image_pil, *args, **kwargs).
+        Kết quả chỉ được lưu khi should_cache(result) trả về True.
+        preprocess(image) (nếu có) chạy trước khi hash, và func nhận ảnh đã xử lý.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(image_pil, *args, **kwargs):
+                if preprocess is not None:
+                    image_pil = preprocess(image_pil)
+                try:
+                    hash_value = dhash(image_pil)
+                except Exception as e:
+                    logger.warning(f"Cannot hash image for recognition cache: {e}")
+                    return func(image_pil, *args, **kwargs)
+
+                cached_value = self.get(kind, hash_value)
+                if cached_value is not None:
+                    return cached_value
+
+                result = func(image_pil, *args, **kwargs)
+                if result is not None and should_cache(result):
+                    self.put(kind, hash_value, result)
+                return result
+            return wrapper
+        return decorator
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits = self._stats["hits"] + self._stats["near_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "max_distance": self.max_distance,
+            }
+
+    # ===== Persistence =====
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Cannot load recognition cache {self.cache_file}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for entry in data.get("entries", []):
+                if now - entry.get("created_at", 0) > self.ttl:
+                    continue
+                entry["hash"] = int(entry["hash"], 16)
+                key = self._key(entry["kind"], entry["hash"])
+                self._entries[key] = entry
+                self._index_add(key, entry)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        logger.info(f"Loaded {len(self._entries)} recognition cache entries")
+
+    def _maybe_save(self):
+        if time.time() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """Ghi cache ra file (atomic), theo thứ tự LRU"""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [
+                {**entry, "hash": f"{entry['hash']:016x}"}
+                for entry in self._entries.values()
+            ]
+            self._dirty = False
+            self._last_save = time.time()
+
+        directory = os.path.dirname(self.cache_file) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except Exception as e:
+            logger.error(f"Cannot save recognition cache: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,258 @@
+"""
+Recognition Jobs Module - Hàng đợi nhận dạng địa danh chạy nền cho ảnh trong album
+- Upload chỉ lưu ảnh rồi trả về ngay (landmark = "pending"), việc gọi model do worker thread làm
+- Job được lưu ra file JSON: job chưa xong sẽ chạy tiếp sau khi restart
+- File được ghi theo lô (write-behind, RECOGNITION_JOBS_FLUSH_INTERVAL giây): upload nhiều ảnh
+  không ghi lại toàn bộ file cho từng ảnh; item mất job do crash được app tạo lại lúc khởi động
+- Lỗi tạm thời được thử lại với exponential backoff
+- Job đã xong được giữ lại một thời gian để client polling lấy kết quả
+"""
+
+import heapq
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+import logging
+
+from write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+JOBS_FILE = os.getenv('RECOGNITION_JOBS_FILE', os.path.join(os.path.dirname(__file__), 'recognition_jobs.json'))
+RECOGNITION_WORKERS = int(os.getenv('RECOGNITION_WORKERS', '4'))
+RECOGNITION_MAX_ATTEMPTS = int(os.getenv('RECOGNITION_MAX_ATTEMPTS', '4'))
+RECOGNITION_BACKOFF_BASE = float(os.getenv('RECOGNITION_BACKOFF_BASE', '5'))
+RECOGNITION_BACKOFF_MAX = float(os.getenv('RECOGNITION_BACKOFF_MAX', '300'))
+# Giữ job đã xong (done/failed) bao lâu trước khi xoá (giây)
+RECOGNITION_JOB_RETENTION = float(os.getenv('RECOGNITION_JOB_RETENTION', str(24 * 3600)))
+# Ghi file job tối đa một lần mỗi khoảng này (giây), hoặc sớm hơn khi số job thay đổi đạt ngưỡng
+RECOGNITION_JOBS_FLUSH_INTERVAL = float(os.getenv('RECOGNITION_JOBS_FLUSH_INTERVAL', '1'))
+RECOGNITION_JOBS_FLUSH_MAX = int(os.getenv('RECOGNITION_JOBS_FLUSH_MAX', '500'))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+
+class RecognitionJobQueue:
+    """
+    Hàng đợi job trong process với worker pool.
+    process(job) -> result: gọi model, raise exception để được thử lại.
+    on_finish(job): ghi kết quả vào album khi job xong hẳn (done, hoặc failed sau lần thử cuối);
+    raise exception thì job được thử lại.
+    """
+
+    def __init__(self, jobs_file: str = JOBS_FILE, workers: int = RECOGNITION_WORKERS,
+                 max_attempts: int = RECOGNITION_MAX_ATTEMPTS, backoff_base: float = RECOGNITION_BACKOFF_BASE,
+                 backoff_max: float = RECOGNITION_BACKOFF_MAX, retention: float = RECOGNITION_JOB_RETENTION,
+                 flush_interval: float = RECOGNITION_JOBS_FLUSH_INTERVAL):
+        self.jobs_file = jobs_file
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retention = retention
+
+        self._jobs: Dict[str, Dict] = {}
+        # Heap (next_run_at, job_id) của các job đang chờ chạy
+        self._ready: List = []
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._process: Optional[Callable[[Dict], Dict]] = None
+        self._on_finish: Optional[Callable[[Dict], None]] = None
+        self._stopping = False
+        self._stats = {"submitted": 0, "done": 0, "failed": 0, "retries": 0}
+        # job_id thay đổi -> ghi lại file theo lô
+        self._writer = WriteBehindBuffer(self._write_snapshot, interval=flush_interval,
+                                         max_pending=RECOGNITION_JOBS_FLUSH_MAX, name="recognition-jobs-writer")
+
+        self._load()
+
+    # ===== Persistence =====
+
+    def _load(self):
+        if not os.path.exists(self.jobs_file):
+            return
+        try:
+            with open(self.jobs_file, "r", encoding="utf-8") as f:
+                jobs = json.load(f).get("jobs", [])
+        except Exception as e:
+            logger.error(f"Cannot load recognition jobs {self.jobs_file}: {e}")
+            return
+
+        now = time.time()
+        for job in jobs:
+            if job["status"] in FINISHED_STATUSES:
+                if now - job.get("updated_at", 0) > self.retention:
+                    continue
+            else:
+                # Job đang chạy khi process dừng: chạy lại
+                job["status"] = STATUS_QUEUED
+                heapq.heappush(self._ready, (job.get("next_run_at", now), job["id"]))
+            self._jobs[job["id"]] = job
+        pending = len(self._ready)
+        if pending:
+            print(f"[RECOGNITION JOBS] Resuming {pending} pending jobs")
+
+    def _write_snapshot(self, changed: Dict):
+        """Ghi toàn bộ job ra file (atomic), gọi từ thread write-behind; raise để được ghi lại lần sau"""
+        with self._condition:
+            jobs = [dict(job) for job in self._jobs.values()]
+        directory = os.path.dirname(self.jobs_file) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"jobs": jobs}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.jobs_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save(self) -> int:
+        """Ghi ngay các thay đổi đang chờ"""
+        return self._writer.flush()
+
+    def _prune_locked(self, now: float):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in FINISHED_STATUSES and now - job["updated_at"] > self.retention]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    # ===== Public API =====
+
+    def start(self, process: Callable[[Dict], Dict], on_finish: Callable[[Dict], None]):
+        """Khởi động worker thread (gọi một lần khi app khởi động)"""
+        with self._condition:
+            if self._threads:
+                return
+            self._process = process
+            self._on_finish = on_finish
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"recognition-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._writer.stop()
+
+    def submit(self, job_id: str, user_email: str, album_name: str, image_hash: str) -> Dict:
+        """Thêm job nhận dạng cho một item (job_id = id của item trong album)"""
+        now = time.time()
+        job = {
+            "id": job_id,
+            "user_email": user_email,
+            "album_name": album_name,
+            "image_hash": image_hash,
+            "status": STATUS_QUEUED,
+            "attempts": 0,
+            "next_run_at": now,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        with self._condition:
+            self._jobs[job_id] = job
+            heapq.heappush(self._ready, (now, job_id))
+            self._stats["submitted"] += 1
+            self._condition.notify()
+        self._writer.put(job_id, now)
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, user_email: str, album_name: Optional[str] = None) -> List[Dict]:
+        with self._condition:
+            return [dict(job) for job in self._jobs.values()
+                    if job["user_email"] == user_email and (album_name is None or job["album_name"] == album_name)]
+
+    def get_stats(self) -> Dict:
+        with self._condition:
+            by_status = {}
+            for job in self._jobs.values():
+                by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+            return {**self._stats, "jobs": by_status, "workers": len(self._threads),
+                    "writer": self._writer.get_stats()}
+
+    # ===== Worker =====
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _next_job(self) -> Optional[Dict]:
+        """Chờ tới khi có job đến hạn chạy; None khi queue dừng"""
+        with self._condition:
+            while not self._stopping:
+                now = time.time()
+                if self._ready and self._ready[0][0] <= now:
+                    _, job_id = heapq.heappop(self._ready)
+                    job = self._jobs.get(job_id)
+                    if job is None or job["status"] != STATUS_QUEUED:
+                        continue
+                    job["status"] = STATUS_RUNNING
+                    job["attempts"] += 1
+                    job["updated_at"] = now
+                    return dict(job)
+                timeout = self._ready[0][0] - now if self._ready else None
+                self._condition.wait(timeout)
+            return None
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            try:
+                result, error = self._process(job), None
+            except Exception as e:
+                result, error = None, str(e)
+
+            # Cập nhật album trước khi đánh dấu job xong, để restart giữa chừng không mất kết quả
+            if error is None or job["attempts"] >= self.max_attempts:
+                status = STATUS_DONE if error is None else STATUS_FAILED
+                try:
+                    self._on_finish({**job, "status": status, "result": result, "error": error})
+                except Exception as e:
+                    logger.error(f"Recognition job {job['id']} finish callback failed: {e}")
+                    if error is None:
+                        error = f"Không cập nhật được album: {e}"
+
+            now = time.time()
+            with self._condition:
+                stored = self._jobs.get(job["id"])
+                if stored is None:
+                    continue
+                stored["updated_at"] = now
+                if error is None:
+                    stored.update(status=STATUS_DONE, result=result, error=None)
+                    self._stats["done"] += 1
+                elif stored["attempts"] < self.max_attempts:
+                    stored.update(status=STATUS_QUEUED, error=error, next_run_at=now + self._backoff(stored["attempts"]))
+                    heapq.heappush(self._ready, (stored["next_run_at"], stored["id"]))
+                    self._stats["retries"] += 1
+                    print(f"[RECOGNITION JOBS] Job {stored['id']} failed (attempt {stored['attempts']}), retrying: {error}")
+                else:
+                    stored.update(status=STATUS_FAILED, error=error)
+                    self._stats["failed"] += 1
+                    print(f"[RECOGNITION JOBS] Job {stored['id']} failed after {stored['attempts']} attempts: {error}")
+                self._prune_locked(now)
+            self._writer.put(job["id"], now)
+
+
+# Global instance
+recognition_jobs = RecognitionJobQueue()
@@ -1,12 +1,19 @@
-import base64
+import atexit
 import io
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
 import exifread
-from geopy.geocoders import Nominatim
 from PIL import Image
 from io import BytesIO
 from dotenv import load_dotenv
 from openai import OpenAI
+from ai_client import MODEL_CALL_TIMEOUT
+from recognition_cache import RecognitionCache
+from landmark_catalog import get_landmark_catalog
+from geocode_cache import geocoder
+from vision_preprocess import VISION_MAX_EDGE, vision_preprocessor
 
 # Load environment variables
 load_dotenv()
@@ -20,7 +27,7 @@ if not api_key:
     USE_LOCAL_MODEL = False
 else:
     try:
-        client = OpenAI(api_key=api_key)
+        client = OpenAI(api_key=api_key, timeout=MODEL_CALL_TIMEOUT)
         OPENAI_ENABLED = True
         USE_LOCAL_MODEL = False
         print("[RECOGNIZE] ✅ OpenAI API initialized successfully")
@@ -29,54 +36,41 @@ else:
         OPENAI_ENABLED = False
         USE_LOCAL_MODEL = False
 
+# Cache kết quả nhận dạng theo perceptual hash của ảnh
+recognition_cache = RecognitionCache(
+    cache_file=os.getenv('RECOGNITION_CACHE_FILE', os.path.join(os.path.dirname(__file__), 'recognition_cache.json')),
+    max_distance=int(os.getenv('RECOGNITION_CACHE_MAX_DISTANCE', '4')),
+    ttl=float(os.getenv('RECOGNITION_CACHE_TTL', str(7 * 24 * 3600))),
+    max_entries=int(os.getenv('RECOGNITION_CACHE_MAX_ENTRIES', '5000'))
+)
+atexit.register(recognition_cache.save)
+atexit.register(geocoder.cache.save)
+
+def get_recognition_cache_stats():
+    """Thống kê hit/miss của recognition cache."""
+    return recognition_cache.get_stats()
+
+def get_vision_preprocess_stats():
+    """Thống kê tiền xử lý ảnh trước khi gọi vision model (byte tiết kiệm, thời gian encode)."""
+    return vision_preprocessor.get_stats()
+
+def get_geocode_stats():
+    """Thống kê geocoding (gazetteer offline, cache, số lần gọi Nominatim)."""
+    return geocoder.get_stats()
+
 def encode_image_base64(image_pil):
-    """Chuyển đổi PIL Image sang base64 string."""
-    buffered = BytesIO()
-    image_pil.save(buffered, format="JPEG")
-    img_bytes = buffered.getvalue()
-    return base64.b64encode(img_bytes).decode('utf-8')
+    """Chuyển đổi PIL Image sang base64 JPEG (đã xoay theo EXIF, thu nhỏ về VISION_MAX_EDGE, có cache)."""
+    return vision_preprocessor.encode_base64(image_pil)
 
 def load_landmarks_database():
-    """Load danh sách địa danh từ database.json."""
-    try:
-        import json
-        import unidecode
-        import os
-        db_path = os.path.join(os.path.dirname(__file__), 'database.json')
-        with open(db_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        # Tạo dictionary để tra cứu nhanh
-        landmarks_dict = {}
-        for item in data:
-            name = item.get("name", "")
-            # Normalize tên để dễ so sánh
-            normalized_name = unidecode.unidecode(name.lower())
-            landmarks_dict[normalized_name] = {
-                "name": name,
-                "lat": item.get("lat"),
-                "lon": item.get("lon"),
-                "location": item.get("location"),
-                "province": item.get("province")
-            }
-        return landmarks_dict
-    except Exception as e:
-        print(f"[RECOGNIZE] Warning: Could not load database.json: {e}")
-        return {}
+    """Danh sách địa danh đã chuẩn hoá tên (dùng catalog dựng sẵn, không đọc lại file)."""
+    return get_landmark_catalog().by_name
 
 def find_landmark_info(landmark_name):
     """Tìm thông tin địa danh từ database hoặc geocoding."""
-    import unidecode
-    
-    # Load database
-    landmarks_db = load_landmarks_database()
-    
-    # Normalize tên để tìm kiếm
-    normalized_search = unidecode.unidecode(landmark_name.lower())
-    
-    # Tìm kiếm exact match
-    if normalized_search in landmarks_db:
-        info = landmarks_db[normalized_search]
+    # Tra cứu exact / partial / fuzzy match trong catalog
+    info = get_landmark_catalog().find(landmark_name)
+    if info is not None:
         address = f"{info['location']}, {info['province']}" if info.get('location') and info.get('province') else info.get('location', 'N/A')
         return {
             "lat": info.get("lat"),
@@ -84,33 +78,10 @@ def find_landmark_info(landmark_name):
             "address": address
         }
     
-    # Tìm kiếm partial match
-    for key, info in landmarks_db.items():
-        if normalized_search in key or key in normalized_search:
-            address = f"{info['location']}, {info['province']}" if info.get('location') and info.get('province') else info.get('location', 'N/A')
-            return {
-                "lat": info.get("lat"),
-                "lon": info.get("lon"),
-                "address": address
-            }
-    
-    # Nếu không tìm thấy trong database, thử geocoding
-    try:
-        from geopy.geocoders import Nominatim
-        geolocator = Nominatim(user_agent="travel_app_recognizer", timeout=5)
-        
-        # Thêm "Vietnam" để tìm kiếm chính xác hơn
-        search_query = f"{landmark_name}, Vietnam"
-        location = geolocator.geocode(search_query, language="vi")
-        
-        if location:
-            return {
-                "lat": location.latitude,
-                "lon": location.longitude,
-                "address": location.address
-            }
-    except Exception as e:
-        print(f"[RECOGNIZE] Geocoding error: {e}")
+    # Nếu không tìm thấy trong database, thử geocoding (gazetteer offline -> cache -> Nominatim)
+    location = geocoder.geocode(landmark_name)
+    if location:
+        return location
     
     # Không tìm thấy
     return {
@@ -152,22 +123,18 @@ def get_image_analysis(image_pil, prompt):
     except Exception as e:
         raise Exception(f"Lỗi phân tích ảnh với OpenAI: {e}")
 
+@recognition_cache.cached(
+    "landmark",
+    should_cache=lambda result: OPENAI_ENABLED and not result.startswith("Lỗi nhận dạng"),
+    preprocess=vision_preprocessor.prepare
+)
 def get_landmark_from_image(image_pil):
     """Yêu cầu: Nhận dạng địa danh - sử dụng OpenAI Vision API."""
     if not OPENAI_ENABLED:
         return "Không thể nhận diện (OpenAI API chưa sẵn sàng)"
     
     # Load danh sách địa danh từ database để tham khảo
-    landmark_names = []
-    try:
-        import json
-        import os
-        db_path = os.path.join(os.path.dirname(__file__), 'database.json')
-        with open(db_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            landmark_names = [item.get("name", "") for item in data if item.get("name")]
-    except:
-        pass
+    landmark_names = get_landmark_catalog().names
     
     landmarks_list = ", ".join(landmark_names[:34]) if landmark_names else "Landmark 81, Nhà thờ Đức Bà, Bưu điện Trung tâm Sài Gòn, Chợ Bến Thành, Bitexco Tower, AEON Mall Tân Phú, Vincom Center Đồng Khởi, Bến Nhà Rồng, Crescent Mall, Công viên Suối Tiên"
     prompt = f"""Phân tích ảnh này và nhận dạng địa danh cụ thể ở TP. Hồ Chí Minh.
@@ -193,8 +160,16 @@ Chỉ trả về TÊN, không giải thích thêm."""
     except Exception as e:
         return f"Lỗi nhận dạng: {str(e)[:50]}"
 
-def get_landmark_with_confidence(image_pil):
-    """Nhận dạng địa danh với thông tin chi tiết hơn - sử dụng OpenAI Vision API."""
+@recognition_cache.cached(
+    "landmark_confidence",
+    should_cache=lambda result: OPENAI_ENABLED,
+    preprocess=vision_preprocessor.prepare
+)
+def recognize_landmark(image_pil):
+    """
+    Nhận dạng địa danh với thông tin chi tiết - sử dụng OpenAI Vision API.
+    Lỗi gọi API/mạng được raise (để hàng đợi nhận dạng nền thử lại), không trả về dict lỗi.
+    """
     if not OPENAI_ENABLED:
         return {
             "landmark": "Không rõ địa danh",
@@ -203,16 +178,7 @@ def get_landmark_with_confidence(image_pil):
         }
     
     # Load danh sách địa danh từ database
-    landmark_names = []
-    try:
-        import json
-        import os
-        db_path = os.path.join(os.path.dirname(__file__), 'database.json')
-        with open(db_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            landmark_names = [item.get("name", "") for item in data if item.get("name")]
-    except:
-        pass
+    landmark_names = get_landmark_catalog().names
     
     landmarks_list = "\n- ".join(landmark_names[:30]) if landmark_names else "Landmark 81\n- Nhà Thờ Đức Bà\n- Chợ Bến Thành\n- AEON Mall Tân Phú\n- Bitexco Tower"
     
@@ -240,12 +206,11 @@ QUY TẮC:
 
 CHỈ TRẢ VỀ JSON HỢP LỆ, KHÔNG CÓ TEXT NÀO KHÁC."""
     
+    import json
+    import re
+    
+    result = get_image_analysis(image_pil, prompt)
     try:
-        result = get_image_analysis(image_pil, prompt)
-        # Parse JSON response
-        import json
-        import re
-        
         # Try to extract JSON from response if it contains extra text
         # Look for JSON pattern with support for nested objects
         json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', result, re.DOTALL)
@@ -281,6 +246,12 @@ CHỈ TRẢ VỀ JSON HỢP LỆ, KHÔNG CÓ TEXT NÀO KHÁC."""
             "lon": None,
             "address": None
         }
+
+
+def get_landmark_with_confidence(image_pil):
+    """Nhận dạng địa danh với thông tin chi tiết hơn; lỗi được trả về trong description ("Lỗi: ...")."""
+    try:
+        return recognize_landmark(image_pil)
     except Exception as e:
         return {
             "landmark": "Không rõ địa danh",
@@ -292,139 +263,188 @@ CHỈ TRẢ VỀ JSON HỢP LỆ, KHÔNG CÓ TEXT NÀO KHÁC."""
         }
 
 
-def detect_landmark_strict(pil_img, retries=3):
-    """Nhận dạng địa danh với độ chính xác cao - thử nhiều lần với các biến thể ảnh."""
-    from PIL import ImageEnhance, ImageFilter
-    
-    if not OPENAI_ENABLED:
-        raise ValueError("OpenAI API chưa khả dụng")
-    
-    def ask(img):
-        """Gọi API nhận dạng địa danh."""
-        try:
-            prompt = """Nhận dạng địa danh trong ảnh này.
+# Cấu hình cho detect_landmark_strict
+STRICT_MAX_PARALLEL = int(os.getenv('STRICT_MAX_PARALLEL', '4'))    # Số lời gọi chạy song song
+STRICT_TIME_BUDGET = float(os.getenv('STRICT_TIME_BUDGET', '45'))   # Tổng thời gian tối đa (giây)
+STRICT_CALL_BUDGET = int(os.getenv('STRICT_CALL_BUDGET', '12'))     # Tổng số lời gọi API tối đa
+
+_strict_executor = ThreadPoolExecutor(max_workers=STRICT_MAX_PARALLEL, thread_name_prefix="strict-landmark")
+_strict_metrics_lock = Lock()
+_strict_metrics = {}
+
+STRICT_PROMPT = """Nhận dạng địa danh trong ảnh này.
 Chỉ trả về TÊN ĐẦY ĐỦ của địa danh bằng tiếng Việt nếu bạn CHẮC CHẮN nhận ra.
 Nếu không chắc chắn, trả về 'Không rõ địa danh'.
 Chỉ trả về TÊN, không giải thích thêm."""
-            result = get_image_analysis(img, prompt)
-            return result.strip() if result else ""
-        except Exception:
-            return ""
+
+INVALID_LANDMARK_RESPONSES = [
+    "không rõ địa danh", 
+    "không rõ", 
+    "không xác định",
+    "không có địa danh",
+    "không chắc chắn",
+    "n/a",
+    "unknown"
+]
+
+def is_valid_landmark_result(name):
+    """Kiểm tra kết quả nhận dạng có hợp lệ không."""
+    if not name:
+        return False
+    name_lower = name.lower()
+    return not any(invalid in name_lower for invalid in INVALID_LANDMARK_RESPONSES)
+
+def _strict_variants(pil_img):
+    """
+    Các biến thể ảnh theo thứ tự ưu tiên; mỗi biến thể được tạo lazy khi cần.
+    Biến thể phóng to bị giới hạn ở VISION_MAX_EDGE; ảnh đã chạm ngưỡng thì bỏ qua
+    (ảnh gửi đi sẽ giống hệt bản gốc, chỉ tốn thêm một lời gọi).
+    """
+    from PIL import ImageEnhance, ImageFilter
     
-    def is_valid_result(name):
-        """Kiểm tra kết quả có hợp lệ không."""
-        if not name:
-            return False
-        name_lower = name.lower()
-        invalid_responses = [
-            "không rõ địa danh", 
-            "không rõ", 
-            "không xác định",
-            "không có địa danh",
-            "không chắc chắn",
-            "n/a",
-            "unknown"
-        ]
-        return not any(invalid in name_lower for invalid in invalid_responses)
+    w, h = pil_img.size
+    max_scale = VISION_MAX_EDGE / max(w, h)
     
-    # 1. Thử với ảnh gốc (retries lần)
-    print(f"[RECOGNIZE] Trying original image ({retries} attempts)...")
-    for _ in range(retries):
-        name = ask(pil_img)
-        if is_valid_result(name):
-            print(f"[RECOGNIZE] ✅ Found with original: {name}")
-            return name
+    def scaled(scale):
+        def build():
+            return pil_img.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+        return build
     
-    # 2. Thử resize với nhiều tỷ lệ khác nhau
-    w, h = pil_img.size
-    for scale in [1.5, 0.75, 2.0, 0.5]:
-        print(f"[RECOGNIZE] Trying scale {scale}x...")
-        resized = pil_img.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
-        for _ in range(retries):
-            name = ask(resized)
-            if is_valid_result(name):
-                print(f"[RECOGNIZE] ✅ Found with scale {scale}x: {name}")
-                return name
+    def upscaled(name, scale):
+        scale = min(scale, max_scale)
+        return [(name, scaled(scale))] if scale > 1.01 else []
     
-    # 3. Tăng độ sắc nét (sharpness)
-    try:
-        print(f"[RECOGNIZE] Trying sharpness enhancement...")
-        enhancer = ImageEnhance.Sharpness(pil_img)
-        sharpened = enhancer.enhance(2.0)
-        for _ in range(retries):
-            name = ask(sharpened)
-            if is_valid_result(name):
-                print(f"[RECOGNIZE] ✅ Found with sharpness: {name}")
-                return name
-    except Exception:
-        pass
+    def jpeg_q95():
+        buf = BytesIO()
+        pil_img.convert("RGB").save(buf, format="JPEG", quality=95, optimize=True)
+        buf.seek(0)
+        return Image.open(buf)
     
-    # 4. Tăng độ tương phản (contrast)
-    try:
-        print(f"[RECOGNIZE] Trying contrast enhancement...")
-        enhancer = ImageEnhance.Contrast(pil_img)
-        contrasted = enhancer.enhance(1.5)
-        for _ in range(retries):
-            name = ask(contrasted)
-            if is_valid_result(name):
-                print(f"[RECOGNIZE] ✅ Found with contrast: {name}")
-                return name
-    except Exception:
-        pass
+    def sharp_contrast():
+        img_combo = ImageEnhance.Sharpness(pil_img.copy()).enhance(1.8)
+        return ImageEnhance.Contrast(img_combo).enhance(1.3)
     
-    # 5. Tăng độ sáng (brightness) - hữu ích cho ảnh tối
+    return [
+        ("original", lambda: pil_img),
+        *upscaled("scale_1.5", 1.5),
+        ("scale_0.75", scaled(0.75)),
+        *(upscaled("scale_2.0", 2.0) if max_scale > 1.5 else []),
+        ("scale_0.5", scaled(0.5)),
+        ("sharpness", lambda: ImageEnhance.Sharpness(pil_img).enhance(2.0)),
+        ("contrast", lambda: ImageEnhance.Contrast(pil_img).enhance(1.5)),
+        ("brightness", lambda: ImageEnhance.Brightness(pil_img).enhance(1.3)),
+        ("sharpen_filter", lambda: pil_img.filter(ImageFilter.SHARPEN)),
+        ("jpeg_q95", jpeg_q95),
+        ("sharpness_contrast", sharp_contrast),
+    ]
+
+def _record_strict_attempt(variant, outcome, elapsed):
+    """outcome: 'win', 'miss', 'error' hoặc 'cancelled'"""
+    with _strict_metrics_lock:
+        m = _strict_metrics.setdefault(variant, {
+            "attempts": 0, "wins": 0, "misses": 0, "errors": 0, "cancelled": 0, "total_ms": 0.0
+        })
+        if outcome == "cancelled":
+            m["cancelled"] += 1
+            return
+        m["attempts"] += 1
+        m[{"win": "wins", "miss": "misses", "error": "errors"}[outcome]] += 1
+        m["total_ms"] += elapsed * 1000
+
+def get_strict_metrics():
+    """Thống kê theo từng biến thể ảnh: số lần thử, số lần thắng, độ trễ trung bình."""
+    with _strict_metrics_lock:
+        return {
+            variant: {
+                "attempts": m["attempts"],
+                "wins": m["wins"],
+                "misses": m["misses"],
+                "errors": m["errors"],
+                "cancelled": m["cancelled"],
+                "win_rate": round(m["wins"] / m["attempts"], 3) if m["attempts"] else 0.0,
+                "avg_ms": round(m["total_ms"] / m["attempts"], 1) if m["attempts"] else 0.0,
+            }
+            for variant, m in _strict_metrics.items()
+        }
+
+def _ask_strict(variant, img):
+    """Gọi API nhận dạng cho một biến thể, ghi lại metrics."""
+    start = time.perf_counter()
     try:
-        print(f"[RECOGNIZE] Trying brightness enhancement...")
-        enhancer = ImageEnhance.Brightness(pil_img)
-        brightened = enhancer.enhance(1.3)
-        for _ in range(retries):
-            name = ask(brightened)
-            if is_valid_result(name):
-                print(f"[RECOGNIZE] ✅ Found with brightness: {name}")
-                return name
+        result = get_image_analysis(img, STRICT_PROMPT)
+        name = result.strip() if result else ""
     except Exception:
-        pass
+        _record_strict_attempt(variant, "error", time.perf_counter() - start)
+        return ""
+    valid = is_valid_landmark_result(name)
+    _record_strict_attempt(variant, "win" if valid else "miss", time.perf_counter() - start)
+    return name
+
+@recognition_cache.cached("strict_landmark", preprocess=vision_preprocessor.prepare)
+def detect_landmark_strict(pil_img, retries=3, max_parallel=None, time_budget=None, call_budget=None):
+    """
+    Nhận dạng địa danh với độ chính xác cao - thử nhiều biến thể ảnh song song.
     
-    # 6. Áp dụng bộ lọc làm sắc nét (SHARPEN filter)
-    try:
-        print(f"[RECOGNIZE] Trying SHARPEN filter...")
-        filtered = pil_img.filter(ImageFilter.SHARPEN)
-        for _ in range(retries):
-            name = ask(filtered)
-            if is_valid_result(name):
-                print(f"[RECOGNIZE] ✅ Found with SHARPEN filter: {name}")
-                return name
-    except Exception:
-        pass
+    Các lần thử được xếp theo vòng: mọi biến thể lần 1, rồi mọi biến thể lần 2...
+    Tối đa max_parallel lời gọi chạy cùng lúc; trả về ngay khi có kết quả hợp lệ
+    đầu tiên và huỷ các lời gọi chưa chạy.
     
-    # 7. Tăng chất lượng ảnh qua nén JPEG cao
-    try:
-        print(f"[RECOGNIZE] Trying high-quality JPEG compression...")
-        buf = BytesIO()
-        pil_img.convert("RGB").save(buf, format="JPEG", quality=95, optimize=True)
-        buf.seek(0)
-        img_enhanced = Image.open(buf)
-        for _ in range(retries):
-            name = ask(img_enhanced)
-            if is_valid_result(name):
-                print(f"[RECOGNIZE] ✅ Found with JPEG optimization: {name}")
-                return name
-    except Exception:
-        pass
+    Args:
+        retries: Số lần thử cho mỗi biến thể
+        max_parallel: Số lời gọi song song (mặc định STRICT_MAX_PARALLEL)
+        time_budget: Tổng thời gian tối đa, giây (mặc định STRICT_TIME_BUDGET)
+        call_budget: Tổng số lời gọi API tối đa (mặc định STRICT_CALL_BUDGET)
+    """
+    if not OPENAI_ENABLED:
+        raise ValueError("OpenAI API chưa khả dụng")
+    
+    max_parallel = max_parallel or STRICT_MAX_PARALLEL
+    time_budget = STRICT_TIME_BUDGET if time_budget is None else time_budget
+    call_budget = STRICT_CALL_BUDGET if call_budget is None else call_budget
     
-    # 8. Kết hợp nhiều kỹ thuật: Sharpness + Contrast
+    variants = _strict_variants(pil_img)
+    schedule = [variant for _ in range(retries) for variant in variants][:call_budget]
+    built = {}
+    deadline = time.monotonic() + time_budget
+    pending = {}
+    next_index = 0
+    
+    print(f"[RECOGNIZE] Strict detection: {len(schedule)} calls, {max_parallel} parallel, {time_budget}s budget")
     try:
-        print(f"[RECOGNIZE] Trying combined enhancement (Sharpness + Contrast)...")
-        img_combo = pil_img.copy()
-        img_combo = ImageEnhance.Sharpness(img_combo).enhance(1.8)
-        img_combo = ImageEnhance.Contrast(img_combo).enhance(1.3)
-        for _ in range(retries):
-            name = ask(img_combo)
-            if is_valid_result(name):
-                print(f"[RECOGNIZE] ✅ Found with combined enhancement: {name}")
-                return name
-    except Exception:
-        pass
+        while next_index < len(schedule) or pending:
+            # Giữ tối đa max_parallel lời gọi đang chạy
+            while next_index < len(schedule) and len(pending) < max_parallel:
+                variant, build = schedule[next_index]
+                next_index += 1
+                if variant not in built:
+                    try:
+                        built[variant] = build()
+                    except Exception:
+                        built[variant] = None
+                if built[variant] is None:
+                    continue
+                future = _strict_executor.submit(_ask_strict, variant, built[variant])
+                pending[future] = variant
+            
+            if not pending:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"[RECOGNIZE] ⏱️ Strict detection time budget exhausted")
+                break
+            
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                variant = pending.pop(future)
+                name = future.result()
+                if is_valid_landmark_result(name):
+                    print(f"[RECOGNIZE] ✅ Found with {variant}: {name}")
+                    return name
+    finally:
+        # Huỷ các lời gọi chưa bắt đầu; lời gọi đang chạy sẽ bị bỏ qua kết quả
+        for future, variant in pending.items():
+            if future.cancel():
+                _record_strict_attempt(variant, "cancelled", 0)
     
     print(f"[RECOGNIZE] ❌ Failed to recognize landmark after all attempts")
     raise ValueError("Không nhận diện được địa danh sau nhiều lần thử với các kỹ thuật khác nhau")
@@ -458,9 +478,7 @@ def get_gps_from_image(image_file):
 def reverse_geocode(lat, lon):
     """Chuyển đổi tọa độ thành địa chỉ."""
     try:
-        geolocator = Nominatim(user_agent="album_locator")
-        location = geolocator.reverse((lat, lon), language="vi")
-        return location.address if location else None
+        return geocoder.reverse(lat, lon)
     except Exception:
         return None
 
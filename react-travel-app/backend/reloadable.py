@@ -0,0 +1,55 @@
+"""
+Reloadable Module - Dữ liệu dựng một lần từ file, tự dựng lại khi file thay đổi (mtime/size)
+Snapshot cũ vẫn dùng được cho đến khi snapshot mới dựng xong và được thay thế atomic.
+"""
+
+import os
+from threading import Lock
+from typing import Callable, Generic, Optional, Sequence, Tuple, TypeVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ReloadableFile(Generic[T]):
+    """
+    get() trả về object được dựng bởi builder(path).
+    Mỗi lần gọi chỉ tốn một os.stat mỗi file; builder chỉ chạy lại khi file đổi.
+    extra_paths: các file khác mà builder đọc tới, đổi thì cũng dựng lại.
+    """
+
+    def __init__(self, path: str, builder: Callable[[str], T], extra_paths: Sequence[str] = ()):
+        self.path = path
+        self.builder = builder
+        self._paths = (path, *extra_paths)
+        self._lock = Lock()
+        self._value: Optional[T] = None
+        self._signature: Optional[Tuple] = None
+
+    def _current_signature(self) -> Tuple:
+        signature = []
+        for path in self._paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def get(self) -> T:
+        signature = self._current_signature()
+        value = self._value
+        if value is not None and signature == self._signature:
+            return value
+
+        with self._lock:
+            # Thread khác có thể đã dựng xong trong lúc chờ lock
+            if self._value is not None and signature == self._signature:
+                return self._value
+            new_value = self.builder(self.path)
+            self._value, self._signature = new_value, signature
+            if value is not None:
+                logger.info(f"Reloaded {os.path.basename(self.path)} after change on disk")
+            return new_value
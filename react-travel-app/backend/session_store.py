@@ -0,0 +1,416 @@
+"""
+Session Store Module - Phiên đăng nhập có hạn dùng (idle timeout + absolute timeout)
+- Session hết hạn khi không hoạt động quá SESSION_IDLE_TIMEOUT giây
+  hoặc đã đăng nhập quá SESSION_ABSOLUTE_TIMEOUT giây
+- Đủ số session tối đa thì loại session đăng nhập sớm nhất: O(1) với bộ nhớ
+  (dict có thứ tự), O(log n) với SQLite (index theo login_time), không còn min() trên toàn bộ
+- Thread nền dọn session hết hạn định kỳ; các thao tác đọc cũng bỏ qua session đã hết hạn
+- Mỗi request đã xác thực gọi touch(); touch cùng key trong SESSION_TOUCH_INTERVAL giây
+  chỉ ghi xuống backend một lần (key không có session cũng chỉ tra backend một lần),
+  touch_due() cho biết trước có cần ghi hay không mà không chạm tới backend
+- Backend thay được: "memory" (mặc định, trong process) hoặc "sqlite" (file dùng chung
+  giữa nhiều uvicorn worker), chọn bằng SESSION_BACKEND
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+SESSION_IDLE_TIMEOUT = float(os.getenv('SESSION_IDLE_TIMEOUT', str(30 * 60)))
+SESSION_ABSOLUTE_TIMEOUT = float(os.getenv('SESSION_ABSOLUTE_TIMEOUT', str(24 * 3600)))
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '60'))
+SESSION_TOUCH_INTERVAL = float(os.getenv('SESSION_TOUCH_INTERVAL', '60'))
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')
+SESSION_DB_FILE = os.getenv('SESSION_DB_FILE', 'sessions.db')
+
+
+class SessionBackend:
+    """
+    Giao diện backend. Session trả về là dict dữ liệu lúc đăng nhập cộng thêm
+    login_time / last_activity (epoch giây). `now` do SessionStore truyền vào.
+    """
+
+    name = "base"
+
+    def __init__(self, idle_timeout: float, absolute_timeout: float):
+        self.idle_timeout = idle_timeout
+        self.absolute_timeout = absolute_timeout
+
+    def put(self, key: str, data: Dict, now: float, max_sessions: int) -> List[str]:
+        """Tạo/thay session của key; trả về các key bị loại để nhường chỗ"""
+        raise NotImplementedError
+
+    def get(self, key: str, now: float) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def touch(self, key: str, now: float) -> bool:
+        """Cập nhật last_activity; False nếu không có session (hoặc đã hết hạn)"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def keys(self, now: float) -> List[str]:
+        raise NotImplementedError
+
+    def count(self, now: float) -> int:
+        raise NotImplementedError
+
+    def sweep(self, now: float) -> int:
+        """Xoá các session hết hạn, trả về số session đã xoá"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Hai dict có thứ tự trên cùng tập session:
+    - _by_login: thứ tự đăng nhập (đăng nhập lại thì xoá và thêm vào cuối) -> đầu dict là session cũ nhất
+    - _by_activity: move_to_end mỗi lần touch -> đầu dict là session lâu không hoạt động nhất
+    Nên loại session cũ nhất và dọn session hết hạn chỉ cần xem đầu dict.
+    """
+
+    name = "memory"
+
+    def __init__(self, idle_timeout: float, absolute_timeout: float):
+        super().__init__(idle_timeout, absolute_timeout)
+        self._lock = threading.Lock()
+        self._by_login: "OrderedDict[str, Dict]" = OrderedDict()
+        self._by_activity: "OrderedDict[str, None]" = OrderedDict()
+
+    def _remove(self, key: str):
+        del self._by_login[key]
+        del self._by_activity[key]
+
+    def _expire(self, now: float) -> int:
+        """Bỏ session hết hạn ở đầu hai dict; gọi khi đang giữ _lock"""
+        removed = 0
+        while self._by_login:
+            key, session = next(iter(self._by_login.items()))
+            if session["login_time"] > now - self.absolute_timeout:
+                break
+            self._remove(key)
+            removed += 1
+        while self._by_activity:
+            key = next(iter(self._by_activity))
+            if self._by_login[key]["last_activity"] > now - self.idle_timeout:
+                break
+            self._remove(key)
+            removed += 1
+        return removed
+
+    def put(self, key: str, data: Dict, now: float, max_sessions: int) -> List[str]:
+        with self._lock:
+            self._expire(now)
+            if key in self._by_login:
+                self._remove(key)
+            evicted = []
+            while self._by_login and len(self._by_login) >= max_sessions:
+                oldest = next(iter(self._by_login))
+                self._remove(oldest)
+                evicted.append(oldest)
+            self._by_login[key] = {**data, "login_time": now, "last_activity": now}
+            self._by_activity[key] = None
+            return evicted
+
+    def get(self, key: str, now: float) -> Optional[Dict]:
+        with self._lock:
+            self._expire(now)
+            session = self._by_login.get(key)
+            return dict(session) if session is not None else None
+
+    def touch(self, key: str, now: float) -> bool:
+        with self._lock:
+            self._expire(now)
+            session = self._by_login.get(key)
+            if session is None:
+                return False
+            session["last_activity"] = now
+            self._by_activity.move_to_end(key)
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._by_login:
+                return False
+            self._remove(key)
+            return True
+
+    def keys(self, now: float) -> List[str]:
+        with self._lock:
+            self._expire(now)
+            return list(self._by_login)
+
+    def count(self, now: float) -> int:
+        with self._lock:
+            self._expire(now)
+            return len(self._by_login)
+
+    def sweep(self, now: float) -> int:
+        with self._lock:
+            return self._expire(now)
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Bảng sessions trong file SQLite (WAL), index theo login_time và last_activity.
+    Mỗi thread một connection; put chạy trong BEGIN IMMEDIATE nên giới hạn số session
+    đúng cả khi nhiều process cùng ghi. Số session được trigger giữ trong bảng session_count
+    nên put không phải COUNT(*) cả bảng.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, idle_timeout: float, absolute_timeout: float, db_file: str = SESSION_DB_FILE):
+        super().__init__(idle_timeout, absolute_timeout)
+        self.db_file = db_file
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " key TEXT PRIMARY KEY, data TEXT NOT NULL,"
+                " login_time REAL NOT NULL, last_activity REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_login ON sessions(login_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_activity ON sessions(last_activity)")
+            # Bộ đếm một dòng; file cũ chưa có bảng này thì đếm một lần lúc mở
+            conn.execute("CREATE TABLE IF NOT EXISTS session_count (id INTEGER PRIMARY KEY CHECK (id = 0),"
+                         " n INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO session_count (id, n) SELECT 0, COUNT(*) FROM sessions")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS sessions_count_insert AFTER INSERT ON sessions"
+                         " BEGIN UPDATE session_count SET n = n + 1 WHERE id = 0; END")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS sessions_count_delete AFTER DELETE ON sessions"
+                         " BEGIN UPDATE session_count SET n = n - 1 WHERE id = 0; END")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: tự quản lý transaction (BEGIN IMMEDIATE)
+            conn = sqlite3.connect(self.db_file, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _live(self, now: float) -> tuple:
+        """Điều kiện WHERE cho session còn hạn"""
+        return now - self.absolute_timeout, now - self.idle_timeout
+
+    def put(self, key: str, data: Dict, now: float, max_sessions: int) -> List[str]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._sweep(conn, now)
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            # Vừa sweep xong nên mọi session còn lại đều còn hạn
+            count = conn.execute("SELECT n FROM session_count WHERE id = 0").fetchone()[0]
+            evicted = []
+            if count >= max_sessions:
+                rows = conn.execute("SELECT key FROM sessions ORDER BY login_time LIMIT ?",
+                                    (count - max_sessions + 1,)).fetchall()
+                evicted = [row[0] for row in rows]
+                conn.executemany("DELETE FROM sessions WHERE key = ?", rows)
+            conn.execute("INSERT INTO sessions (key, data, login_time, last_activity) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(data, ensure_ascii=False), now, now))
+            conn.execute("COMMIT")
+            return evicted
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str, now: float) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT data, login_time, last_activity FROM sessions"
+            " WHERE key = ? AND login_time > ? AND last_activity > ?",
+            (key, *self._live(now))).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[0]), "login_time": row[1], "last_activity": row[2]}
+
+    def touch(self, key: str, now: float) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE sessions SET last_activity = ? WHERE key = ? AND login_time > ? AND last_activity > ?",
+            (now, key, *self._live(now)))
+        return cursor.rowcount > 0
+
+    def delete(self, key: str) -> bool:
+        return self._connect().execute("DELETE FROM sessions WHERE key = ?", (key,)).rowcount > 0
+
+    def keys(self, now: float) -> List[str]:
+        rows = self._connect().execute(
+            "SELECT key FROM sessions WHERE login_time > ? AND last_activity > ? ORDER BY login_time",
+            self._live(now)).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, now: float) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM sessions WHERE login_time > ? AND last_activity > ?",
+            self._live(now)).fetchone()[0]
+
+    def _sweep(self, conn: sqlite3.Connection, now: float) -> int:
+        return conn.execute("DELETE FROM sessions WHERE login_time <= ? OR last_activity <= ?",
+                            self._live(now)).rowcount
+
+    def sweep(self, now: float) -> int:
+        return self._sweep(self._connect(), now)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_session_backend(kind: str = SESSION_BACKEND, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                           absolute_timeout: float = SESSION_ABSOLUTE_TIMEOUT) -> SessionBackend:
+    """Backend theo tên ("memory" / "sqlite")"""
+    if kind == "sqlite":
+        return SQLiteSessionBackend(idle_timeout, absolute_timeout)
+    if kind != "memory":
+        logger.warning(f"Unknown SESSION_BACKEND={kind!r}, using memory")
+    return MemorySessionBackend(idle_timeout, absolute_timeout)
+
+
+class SessionStore:
+    """Session theo key (username/email) trên một backend, kèm thread nền dọn session hết hạn"""
+
+    def __init__(self, backend: Optional[SessionBackend] = None, sweep_interval: float = SESSION_SWEEP_INTERVAL,
+                 touch_interval: float = SESSION_TOUCH_INTERVAL):
+        self.backend = backend or create_session_backend()
+        self.sweep_interval = sweep_interval
+        self.touch_interval = touch_interval
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # key -> lần cuối ghi last_activity xuống backend (trong process này)
+        self._touched: Dict[str, float] = {}
+        # key không có session -> lần cuối tra backend (không tra lại trong touch_interval)
+        self._missed: Dict[str, float] = {}
+        self._stats = {"created": 0, "evicted": 0, "deleted": 0, "sweeps": 0, "swept": 0, "errors": 0,
+                       "touches": 0, "touches_skipped": 0}
+
+        atexit.register(self.stop)
+
+    def _ensure_sweeper(self):
+        """Sweeper chỉ khởi động khi có session đầu tiên"""
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            self.sweep()
+
+    def create(self, key: str, data: Dict, max_sessions: int) -> List[str]:
+        """Tạo session mới (thay session cũ cùng key); trả về các key bị loại"""
+        now = time.time()
+        evicted = self.backend.put(key, data, now, max_sessions)
+        with self._lock:
+            self._touched[key] = now
+            self._missed.pop(key, None)
+            for evicted_key in evicted:
+                self._touched.pop(evicted_key, None)
+            self._stats["created"] += 1
+            self._stats["evicted"] += len(evicted)
+        self._ensure_sweeper()
+        return evicted
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.backend.get(key, time.time())
+
+    def touch_due(self, key: str) -> bool:
+        """touch(key) có phải ghi/tra backend không (chỉ kiểm tra trong bộ nhớ, không I/O)"""
+        now = time.time()
+        with self._lock:
+            last = self._touched.get(key, self._missed.get(key))
+            return last is None or now - last >= self.touch_interval
+
+    def touch(self, key: str) -> bool:
+        """Ghi nhận hoạt động; False nếu key không có session (hoặc đã hết hạn)"""
+        now = time.time()
+        with self._lock:
+            last = self._touched.get(key)
+            if last is not None and now - last < self.touch_interval:
+                # Vừa ghi gần đây: session chưa thể hết hạn vì idle
+                self._stats["touches_skipped"] += 1
+                return True
+            missed = self._missed.get(key)
+            if missed is not None and now - missed < self.touch_interval:
+                self._stats["touches_skipped"] += 1
+                return False
+        touched = self.backend.touch(key, now)
+        with self._lock:
+            if touched:
+                self._touched[key] = now
+                self._missed.pop(key, None)
+            else:
+                self._touched.pop(key, None)
+                self._missed[key] = now
+            self._stats["touches"] += 1
+        return touched
+
+    def delete(self, key: str) -> bool:
+        deleted = self.backend.delete(key)
+        with self._lock:
+            self._touched.pop(key, None)
+            self._missed.pop(key, None)
+            if deleted:
+                self._stats["deleted"] += 1
+        return deleted
+
+    def keys(self) -> List[str]:
+        return self.backend.keys(time.time())
+
+    def count(self) -> int:
+        return self.backend.count(time.time())
+
+    def sweep(self) -> int:
+        try:
+            removed = self.backend.sweep(time.time())
+        except Exception as e:
+            # Ví dụ file SQLite đang bị khoá quá lâu: lần sau dọn tiếp
+            with self._lock:
+                self._stats["errors"] += 1
+            logger.error(f"Session sweep failed: {e}")
+            return 0
+        now = time.time()
+        with self._lock:
+            for key in [key for key, at in self._touched.items() if now - at > self.backend.idle_timeout]:
+                del self._touched[key]
+            for key in [key for key, at in self._missed.items() if now - at >= self.touch_interval]:
+                del self._missed[key]
+            self._stats["sweeps"] += 1
+            self._stats["swept"] += removed
+        return removed
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "backend": self.backend.name,
+                "idle_timeout": self.backend.idle_timeout,
+                "absolute_timeout": self.backend.absolute_timeout,
+                "sweep_interval": self.sweep_interval,
+                "touch_interval": self.touch_interval,
+            }
@@ -12,14 +12,23 @@ Social Feed Module - Quản lý posts, comments, likes cho chức năng mạng x
 """
 
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
+import base64
 import json
 import os
 
+from blob_store import blob_store
+
 # File lưu trữ posts và comments
-POSTS_FILE = os.path.join(os.path.dirname(__file__), 'social_posts.json')
-COMMENTS_FILE = os.path.join(os.path.dirname(__file__), 'social_comments.json')
-LIKES_FILE = os.path.join(os.path.dirname(__file__), 'social_likes.json')
+POSTS_FILE = os.getenv('SOCIAL_POSTS_FILE', os.path.join(os.path.dirname(__file__), 'social_posts.json'))
+COMMENTS_FILE = os.getenv('SOCIAL_COMMENTS_FILE', os.path.join(os.path.dirname(__file__), 'social_comments.json'))
+LIKES_FILE = os.getenv('SOCIAL_LIKES_FILE', os.path.join(os.path.dirname(__file__), 'social_likes.json'))
+
+# URL serve ảnh của post từ blob store (xem /api/social/images/{image_hash} trong main.py)
+IMAGE_URL_TEMPLATE = "/api/social/images/{image_hash}"
+
+def image_url(image_hash: str) -> str:
+    return IMAGE_URL_TEMPLATE.format(image_hash=image_hash)
 
 class SocialFeedManager:
     def __init__(self):
@@ -27,6 +36,25 @@ class SocialFeedManager:
         self.comments = self.load_comments()
         self.likes = self.load_likes()
     
+    def migrate_inline_images(self) -> int:
+        """Chuyển ảnh base64 (data URI) cũ trong posts sang blob store (gọi lúc server khởi động)"""
+        migrated = 0
+        for post in self.posts.values():
+            image_data = post.get('image_data')
+            if post.get('image_hash') or not image_data or 'base64,' not in image_data:
+                continue
+            try:
+                image_bytes = base64.b64decode(image_data.split('base64,', 1)[1])
+            except Exception:
+                continue
+            post['image_hash'] = blob_store.put(image_bytes)
+            post['image_data'] = image_url(post['image_hash'])
+            migrated += 1
+        
+        if migrated:
+            self.save_posts()
+        return migrated
+    
     def load_posts(self) -> Dict:
         """Load posts từ file"""
         if os.path.exists(POSTS_FILE):
@@ -72,7 +100,7 @@ class SocialFeedManager:
         with open(LIKES_FILE, 'w', encoding='utf-8') as f:
             json.dump(self.likes, f, ensure_ascii=False, indent=2)
     
-    def create_post(self, user_email: str, content: str, image_data: Optional[str] = None, 
+    def create_post(self, user_email: str, content: str, image_hash: Optional[str] = None, 
                    location: Optional[str] = None, user_avatar: Optional[str] = None,
                    user_fullname: Optional[str] = None) -> Dict:
         """Tạo post mới"""
@@ -84,7 +112,9 @@ class SocialFeedManager:
             "user_avatar": user_avatar,
             "user_fullname": user_fullname,
             "content": content,
-            "image_data": image_data,
+            "image_hash": image_hash,
+            # Frontend dùng image_data làm src của <img>, giờ là URL thay vì base64
+            "image_data": image_url(image_hash) if image_hash else None,
             "location": location,
             "created_at": datetime.now().isoformat(),
             "likes_count": 0,
@@ -96,6 +126,10 @@ class SocialFeedManager:
         
         return post
     
+    def referenced_hashes(self) -> Set[str]:
+        """Hash blob mà ảnh của các post đang dùng (phần mark của blob_gc)"""
+        return {post['image_hash'] for post in list(self.posts.values()) if post.get('image_hash')}
+    
     def get_posts(self, limit: int = 20, offset: int = 0) -> List[Dict]:
         """Lấy danh sách posts (newest first)"""
         posts_list = list(self.posts.values())
@@ -0,0 +1,71 @@
+"""
+Fixture dùng chung: chạy app trong một thư mục tạm (Users.json, Users_album, blobs... được tạo mới,
+không ghi vào dữ liệu thật cạnh code)
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Đổi cwd trước khi test module nào import code backend (pytest_sessionstart): mọi đường dẫn dữ liệu tương đối
+# (Users.json, Users_album...) và các global tạo lúc import (login_manager) đều trỏ vào thư mục tạm
+DATA_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+PREVIOUS_CWD = os.getcwd()
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+# File dữ liệu nằm cạnh code (đường dẫn tuyệt đối theo __file__): trỏ vào thư mục tạm
+os.environ["SOCIAL_POSTS_FILE"] = os.path.join(DATA_DIR, "social_posts.json")
+os.environ["SOCIAL_COMMENTS_FILE"] = os.path.join(DATA_DIR, "social_comments.json")
+os.environ["SOCIAL_LIKES_FILE"] = os.path.join(DATA_DIR, "social_likes.json")
+os.environ["RECOGNITION_JOBS_FILE"] = os.path.join(DATA_DIR, "recognition_jobs.json")
+os.environ["RECOGNITION_CACHE_FILE"] = os.path.join(DATA_DIR, "recognition_cache.json")
+os.environ["GEOCODE_CACHE_FILE"] = os.path.join(DATA_DIR, "geocode_cache.json")
+
+
+def pytest_sessionstart(session):
+    # Sau khi pytest đã tìm testpaths theo cwd gốc, trước khi collect test module
+    os.chdir(DATA_DIR)
+
+
+def pytest_unconfigure(config):
+    os.chdir(PREVIOUS_CWD)
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_blob_store(tmp_path_factory):
+    """Blob store mặc định nằm cạnh code (backend/blobs): test ghi vào thư mục tạm"""
+    from blob_store import blob_store
+    blob_store.root_dir = str(tmp_path_factory.mktemp("blobs"))
+    return blob_store
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """Module main (import trong thư mục tạm DATA_DIR)"""
+    import main
+    yield main
+    # Ghi nốt last_login vào Users.json của thư mục tạm ngay, không chờ tới atexit
+    if main.login_manager:
+        main.login_manager.close()
+
+
+@pytest.fixture(scope="session")
+def client(main_module):
+    from fastapi.testclient import TestClient
+    return TestClient(main_module.app)
+
+
+@pytest.fixture
+def user_email():
+    return "tester@example.com"
+
+
+@pytest.fixture
+def auth_headers(main_module, user_email):
+    token = main_module.create_access_token({"sub": user_email})
+    return {"Authorization": f"Bearer {token}"}
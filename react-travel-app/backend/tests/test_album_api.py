@@ -0,0 +1,19 @@
+"""Endpoint album: tạo album không ghi đè cả shard"""
+
+
+def test_create_album_keeps_existing_items_and_cached_index(main_module, client, auth_headers, user_email):
+    store = main_module.album_store
+    store.add_item(user_email, "Trip", {"id": "a1", "filename": "a.jpg", "uploaded_at": "2024-01-01",
+                                        "landmark": "pending"})
+    index = store.album_index(user_email, "Trip")
+
+    response = client.post("/api/albums", json={"name": "Second"}, headers=auth_headers)
+    assert response.json()["success"] is True
+    assert client.post("/api/albums", json={"name": "Second"}, headers=auth_headers).json() == {
+        "success": False, "message": "Album đã tồn tại"}
+
+    # Kết quả nhận dạng nền ghi sau khi tạo album vẫn còn, index không bị dựng lại
+    store.update_item(user_email, "a1", {"landmark": "Landmark 81"})
+    assert store.album_index(user_email, "Trip") is index
+    assert store.load(user_email)["Trip"][0]["landmark"] == "Landmark 81"
+    assert store.load(user_email)["Second"] == []
@@ -0,0 +1,173 @@
+"""Phân trang AlbumIndex / AlbumStore: cursor phải đúng cả khi index bị dựng lại"""
+from album_index import AlbumIndex, InvalidCursor, assign_sequence, normalize_landmark
+from album_store import AlbumStore
+
+
+def make_items(count):
+    return [{"id": f"id{i}", "filename": f"f{i}.jpg", "uploaded_at": f"2024-01-{i + 1:02d}T00:00:00",
+             "landmark": "Hồ Gươm"} for i in range(count)]
+
+
+def filenames(page):
+    return [image["filename"] for image in page["images"]]
+
+
+def test_position_cursor_survives_delete_and_full_save(tmp_path):
+    store = AlbumStore(str(tmp_path))
+    store.save("u@example.com", {"A": make_items(8)})
+
+    first = store.album_index("u@example.com", "A").page(limit=3)
+    assert filenames(first) == ["f0.jpg", "f1.jpg", "f2.jpg"]
+
+    # Xoá ảnh đã xem rồi ghi lại cả shard: index được dựng lại, slot bị đánh số lại
+    store.remove_item("u@example.com", "A", "f0.jpg")
+    store.save("u@example.com", store.load("u@example.com"))
+
+    second = store.album_index("u@example.com", "A").page(cursor=first["next_cursor"], limit=3)
+    assert filenames(second) == ["f3.jpg", "f4.jpg", "f5.jpg"]
+
+
+def test_position_cursor_survives_reload_from_disk(tmp_path):
+    store = AlbumStore(str(tmp_path))
+    store.save("u@example.com", {"A": make_items(6)})
+    first = store.album_index("u@example.com", "A").page(limit=2, order="desc")
+    assert filenames(first) == ["f5.jpg", "f4.jpg"]
+    store.remove_item("u@example.com", "A", "f5.jpg")
+
+    # Process khác (cache rỗng) đọc lại shard
+    other = AlbumStore(str(tmp_path))
+    second = other.album_index("u@example.com", "A").page(cursor=first["next_cursor"], limit=2, order="desc")
+    assert filenames(second) == ["f3.jpg", "f2.jpg"]
+
+
+def test_new_item_does_not_reuse_seq_of_deleted_cursor_item(tmp_path):
+    store = AlbumStore(str(tmp_path))
+    store.save("u@example.com", {"A": make_items(3)})
+    first = store.album_index("u@example.com", "A").page(limit=2)
+    assert filenames(first) == ["f0.jpg", "f1.jpg"]
+
+    # Item ở cursor và mọi item sau nó bị xoá, rồi có ảnh mới
+    store.remove_item("u@example.com", "A", "f1.jpg")
+    store.remove_item("u@example.com", "A", "f2.jpg")
+    store.add_item("u@example.com", "A", {"id": "new", "filename": "new.jpg", "uploaded_at": "2024-02-01"})
+
+    second = store.album_index("u@example.com", "A").page(cursor=first["next_cursor"], limit=2)
+    assert filenames(second) == ["new.jpg"]
+
+
+def test_full_walk_matches_album_order_for_every_sort():
+    items = make_items(25)
+    assign_sequence(items)
+    index = AlbumIndex(items)
+    for sort in ("position", "uploaded_at", "landmark"):
+        for order in ("asc", "desc"):
+            seen, cursor = [], None
+            while True:
+                page = index.page(sort=sort, order=order, cursor=cursor, limit=4)
+                seen += filenames(page)
+                cursor = page["next_cursor"]
+                if not page["has_more"]:
+                    break
+            expected = [item["filename"] for item in items]
+            assert seen == (expected if order == "asc" else expected[::-1])
+
+
+def test_cursor_for_other_sort_is_rejected():
+    index = AlbumIndex(make_items(5))
+    cursor = index.page(sort="uploaded_at", limit=2)["next_cursor"]
+    try:
+        index.page(sort="position", cursor=cursor)
+    except InvalidCursor:
+        pass
+    else:
+        raise AssertionError("cursor của sort khác phải bị từ chối")
+
+
+LANDMARKS = ["Hồ Gươm", "Chùa Một Cột", "Hồ Tây", "Landmark 81", None]
+
+
+def make_mixed_items(count):
+    return [{"id": f"id{i}", "filename": f"f{i}.jpg", "landmark": LANDMARKS[i % len(LANDMARKS)],
+             "uploaded_at": f"2024-01-{i // 3 + 1:02d}T{i % 3:02d}:00:00"} for i in range(count)]
+
+
+def filtered(items, landmark=None, date_from=None, date_to=None):
+    """Lọc tuần tự: địa danh chứa chuỗi tìm (bỏ dấu), ngày trong [date_from, date_to]"""
+    result = []
+    for item in items:
+        if landmark and normalize_landmark(landmark) not in normalize_landmark(item.get("landmark")):
+            continue
+        day = item["uploaded_at"][:10]
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        result.append(item["filename"])
+    return result
+
+
+def candidates_for(index, landmark=None, date_from=None, date_to=None):
+    candidates = None
+    if landmark:
+        candidates = index.landmark_positions(landmark)
+    if date_from or date_to:
+        by_date = index.date_positions(date_from, date_to)
+        candidates = by_date if candidates is None else candidates & by_date
+    return candidates
+
+
+def test_landmark_and_date_filters_match_linear_scan():
+    items = make_mixed_items(30)
+    assign_sequence(items)
+    index = AlbumIndex(items)
+    for landmark, date_from, date_to in [("ho", None, None), ("HỒ TÂY", None, None), ("mot cot", "2024-01-03", None),
+                                         (None, "2024-01-02", "2024-01-04"), ("landmark", None, "2024-01-05"),
+                                         ("gươm", "2024-01-05", "2024-01-05"), (None, "2024-02-01", None)]:
+        candidates = candidates_for(index, landmark, date_from, date_to)
+        page = index.page(candidates=candidates)
+        assert filenames(page) == filtered(items, landmark, date_from, date_to), (landmark, date_from, date_to)
+
+
+def test_landmark_search_falls_back_to_fuzzy_match():
+    index = AlbumIndex(make_mixed_items(10))
+    assert index.match_landmarks("Landmak 81") == ["landmark 81"]
+    assert index.match_landmarks("") == []
+    assert index.landmark_positions("Nhà thờ Đức Bà") == set()
+
+
+def test_filtered_cursor_survives_deletions_and_rebuild(tmp_path):
+    store = AlbumStore(str(tmp_path))
+    store.save("u@example.com", {"A": make_mixed_items(30)})
+    query = {"landmark": "ho", "date_from": "2024-01-02"}
+
+    for sort in ("position", "uploaded_at"):
+        index = store.album_index("u@example.com", "A")
+        expected = filtered(index.items(), **query)
+        first = index.page(sort=sort, limit=3, candidates=candidates_for(index, **query))
+        assert filenames(first) == expected[:3]
+
+        # Xoá một ảnh đã xem và một ảnh chưa xem, rồi ghi lại cả shard (index dựng lại)
+        store.remove_item("u@example.com", "A", expected[0])
+        store.remove_item("u@example.com", "A", expected[4])
+        store.save("u@example.com", store.load("u@example.com"))
+
+        index = store.album_index("u@example.com", "A")
+        seen, cursor = [], first["next_cursor"]
+        while cursor:
+            page = index.page(sort=sort, cursor=cursor, limit=3, candidates=candidates_for(index, **query))
+            seen += filenames(page)
+            cursor = page["next_cursor"]
+        assert seen == [name for name in expected[3:] if name != expected[4]]
+
+
+def test_landmark_index_follows_item_updates(tmp_path):
+    store = AlbumStore(str(tmp_path))
+    store.save("u@example.com", {"A": make_mixed_items(5)})
+    index = store.album_index("u@example.com", "A")
+    assert filenames(index.page(candidates=index.landmark_positions("dinh doc lap"))) == []
+
+    store.update_item("u@example.com", "id4", {"landmark": "Dinh Độc Lập"})
+    store.add_item("u@example.com", "A", {"id": "id5", "filename": "f5.jpg", "landmark": "Dinh Độc Lập",
+                                          "uploaded_at": "2024-03-01T00:00:00"})
+    index = store.album_index("u@example.com", "A")
+    assert filenames(index.page(candidates=index.landmark_positions("dinh doc lap"))) == ["f4.jpg", "f5.jpg"]
+    assert filenames(index.page(candidates=index.date_positions("2024-03-01"))) == ["f5.jpg"]
+    assert index.date_bounds() == ("2024-01-01T00:00:00", "2024-03-01T00:00:00")
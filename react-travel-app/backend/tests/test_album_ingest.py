@@ -0,0 +1,84 @@
+"""Pipeline upload: xử lý song song, tiến độ báo ngay, nhưng ảnh vào album đúng thứ tự upload"""
+import asyncio
+import time
+from io import BytesIO
+
+from PIL import Image
+
+import album_ingest
+
+
+class FakeUpload:
+    """Giống UploadFile của FastAPI ở các thuộc tính pipeline dùng"""
+
+    def __init__(self, filename, data, content_type="image/jpeg"):
+        self.filename = filename
+        self.content_type = content_type
+        self._data = data
+
+    async def read(self):
+        return self._data
+
+
+def jpeg(width):
+    buffer = BytesIO()
+    Image.new("RGB", (width, 40), color=(width % 256, 0, 0)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def run_ingest(files, recognize=None):
+    """(kết quả cuối từng file, mọi sự kiện theo thứ tự yield, item đã commit)"""
+    committed = []
+
+    async def collect():
+        return [event async for event in album_ingest.ingest_uploads(
+            files, "A", commit=committed.append, gps_reader=lambda f: None, recognize=recognize)]
+
+    events = asyncio.run(collect())
+    results = [event for event in events if event["stage"] == album_ingest.STAGE_DONE]
+    return results, events, committed
+
+
+def slow_recognize(image):
+    # Ảnh hẹp nhận dạng lâu hơn
+    time.sleep((100 - image.size[0]) / 200)
+    return {"landmark": f"L{image.size[0]}", "description": "", "confidence": "high"}
+
+
+def test_items_committed_in_upload_order_when_later_files_finish_first():
+    # Ảnh đầu tiên nhận dạng lâu nhất: xử lý xong theo thứ tự ngược
+    widths = [60 + 10 * i for i in range(5)]
+    files = [FakeUpload(f"p{i}.jpg", jpeg(width)) for i, width in enumerate(widths)]
+    results, _, committed = run_ingest(files, recognize=slow_recognize)
+
+    assert [item["filename"] for item in committed] == ["p0.jpg", "p1.jpg", "p2.jpg", "p3.jpg", "p4.jpg"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+    assert all(result["success"] for result in results)
+    uploaded = [item["uploaded_at"] for item in committed]
+    assert uploaded == sorted(uploaded)
+
+
+def test_invalid_file_does_not_block_following_files():
+    files = [FakeUpload("bad.jpg", b"not an image"), FakeUpload("notes.txt", b"x", "text/plain"),
+             FakeUpload("ok.jpg", jpeg(50))]
+    results, _, committed = run_ingest(files)
+
+    assert [item["filename"] for item in committed] == ["ok.jpg"]
+    assert sorted((r["filename"], r["success"]) for r in results) == [
+        ("bad.jpg", False), ("notes.txt", False), ("ok.jpg", True)]
+
+
+def test_progress_is_reported_without_waiting_for_earlier_files():
+    files = [FakeUpload("slow.jpg", jpeg(60)), FakeUpload("fast.jpg", jpeg(100)),
+             FakeUpload("bad.jpg", b"not an image")]
+    _, events, committed = run_ingest(files, recognize=slow_recognize)
+    order = [(event["filename"], event["stage"]) for event in events]
+
+    first_done = order.index(("slow.jpg", "done"))
+    # Ảnh sau xong trước: tiến độ và lỗi của nó đến trước khi ảnh đầu commit
+    assert order.index(("fast.jpg", "decoded")) < first_done
+    assert order.index(("fast.jpg", "recognized")) < first_done
+    assert order.index(("bad.jpg", "done")) < first_done
+    # Nhưng kết quả cuối (commit) vẫn theo thứ tự upload
+    assert order.index(("fast.jpg", "done")) > first_done
+    assert [item["filename"] for item in committed] == ["slow.jpg", "fast.jpg"]
@@ -0,0 +1,45 @@
+"""Tải album dạng ZIP stream: file mở được bằng zipfile, ảnh lưu ZIP_STORED, tên trùng được đổi"""
+import zipfile
+from io import BytesIO
+
+from album_manager import iter_zip_chunks
+
+
+def test_download_streams_a_valid_zip(main_module, client, auth_headers, user_email):
+    store, blobs = main_module.album_store, main_module.blob_store
+    photos = {"a.jpg": b"\xff\xd8\xff first photo" * 5000, "b.png": b"\x89PNG\r\n\x1a\n second"}
+    store.add_item(user_email, "Zip", {"id": "z1", "filename": "a.jpg", "image_hash": blobs.put(photos["a.jpg"])})
+    store.add_item(user_email, "Zip", {"id": "z2", "filename": "b.png", "image_hash": blobs.put(photos["b.png"])})
+    store.add_item(user_email, "Zip", {"id": "z3", "filename": "a.jpg", "image_hash": blobs.put(b"\xff\xd8\xff dup")})
+
+    response = client.get("/api/albums/Zip/download", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    assert 'filename="Zip.zip"' in response.headers["content-disposition"]
+
+    with zipfile.ZipFile(BytesIO(response.content)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["a.jpg", "b.png", "a (1).jpg"]
+        assert {info.compress_type for info in archive.infolist()} == {zipfile.ZIP_STORED}
+        assert archive.read("a.jpg") == photos["a.jpg"]
+        assert archive.read("a (1).jpg") == b"\xff\xd8\xff dup"
+
+
+def test_download_empty_album_is_rejected(main_module, client, auth_headers, user_email):
+    main_module.album_store.ensure_album(user_email, "Empty zip")
+    response = client.get("/api/albums/Empty zip/download", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_zip_stream_in_chunks_and_deflates_non_images():
+    entries = [("notes.txt", b"hello " * 50000), ("photo.jpg", b"\xff\xd8\xff" + b"x" * 200000)]
+    chunks = list(iter_zip_chunks(entries))
+    assert len(chunks) > 3 and all(chunks)
+
+    with zipfile.ZipFile(BytesIO(b"".join(chunks))) as archive:
+        types = {info.filename: info.compress_type for info in archive.infolist()}
+        assert types == {"notes.txt": zipfile.ZIP_DEFLATED, "photo.jpg": zipfile.ZIP_STORED}
+        assert archive.read("notes.txt") == b"hello " * 50000
+
+    with zipfile.ZipFile(BytesIO(b"".join(iter_zip_chunks([])))) as archive:
+        assert archive.namelist() == []
@@ -0,0 +1,104 @@
+"""Blob GC: xoá blob + derivative không còn được tham chiếu, giữ blob dùng chung và blob vừa put"""
+import os
+
+import pytest
+
+from blob_gc import BlobCollector
+from blob_store import BlobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"))
+
+
+def put_with_thumb(store, data):
+    blob_hash = store.put(data)
+    with open(f"{store.path(blob_hash)}.thumb.webp", "wb") as f:
+        f.write(b"thumb")
+    return blob_hash
+
+
+def age(store, blob_hash, seconds):
+    path = store.path(blob_hash)
+    mtime = os.path.getmtime(path) - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_collect_deletes_only_unreferenced_blobs(store):
+    kept = put_with_thumb(store, b"kept")
+    orphan = put_with_thumb(store, b"orphan")
+    references = {kept}
+    collector = BlobCollector(store, [lambda: references], grace_seconds=0)
+
+    assert collector.collect([kept, orphan, None]) == 1
+    assert store.exists(kept) and os.path.exists(f"{store.path(kept)}.thumb.webp")
+    assert not store.exists(orphan)
+    assert os.listdir(os.path.dirname(store.path(orphan))) == []
+
+
+def test_recent_blobs_survive_until_grace_period(store):
+    blob_hash = store.put(b"uploading")
+    collector = BlobCollector(store, [set], grace_seconds=60)
+
+    assert collector.collect() == 0
+    age(store, blob_hash, 120)
+    # Upload lại cùng nội dung làm mới blob: chưa commit item thì vẫn được giữ
+    store.put(b"uploading")
+    assert collector.collect() == 0
+    age(store, blob_hash, 120)
+    assert collector.collect() == 1
+    assert not store.exists(blob_hash)
+
+
+def test_disabled_collector_keeps_everything(store):
+    blob_hash = store.put(b"post image")
+    collector = BlobCollector(store, [set], grace_seconds=0, enabled=False)
+    assert collector.collect() == 0
+    assert store.exists(blob_hash)
+
+
+def test_deleting_album_image_removes_blob_not_shared_copy(main_module, client, auth_headers, user_email,
+                                                           monkeypatch):
+    store = main_module.album_store
+    monkeypatch.setattr(main_module.blob_collector, "grace_seconds", 0)
+    shared = put_with_thumb(main_module.blob_store, b"shared photo")
+    single = put_with_thumb(main_module.blob_store, b"single photo")
+    store.add_item(user_email, "GC", {"id": "gc1", "filename": "shared.jpg", "image_hash": shared})
+    store.add_item(user_email, "GC", {"id": "gc2", "filename": "single.jpg", "image_hash": single})
+    store.add_item("other@example.com", "Copy", {"id": "gc3", "filename": "shared.jpg", "image_hash": shared})
+
+    response = client.delete("/api/albums/GC/images/single.jpg", headers=auth_headers)
+    assert response.json()["success"] is True
+    assert not main_module.blob_store.exists(single)
+    assert not os.path.exists(f"{main_module.blob_store.path(single)}.thumb.webp")
+
+    response = client.delete("/api/albums/GC", headers=auth_headers)
+    assert response.json()["success"] is True
+    # Album của user khác vẫn dùng blob này
+    assert main_module.blob_store.exists(shared)
+
+    store.delete_album("other@example.com", "Copy")
+    main_module.blob_collector.collect([shared])
+    assert not main_module.blob_store.exists(shared)
+
+
+def test_mark_sees_users_created_by_another_process(tmp_path, store):
+    from album_store import AlbumStore
+
+    ours = AlbumStore(str(tmp_path / "albums"))
+    ours.add_item("a@example.com", "A", {"id": "1", "filename": "a.jpg", "image_hash": store.put(b"a")})
+    # Worker khác: thêm user sau khi index của ours đã nạp
+    other = AlbumStore(str(tmp_path / "albums"))
+    other.add_item("b@example.com", "B", {"id": "2", "filename": "b.jpg", "image_hash": store.put(b"b")})
+
+    collector = BlobCollector(store, [ours.referenced_hashes], grace_seconds=0)
+    assert collector.collect() == 0
+    assert "b@example.com" in ours.list_users()
+
+    # Shard có trên đĩa nhưng index.json bị ghi đè mất user
+    os.remove(os.path.join(ours.root_dir, "index.json"))
+    third = AlbumStore(str(tmp_path / "albums"))
+    third.add_item("c@example.com", "C", {"id": "3", "filename": "c.jpg", "image_hash": store.put(b"c")})
+    fresh = AlbumStore(str(tmp_path / "albums"))
+    assert set(fresh.referenced_hashes()) == {store.put(b"a"), store.put(b"b"), store.put(b"c")}
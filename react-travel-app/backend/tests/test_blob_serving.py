@@ -0,0 +1,78 @@
+"""serve_file: 304 theo ETag, 206 cho một khoảng byte, 416 chỉ khi khoảng nằm ngoài file"""
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from blob_serving import serve_file
+
+CONTENT = bytes(range(256)) * 4  # 1024 byte
+ETAG = '"blob-etag"'
+
+
+@pytest.fixture
+def file_client(tmp_path):
+    path = tmp_path / "blob"
+    path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.get("/blob")
+    def get_blob(request: Request):
+        return serve_file(request, str(path), etag="blob-etag", media_type="image/jpeg")
+
+    return TestClient(app)
+
+
+def test_full_response_has_validators(file_client):
+    response = file_client.get("/blob")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == ETAG
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize("if_none_match", [ETAG, f'W/{ETAG}', f'"other", {ETAG}', "*"])
+def test_matching_etag_returns_304(file_client, if_none_match):
+    response = file_client.get("/blob", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_if_modified_since_returns_304(file_client):
+    last_modified = file_client.get("/blob").headers["last-modified"]
+    assert file_client.get("/blob", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=-24", 1000, 1023),
+    ("bytes=1000-5000", 1000, 1023),
+    ("bytes=-5000", 0, 1023),
+])
+def test_single_range_returns_206(file_client, range_header, start, end):
+    response = file_client.get("/blob", headers={"Range": range_header})
+    assert response.status_code == 206
+    assert response.content == CONTENT[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/1024"
+
+
+@pytest.mark.parametrize("range_header", ["bytes=1024-", "bytes=5000-6000", "bytes=-0"])
+def test_unsatisfiable_range_returns_416(file_client, range_header):
+    response = file_client.get("/blob", headers={"Range": range_header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+@pytest.mark.parametrize("range_header", [
+    "bytes=0-9,20-29", "bytes=abc", "bytes=5-1", "items=0-9", "bytes=", "bytes=-", "bytes=--5",
+])
+def test_multi_or_malformed_range_is_ignored(file_client, range_header):
+    response = file_client.get("/blob", headers={"Range": range_header})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_stale_if_range_returns_full_file(file_client):
+    response = file_client.get("/blob", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
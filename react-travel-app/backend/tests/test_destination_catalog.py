@@ -0,0 +1,65 @@
+"""Destination catalog: dựng một lần, dùng chung giữa các request, dựng lại khi database.json đổi"""
+import json
+import os
+
+import pytest
+
+import ai_recommend
+from districts import DISTRICTS_FILE
+from reloadable import ReloadableFile
+
+
+def write_database(path, destinations):
+    path.write_text(json.dumps(destinations, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = tmp_path / "database.json"
+    write_database(path, [
+        {"name": "Chợ Bến Thành", "tags": ["Mua sắm", "ẩm thực"], "rating": 4.6, "lat": 10.772, "lon": 106.698},
+        {"name": "Thảo Cầm Viên", "tags": ["vui chơi", "gia đình"], "rating": 4.3, "lat": 10.787, "lon": 106.705},
+    ])
+    reloadable = ReloadableFile(str(path), ai_recommend._build_catalog, extra_paths=[DISTRICTS_FILE])
+    monkeypatch.setattr(ai_recommend, "_catalog", reloadable)
+    return path
+
+
+def test_catalog_is_built_once(database):
+    first = ai_recommend.loadDestination()
+    assert ai_recommend.loadDestination() is first
+    assert ai_recommend.get_destination_catalog() is ai_recommend.get_destination_catalog()
+    assert [d["name"] for d in first] == ["Chợ Bến Thành", "Thảo Cầm Viên"]
+    assert first[0]["tags"] == ["mua sắm", "ẩm thực"]
+    assert first[0]["search_words"] >= {"cho", "ben", "thanh", "mua", "sam"}
+
+
+def test_catalog_precomputes_views(database):
+    catalog = ai_recommend.get_destination_catalog()
+    assert [d["name"] for d in catalog.by_rating] == ["Chợ Bến Thành", "Thảo Cầm Viên"]
+    assert [d["name"] for d in catalog.high_rated] == ["Chợ Bến Thành"]
+
+    body = json.loads(catalog.destinations_json)
+    assert body["success"] is True
+    assert [d["name"] for d in body["destinations"]] == ["Chợ Bến Thành", "Thảo Cầm Viên"]
+    assert body["destinations"][0]["search_words"] == sorted(catalog.destinations[0]["search_words"])
+    assert [d["name"] for d in json.loads(catalog.popular_json)["destinations"]] == ["Chợ Bến Thành", "Thảo Cầm Viên"]
+
+
+def test_catalog_reloads_when_file_changes(database):
+    first = ai_recommend.get_destination_catalog()
+
+    stat = os.stat(database)
+    write_database(database, [{"name": "Cầu Rồng", "tags": ["check-in"], "rating": 4.9}])
+    os.utime(database, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    second = ai_recommend.get_destination_catalog()
+    assert second is not first
+    assert [d["name"] for d in ai_recommend.loadDestination()] == ["Cầu Rồng"]
+    assert second.high_rated == second.destinations
+
+
+def test_destinations_endpoint_serves_catalog_body(client, database):
+    response = client.get("/api/destinations")
+    assert response.status_code == 200
+    assert response.content == ai_recommend.get_destination_catalog().destinations_json
@@ -0,0 +1,75 @@
+"""Destination index: inverted index + prefix match xếp hạng giống compatibality_rate trên các từ khớp chính xác"""
+import json
+import random
+
+import pytest
+
+from ai_recommend import DATABASE_FILE, _prepare_destination, compatibality_rate
+from destination_index import DestinationIndex, normalize_text
+
+WORDS = ["chợ", "bến", "thành", "bảo", "tàng", "công", "viên", "nhà", "thờ", "phố", "đi", "bộ",
+         "quán", "cà", "phê", "sông", "cầu", "chùa", "tháp", "biển"]
+TAGS = ["mua sắm", "cà phê", "ẩm thực", "vui chơi", "lịch sử", "văn hoá", "thiên nhiên", "chợ đêm",
+        "đường phố", "kiến trúc", "gia đình", "check-in"]
+QUERIES = ["mua sắm", "cà phê", "bảo tàng lịch sử", "vui chơi", "chợ đêm", "Ẩm Thực đường phố",
+           "bao", "cong vien", "nha tho", "ch", "khong co gi", "", "   "]
+
+
+def linear_recommend(preference, destinations, limit=5):
+    """recommend() trước khi có index"""
+    results = []
+    for dest in destinations:
+        score = compatibality_rate(preference.lower(), dest)
+        if score > 0:
+            results.append((dest, score))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return [d[0] for d in results[:limit]]
+
+
+def matches_by_prefix(preference, dest):
+    words = normalize_text(preference).split()
+    return all(any(token.startswith(word) for token in dest["search_words"]) for word in words)
+
+
+@pytest.fixture(scope="module")
+def sample():
+    rng = random.Random(42)
+    raw = [{"name": " ".join(rng.sample(WORDS, 3)) + f" {i}", "tags": rng.sample(TAGS, 3)} for i in range(500)]
+    with open(DATABASE_FILE, "r", encoding="utf-8") as f:
+        raw += json.load(f)
+    return [_prepare_destination(d) for d in raw]
+
+
+@pytest.mark.parametrize("limit", [1, 5, 20])
+def test_exact_matches_rank_like_linear_scan(sample, limit):
+    index = DestinationIndex(sample)
+    for query in QUERIES:
+        expected = linear_recommend(query, sample, limit)
+        results = index.search(query, limit)
+        # Khớp chính xác đứng trước, đúng thứ tự như quét tuần tự
+        assert results[:len(expected)] == expected, query
+        # Phần còn lại (nếu có) chỉ là các địa điểm khớp theo prefix
+        for dest in results[len(expected):]:
+            assert compatibality_rate(query, dest) == 0
+            assert matches_by_prefix(query, dest), query
+
+
+def test_index_finds_every_prefix_match(sample):
+    index = DestinationIndex(sample)
+    for query in ["bao", "ch", "cong vi", "thao cam"]:
+        expected = [d for d in sample if matches_by_prefix(query, d)]
+        results = index.search(query, limit=len(sample))
+        assert {id(d) for d in results} == {id(d) for d in expected}, query
+
+
+def test_prefix_match_ranks_below_exact_match():
+    destinations = [_prepare_destination(d) for d in [
+        {"name": "Cầu Bentre", "tags": []},
+        {"name": "Bến Nhà Rồng", "tags": []},
+        {"name": "Chợ Bến Thành", "tags": ["mua sắm"]},
+    ]]
+    index = DestinationIndex(destinations)
+    assert [d["name"] for d in index.search("ben")] == ["Bến Nhà Rồng", "Chợ Bến Thành", "Cầu Bentre"]
+    assert [d["name"] for d in index.search("ben mua")] == ["Chợ Bến Thành"]
+    assert index.search("ben", limit=0) == []
+    assert index.search("xyz") == []
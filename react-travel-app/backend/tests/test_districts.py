@@ -0,0 +1,92 @@
+"""District table: gán quận gần nhất theo lô cho mọi địa điểm, giống cách tra tuần tự cũ"""
+import json
+import math
+import os
+import random
+
+import pytest
+
+import ai_recommend
+from districts import (DISTRICTS_FILE, MAX_DISTRICT_DISTANCE_KM, DistrictTable, _build_table,
+                       find_district, get_district_table)
+from reloadable import ReloadableFile
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
+    return R * 2 * math.asin(math.sqrt(a))
+
+
+def linear_district(districts, lat, lon):
+    """Cách tra cũ: quét mọi quận, lấy tâm gần nhất"""
+    if not (lat and lon) or not districts:
+        return None
+    best, best_distance = None, None
+    for district in districts:
+        distance = scalar_haversine(lat, lon, district['lat'], district['lon'])
+        if best_distance is None or distance < best_distance:
+            best, best_distance = district, distance
+    return best['district'] if best_distance <= MAX_DISTRICT_DISTANCE_KM else None
+
+
+@pytest.fixture(scope="module")
+def table():
+    return _build_table(DISTRICTS_FILE)
+
+
+@pytest.fixture(scope="module")
+def destinations():
+    with open(ai_recommend.DATABASE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_every_destination_gets_linear_scan_district(table, destinations):
+    points = [(d.get("lat"), d.get("lon")) for d in destinations]
+    codes = table.assign(points)
+    assert len(codes) == len(destinations)
+    assert all(codes)
+    assert codes == [linear_district(table.districts, lat, lon) for lat, lon in points]
+
+
+def test_assign_matches_linear_scan_on_random_points(table):
+    rng = random.Random(13)
+    points = [(rng.uniform(10.3, 11.3), rng.uniform(106.2, 107.2)) for _ in range(500)]
+    points += [(None, None), (10.77, None), (21.0285, 105.8542)]
+    codes = table.assign(points)
+    assert codes == [linear_district(table.districts, lat, lon) for lat, lon in points]
+    assert codes[-1] is None  # Hà Nội: ngoài khu vực
+    for (lat, lon), code in zip(points, codes):
+        match = table.nearest(lat, lon) if lat and lon else None
+        assert (match[0]['district'] if match else None) == code
+
+
+def test_catalog_tags_destinations_with_districts(destinations):
+    catalog = ai_recommend.get_destination_catalog()
+    assert [d["district"] for d in catalog.destinations] == get_district_table().assign(
+        (d.get("lat"), d.get("lon")) for d in destinations)
+    assert sum(len(items) for items in catalog.by_district.values()) == len(catalog.destinations)
+    assert find_district(destinations[0]["lat"], destinations[0]["lon"]) == catalog.destinations[0]["district"]
+    assert find_district(None, None) is None
+
+
+def test_empty_table():
+    table = DistrictTable([])
+    assert table.nearest(10.77, 106.70) is None
+    assert table.assign([(10.77, 106.70)]) == [None]
+
+
+def test_table_reloads_when_csv_changes(tmp_path):
+    path = tmp_path / "districts.csv"
+    path.write_text("district,name,lat,lon\nQuận 1,Quận 1,10.7769,106.7009\n", encoding="utf-8")
+    reloadable = ReloadableFile(str(path), _build_table)
+    assert reloadable.get().codes == ["Quận 1"]
+
+    stat = os.stat(path)
+    path.write_text("district,name,lat,lon\nQuận 1,Quận 1,10.7769,106.7009\nQuận 7,Quận 7,10.7340,106.7218\n"
+                    "Lỗi,Lỗi,abc,106\n", encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert reloadable.get().codes == ["Quận 1", "Quận 7"]
+    assert reloadable.get().nearest(10.735, 106.72)[0]["district"] == "Quận 7"
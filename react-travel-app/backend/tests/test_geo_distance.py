@@ -0,0 +1,76 @@
+"""Geo distance: haversine theo lô bằng NumPy cho kết quả giống công thức vô hướng cũ"""
+import math
+import random
+
+import numpy as np
+import pytest
+
+from geo_distance import CoordinateArray, haversine_km
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    """Phiên bản cũ trong main.py"""
+    R = 6371.0
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    return R * c
+
+
+@pytest.fixture(scope="module")
+def coordinates():
+    rng = random.Random(12)
+    lats = [rng.uniform(-89.9, 89.9) for _ in range(400)] + [10.7769, 10.7769, 90.0, -90.0, 0.0]
+    lons = [rng.uniform(-180, 180) for _ in range(400)] + [106.7009, 106.7009, 0.0, 0.0, 180.0]
+    return lats, lons
+
+
+QUERIES = [(10.7769, 106.7009), (21.0285, 105.8542), (0.0, -180.0), (89.5, 45.0), (-33.9, 18.4)]
+
+
+def test_haversine_km_matches_scalar_on_pairs(coordinates):
+    lats, lons = coordinates
+    for lat, lon in QUERIES:
+        for other_lat, other_lon in zip(lats, lons):
+            assert float(haversine_km(lat, lon, other_lat, other_lon)) == pytest.approx(
+                scalar_haversine(lat, lon, other_lat, other_lon), rel=1e-9, abs=1e-9)
+
+
+def test_haversine_km_broadcasts(coordinates):
+    lats, lons = np.array(coordinates[0]), np.array(coordinates[1])
+    lat, lon = QUERIES[0]
+    expected = [scalar_haversine(lat, lon, a, b) for a, b in zip(lats, lons)]
+    assert haversine_km(lat, lon, lats, lons) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+    assert haversine_km(lats, lons, lat, lon) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+
+def test_coordinate_array_matches_scalar(coordinates):
+    lats, lons = coordinates
+    array = CoordinateArray(lats, lons)
+    assert len(array) == len(lats)
+    rows = np.array([0, 5, 400, 404])
+    for lat, lon in QUERIES:
+        expected = [scalar_haversine(lat, lon, a, b) for a, b in zip(lats, lons)]
+        assert array.distances_from(lat, lon) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+        assert array.distances_from(lat, lon, rows) == pytest.approx([expected[r] for r in rows], rel=1e-9, abs=1e-9)
+
+    matrix = array.distance_matrix([q[0] for q in QUERIES], [q[1] for q in QUERIES])
+    assert matrix.shape == (len(QUERIES), len(lats))
+    for i, (lat, lon) in enumerate(QUERIES):
+        assert matrix[i] == pytest.approx(array.distances_from(lat, lon))
+
+
+def test_coordinate_array_nearest(coordinates):
+    lats, lons = coordinates
+    array = CoordinateArray.from_points(zip(lats, lons))
+    rows, distances = array.nearest([q[0] for q in QUERIES], [q[1] for q in QUERIES])
+    for (lat, lon), row, distance in zip(QUERIES, rows, distances):
+        scalar = [scalar_haversine(lat, lon, a, b) for a, b in zip(lats, lons)]
+        assert distance == pytest.approx(min(scalar), abs=1e-9)
+        assert scalar[row] == pytest.approx(min(scalar), abs=1e-9)
+    # Điểm trùng nhau: khoảng cách 0, chọn dòng đầu tiên
+    assert rows[0] == 400 and distances[0] == 0.0
+
+    with pytest.raises(ValueError):
+        CoordinateArray([], []).nearest([10.0], [106.0])
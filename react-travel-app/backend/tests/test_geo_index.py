@@ -0,0 +1,79 @@
+"""Geo index: truy vấn bán kính / k điểm gần nhất qua lưới ô trả về giống hệt quét toàn bộ bằng haversine"""
+import random
+
+import pytest
+
+from geo_distance import haversine_km
+from geo_index import GeoIndex
+
+
+def brute_within(points, lat, lon, radius_km):
+    found = [(position, float(haversine_km(lat, lon, p_lat, p_lon)))
+             for position, (p_lat, p_lon) in enumerate(points) if p_lat and p_lon]
+    return sorted([item for item in found if item[1] <= radius_km], key=lambda item: (item[1], item[0]))
+
+
+def random_points(rng, n, lat_range, lon_range):
+    return [(rng.uniform(*lat_range), rng.uniform(*lon_range)) for _ in range(n)]
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = random.Random(11)
+    points = random_points(rng, 1500, (8.5, 23.4), (102.1, 109.5))      # Việt Nam
+    points += random_points(rng, 100, (10.7, 10.9), (106.6, 106.8))     # dày đặc quanh TP.HCM
+    points += random_points(rng, 50, (-20, 20), (178.5, 180))           # hai bên kinh tuyến 180
+    points += random_points(rng, 50, (-20, 20), (-180, -178.5))
+    points += random_points(rng, 30, (85, 89.9), (-180, 180))           # gần cực
+    points += [(None, None), (0, 106.7), (10.5, None)]                  # thiếu toạ độ bị bỏ qua
+    return points
+
+
+QUERIES = [
+    (10.7769, 106.7009, 0.5), (10.7769, 106.7009, 5), (10.7769, 106.7009, 50),
+    (21.0285, 105.8542, 120), (16.0544, 108.2022, 800), (15.0, 106.0, 3000),
+    (0.0, 179.9, 400), (0.0, -179.9, 400), (88.0, 0.0, 300), (10.0, 106.0, 25000),
+    (-45.0, -60.0, 100), (10.0, 106.0, 0),
+]
+
+
+def test_within_matches_brute_force(points):
+    index = GeoIndex(points)
+    assert len(index) == sum(1 for lat, lon in points if lat and lon)
+    for lat, lon, radius in QUERIES:
+        expected = brute_within(points, lat, lon, radius)
+        found = index.within(lat, lon, radius)
+        assert [position for position, _ in found] == [position for position, _ in expected], (lat, lon, radius)
+        assert [d for _, d in found] == pytest.approx([d for _, d in expected])
+
+
+@pytest.mark.parametrize("cell_degrees", [0.05, 0.1, 1.0])
+def test_within_is_independent_of_cell_size(points, cell_degrees):
+    reference = GeoIndex(points)
+    index = GeoIndex(points, cell_degrees=cell_degrees)
+    for lat, lon, radius in QUERIES:
+        assert index.within(lat, lon, radius) == reference.within(lat, lon, radius)
+
+
+def test_nearest_matches_brute_force(points):
+    index = GeoIndex(points)
+    for lat, lon, _ in QUERIES:
+        for k in (1, 5, 40):
+            expected = brute_within(points, lat, lon, float("inf"))[:k]
+            assert [position for position, _ in index.nearest(lat, lon, k)] == [position for position, _ in expected]
+
+
+def test_nearest_respects_max_radius(points):
+    index = GeoIndex(points)
+    found = index.nearest(-45.0, -60.0, 5, max_radius_km=1000)
+    assert found == []
+    found = index.nearest(10.7769, 106.7009, 500, max_radius_km=20)
+    assert found == brute_within(points, 10.7769, 106.7009, 20)[:500]
+    assert index.nearest(10.7769, 106.7009, 0) == []
+
+
+def test_empty_index():
+    index = GeoIndex([(None, None)])
+    assert len(index) == 0
+    assert index.within(10.0, 106.0, 100) == []
+    assert index.nearest(10.0, 106.0, 3) == []
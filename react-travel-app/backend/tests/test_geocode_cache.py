@@ -0,0 +1,49 @@
+"""Geocode cache: lỗi mạng chỉ được nhớ trong thời gian ngắn, "không tìm thấy" được nhớ lâu"""
+import geocode_cache
+from geocode_cache import CachedGeocoder, GeocodeCache
+
+
+class FlakyNominatim:
+    def __init__(self):
+        self.calls = 0
+        self.fail = True
+
+    def __call__(self, method, *args, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise TimeoutError("Nominatim unavailable")
+        return None
+
+
+def make_geocoder(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(geocode_cache.time, "time", lambda: clock[0])
+    cache = GeocodeCache(str(tmp_path / "geocode.json"), negative_ttl=24 * 3600, save_interval=1e9)
+    geocoder = CachedGeocoder(cache, error_ttl=60)
+    nominatim = FlakyNominatim()
+    monkeypatch.setattr(geocoder, "_nominatim", nominatim)
+    return geocoder, nominatim
+
+
+def test_network_error_is_retried_after_error_ttl(tmp_path, monkeypatch):
+    clock = [1000.0]
+    geocoder, nominatim = make_geocoder(tmp_path, monkeypatch, clock)
+
+    assert geocoder.geocode("Nơi không có trong gazetteer") is None
+    assert geocoder.geocode("Nơi không có trong gazetteer") is None
+    assert nominatim.calls == 1
+
+    clock[0] += 61
+    nominatim.fail = False
+    geocoder.geocode("Nơi không có trong gazetteer")
+    assert nominatim.calls == 2
+
+
+def test_not_found_uses_negative_ttl(tmp_path, monkeypatch):
+    clock = [1000.0]
+    geocoder, nominatim = make_geocoder(tmp_path, monkeypatch, clock)
+    nominatim.fail = False
+
+    geocoder.geocode("Nơi không có trong gazetteer")
+    clock[0] += 3600
+    geocoder.geocode("Nơi không có trong gazetteer")
+    assert nominatim.calls == 1
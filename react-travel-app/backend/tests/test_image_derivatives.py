@@ -0,0 +1,57 @@
+"""Derivative: xoay theo EXIF, không giữ file blob mở, không để lại lock khi tạo lỗi"""
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from blob_store import BlobStore
+from image_derivatives import DerivativeStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DerivativeStore(BlobStore(str(tmp_path / "blobs")), sizes={"thumb": 64})
+
+
+def jpeg_bytes(size=(200, 100), orientation=None):
+    image = Image.new("RGB", size, "red")
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def open_paths():
+    fd_dir = "/proc/self/fd"
+    paths = []
+    for fd in os.listdir(fd_dir):
+        try:
+            paths.append(os.readlink(os.path.join(fd_dir, fd)))
+        except OSError:
+            pass
+    return paths
+
+
+def test_thumbnail_is_rotated_by_exif(store):
+    blob_hash = store.store.put(jpeg_bytes(orientation=6))
+    with Image.open(BytesIO(store.get(blob_hash, "thumb"))) as thumb:
+        assert thumb.size == (32, 64)
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="cần /proc để liệt kê file đang mở")
+def test_source_file_is_closed_after_generation(store):
+    blob_hash = store.store.put(jpeg_bytes())
+    store.get_path(blob_hash, "thumb")
+    assert store.store.path(blob_hash) not in open_paths()
+
+
+def test_failed_generation_does_not_leak_pending_lock(store):
+    blob_hash = store.store.put(b"not an image")
+    for _ in range(2):
+        with pytest.raises(Exception):
+            store.get_path(blob_hash, "thumb")
+    assert store._pending == {}
+    assert not store.exists(blob_hash, "thumb")
@@ -0,0 +1,105 @@
+"""Landmark catalog: index n-gram trả về đúng kết quả như quét tuần tự cũ; ReloadableFile dựng lại khi file đổi"""
+import json
+import os
+import random
+
+import pytest
+
+from landmark_catalog import DATABASE_FILE, LandmarkCatalog, _build_catalog, normalize_name
+from reloadable import ReloadableFile
+
+
+def linear_find(data, landmark_name):
+    """Cách tra cũ: exact match, rồi key đầu tiên chứa/nằm trong tên tìm"""
+    landmarks = {}
+    for item in data:
+        name = item.get("name", "")
+        landmarks[normalize_name(name)] = name
+    normalized = normalize_name(landmark_name)
+    if normalized in landmarks:
+        return landmarks[normalized]
+    for key, name in landmarks.items():
+        if normalized in key or key in normalized:
+            return name
+    return None
+
+
+@pytest.fixture(scope="module")
+def database():
+    with open(DATABASE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sample_queries(data, seed=0):
+    rng = random.Random(seed)
+    names = [item["name"] for item in data if item.get("name")]
+    queries = ["", "Không có ở đây", "zzz"]
+    for name in names:
+        queries += [name, name.upper(), normalize_name(name), f"{name} - Việt Nam", f"Khu du lịch {name}"]
+        for _ in range(5):
+            start = rng.randrange(len(name))
+            queries.append(name[start:start + rng.randint(1, 8)])
+    return queries
+
+
+def test_catalog_matches_linear_scan(database):
+    catalog = LandmarkCatalog(database)
+    for query in sample_queries(database):
+        expected = linear_find(database, query)
+        if expected is None:
+            continue  # quét cũ không tìm thấy; catalog có thể rơi xuống fuzzy match
+        assert catalog.find(query)["name"] == expected, query
+
+
+def test_partial_match_prefers_earliest_key():
+    data = [{"name": "Hồ Tây"}, {"name": "Hồ Tây Hà Nội"}, {"name": "Chợ Hồ Tây"}]
+    catalog = LandmarkCatalog(data)
+    for query in ["tay", "Hồ", "Ho Tay Ha", "Hồ Tây Hà Nội mùa thu", "cho ho"]:
+        assert catalog.find(query)["name"] == linear_find(data, query)
+
+
+def test_fuzzy_match_only_when_scan_misses():
+    catalog = LandmarkCatalog([{"name": "Nhà thờ Đức Bà"}, {"name": "Bưu điện Thành phố"}])
+    assert catalog.find("nha tho duc ba sai gon")["name"] == "Nhà thờ Đức Bà"
+    assert catalog.find("Nha tho Duc Baa")["name"] == "Nhà thờ Đức Bà"
+    assert catalog.find("Landmark 81") is None
+
+
+def test_reloadable_file_rebuilds_only_on_change(tmp_path):
+    path = tmp_path / "database.json"
+    path.write_text(json.dumps([{"name": "Hồ Gươm"}]), encoding="utf-8")
+    builds = []
+
+    def builder(p):
+        builds.append(p)
+        return _build_catalog(p)
+
+    reloadable = ReloadableFile(str(path), builder)
+    first = reloadable.get()
+    assert reloadable.get() is first
+    assert len(builds) == 1
+    assert first.find("Hồ Gươm")["name"] == "Hồ Gươm"
+
+    stat = os.stat(path)
+    path.write_text(json.dumps([{"name": "Cầu Rồng"}]), encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    second = reloadable.get()
+    assert len(builds) == 2
+    assert second is not first
+    assert second.find("Cầu Rồng")["name"] == "Cầu Rồng"
+    # Snapshot cũ vẫn dùng được
+    assert first.find("Hồ Gươm")["name"] == "Hồ Gươm"
+
+
+def test_reloadable_file_watches_extra_paths(tmp_path):
+    path = tmp_path / "main.json"
+    extra = tmp_path / "extra.json"
+    path.write_text("[]", encoding="utf-8")
+    builds = []
+    reloadable = ReloadableFile(str(path), lambda p: builds.append(p) or len(builds), extra_paths=[str(extra)])
+
+    assert reloadable.get() == 1
+    assert reloadable.get() == 1
+    extra.write_text("{}", encoding="utf-8")
+    assert reloadable.get() == 2
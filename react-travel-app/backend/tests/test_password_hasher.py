@@ -0,0 +1,57 @@
+"""Mật khẩu: scrypt có salt, hash SHA-256 cũ được nâng cấp ở lần đăng nhập thành công"""
+import hashlib
+import json
+
+import pytest
+
+from concurrent_login import ConcurrentLoginManager
+from password_hasher import PasswordHasher
+
+
+def legacy_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def test_verify_reports_rehash_for_legacy_and_old_parameters():
+    hasher = PasswordHasher(n=2 ** 10, workers=1)
+    assert hasher.verify("secret1", legacy_hash("secret1")) == (True, True)
+    assert hasher.verify("wrong", legacy_hash("secret1")) == (False, False)
+
+    stored = hasher.hash("secret1")
+    assert stored.startswith("scrypt$1024$") and stored != hasher.hash("secret1")
+    assert hasher.verify("secret1", stored) == (True, False)
+    assert hasher.verify("wrong", stored) == (False, False)
+    assert PasswordHasher(n=2 ** 11, workers=1).verify("secret1", stored) == (True, True)
+    assert hasher.verify("secret1", "scrypt$broken") == (False, False)
+
+
+@pytest.fixture
+def users_file(tmp_path):
+    path = tmp_path / "Users.json"
+    path.write_text(json.dumps({"users": [{
+        "name": "Legacy", "username": "legacy", "email": "legacy@example.com",
+        "password": legacy_hash("secret1"), "last_login": None, "status": "active"
+    }]}), encoding="utf-8")
+    return path
+
+
+def stored_password(users_file):
+    return json.loads(users_file.read_text(encoding="utf-8"))["users"][0]["password"]
+
+
+def test_login_upgrades_legacy_sha256_hash(users_file):
+    manager = ConcurrentLoginManager(str(users_file))
+
+    assert manager.login_user("legacy@example.com", "wrong")[0] is False
+    assert stored_password(users_file) == legacy_hash("secret1")
+
+    success, _, user = manager.login_user("legacy@example.com", "secret1")
+    assert success and user["email"] == "legacy@example.com"
+    upgraded = stored_password(users_file)
+    assert upgraded.startswith("scrypt$")
+
+    # Đăng nhập lại bằng hash mới, không băm lại lần nữa
+    manager.logout_user("legacy@example.com")
+    assert manager.login_user("legacy", "secret1")[0] is True
+    assert stored_password(users_file) == upgraded
+    assert manager.login_user("legacy", "wrong")[0] is False
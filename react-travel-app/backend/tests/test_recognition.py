@@ -0,0 +1,75 @@
+"""Nhận dạng nền: đi qua model_client (giới hạn đồng thời + timeout), lỗi tạm thời được raise"""
+import threading
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from ai_client import ModelCallTimeout, ModelClient
+
+
+def test_model_client_call_respects_concurrency_cap():
+    client = ModelClient(max_concurrency=2)
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def slow():
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return "ok"
+
+    threads = [threading.Thread(target=client.call, args=(slow,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert state["peak"] == 2
+    assert client.get_stats()["completed"] == 6
+
+
+def test_model_client_call_times_out():
+    client = ModelClient(max_concurrency=1)
+    with pytest.raises(ModelCallTimeout):
+        client.call(time.sleep, 0.5, timeout=0.05)
+    assert client.get_stats()["timeouts"] == 1
+
+
+@pytest.fixture
+def recognition_job(main_module):
+    buffer = BytesIO()
+    Image.new("RGB", (32, 32), "green").save(buffer, format="JPEG")
+    return {"image_hash": main_module.blob_store.put(buffer.getvalue())}
+
+
+def test_recognition_job_runs_through_model_client(main_module, monkeypatch, recognition_job):
+    monkeypatch.setattr(main_module, "recognize_landmark",
+                        lambda image: {"landmark": "Landmark 81", "description": "", "confidence": "high"})
+    completed = main_module.model_client.get_stats()["completed"]
+
+    assert main_module.run_recognition_job(recognition_job)["landmark"] == "Landmark 81"
+    assert main_module.model_client.get_stats()["completed"] == completed + 1
+
+
+def test_recognition_job_raises_transient_error(main_module, monkeypatch, recognition_job):
+    def unavailable(image):
+        raise ConnectionError("API unavailable")
+
+    monkeypatch.setattr(main_module, "recognize_landmark", unavailable)
+    with pytest.raises(ConnectionError):
+        main_module.run_recognition_job(recognition_job)
+
+
+def test_importing_main_starts_no_workers_and_uses_isolated_files(main_module):
+    import recognize
+    from conftest import DATA_DIR
+
+    assert main_module.recognition_jobs.get_stats()["workers"] == 0
+    for path in (main_module.recognition_jobs.jobs_file, recognize.recognition_cache.cache_file,
+                 recognize.geocoder.cache.cache_file):
+        assert path.startswith(DATA_DIR)
@@ -0,0 +1,94 @@
+"""Recognition cache: tra ảnh gần giống qua band index của dHash, lưu/nạp lại từ file"""
+import random
+
+from PIL import Image, ImageEnhance
+
+from recognition_cache import RecognitionCache, dhash, hamming_distance
+
+
+def flip_bits(value, count, seed=0):
+    bits = random.Random(seed).sample(range(64), count)
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_near_duplicate_within_threshold_hits(tmp_path):
+    cache = RecognitionCache(str(tmp_path / "cache.json"), max_distance=4)
+    base = 0x0123456789ABCDEF
+    cache.put("landmark", base, {"landmark": "Chùa Một Cột"})
+
+    for distance in range(1, 5):
+        near = flip_bits(base, distance, seed=distance)
+        assert cache.get("landmark", near) == {"landmark": "Chùa Một Cột"}
+
+    stats = cache.get_stats()
+    assert stats["near_hits"] == 4
+    assert stats["misses"] == 0
+
+
+def test_hash_beyond_threshold_misses(tmp_path):
+    cache = RecognitionCache(str(tmp_path / "cache.json"), max_distance=4)
+    base = 0x0123456789ABCDEF
+    cache.put("landmark", base, {"landmark": "Chùa Một Cột"})
+
+    far = flip_bits(base, 5, seed=42)
+    assert hamming_distance(base, far) == 5
+    assert cache.get("landmark", far) is None
+    # Cùng hash nhưng khác loại kết quả thì không dùng chung
+    assert cache.get("strict_landmark", base) is None
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_near_lookup_matches_linear_scan(tmp_path):
+    cache = RecognitionCache(str(tmp_path / "cache.json"), max_distance=4)
+    rng = random.Random(7)
+    stored = {}
+    for i in range(200):
+        value = rng.getrandbits(64)
+        stored[value] = i
+        cache.put("landmark", value, i)
+
+    for i in range(300):
+        probe = flip_bits(rng.choice(list(stored)), rng.randint(0, 7), seed=i)
+        matches = [(hamming_distance(probe, h), v) for h, v in stored.items()
+                   if hamming_distance(probe, h) <= 4]
+        if not matches:
+            assert cache.get("landmark", probe) is None
+            continue
+        best = min(distance for distance, _ in matches)
+        assert cache.get("landmark", probe) in {v for distance, v in matches if distance == best}
+
+
+def test_resized_image_hits_same_entry(tmp_path):
+    cache = RecognitionCache(str(tmp_path / "cache.json"), max_distance=4)
+    image = Image.linear_gradient("L").convert("RGB").rotate(30)
+    cache.put("landmark", dhash(image), "Hồ Gươm")
+
+    variant = ImageEnhance.Brightness(image.resize((128, 128))).enhance(1.05)
+    assert cache.get("landmark", dhash(variant)) == "Hồ Gươm"
+
+
+def test_cache_round_trips_through_file(tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    cache = RecognitionCache(cache_file, max_distance=4, save_interval=3600)
+    base = 0xFEDCBA9876543210
+    cache.put("landmark", base, {"landmark": "Dinh Độc Lập", "lat": 10.777})
+    cache.save()
+
+    reloaded = RecognitionCache(cache_file, max_distance=4)
+    assert reloaded.get_stats()["entries"] == 1
+    assert reloaded.get("landmark", base) == {"landmark": "Dinh Độc Lập", "lat": 10.777}
+    # Band index được dựng lại khi nạp, tra gần giống vẫn hoạt động
+    assert reloaded.get("landmark", flip_bits(base, 3)) == {"landmark": "Dinh Độc Lập", "lat": 10.777}
+
+
+def test_expired_entries_are_not_loaded(tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    cache = RecognitionCache(cache_file, ttl=3600)
+    cache.put("landmark", 1, "cũ")
+    cache._entries["landmark:0000000000000001"]["created_at"] -= 7200
+    cache._dirty = True
+    cache.save()
+
+    assert RecognitionCache(cache_file, ttl=3600).get_stats()["entries"] == 0
@@ -0,0 +1,41 @@
+"""Hàng đợi nhận dạng: ghi file job theo lô, item "pending" mất job được tạo lại lúc khởi động"""
+import json
+
+from recognition_jobs import RecognitionJobQueue
+
+
+def test_submits_are_batched_into_one_write(tmp_path):
+    jobs_file = tmp_path / "jobs.json"
+    queue = RecognitionJobQueue(jobs_file=str(jobs_file), workers=1, flush_interval=60)
+
+    for i in range(50):
+        queue.submit(f"item-{i}", "a@example.com", "Trip", "0" * 64)
+    assert not jobs_file.exists()
+
+    queue.stop()
+    writer = queue.get_stats()["writer"]
+    assert (writer["flushes"], writer["flushed_keys"]) == (1, 50)
+    jobs = json.loads(jobs_file.read_text(encoding="utf-8"))["jobs"]
+    assert len(jobs) == 50
+
+    # Restart: job chưa chạy được nạp lại
+    assert RecognitionJobQueue(jobs_file=str(jobs_file), workers=1).get("item-7")["status"] == "queued"
+
+
+def test_pending_items_without_job_are_resubmitted(main_module, monkeypatch, tmp_path):
+    queue = RecognitionJobQueue(jobs_file=str(tmp_path / "jobs.json"), workers=1, flush_interval=60)
+    monkeypatch.setattr(main_module, "recognition_jobs", queue)
+    store = main_module.album_store
+    user = "pending@example.com"
+    store.add_item(user, "Trip", {"id": "p1", "filename": "a.jpg", "landmark": "pending", "image_hash": "1" * 64})
+    store.add_item(user, "Trip", {"id": "p2", "filename": "b.jpg", "landmark": "pending", "image_hash": "2" * 64})
+    store.add_item(user, "Trip", {"id": "p3", "filename": "c.jpg", "landmark": "pending"})
+    store.add_item(user, "Trip", {"id": "p4", "filename": "d.jpg", "landmark": "Landmark 81", "image_hash": "4" * 64})
+    queue.submit("p2", user, "Trip", "2" * 64)
+
+    assert main_module.resubmit_pending_recognitions() == 1
+    assert queue.get("p1")["image_hash"] == "1" * 64
+    assert queue.get("p4") is None
+    items = {item["id"]: item for item in store.load(user)["Trip"]}
+    assert items["p3"]["landmark"] == "Không rõ địa danh"
+    queue.stop()
@@ -0,0 +1,172 @@
+"""Session store: idle/absolute timeout, loại session cũ nhất, backend SQLite dùng chung"""
+import pytest
+
+import session_store
+from session_store import MemorySessionBackend, SQLiteSessionBackend, SessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteSessionBackend(idle_timeout=10, absolute_timeout=100, db_file=str(tmp_path / "s.db"))
+        yield backend
+        backend.close()
+    else:
+        yield MemorySessionBackend(idle_timeout=10, absolute_timeout=100)
+
+
+def test_idle_and_absolute_timeout(backend):
+    backend.put("a", {"n": 1}, now=0, max_sessions=10)
+    backend.put("b", {"n": 2}, now=0, max_sessions=10)
+    for now in range(5, 96, 5):
+        backend.touch("a", now)
+
+    # b không hoạt động quá 10 giây, a vẫn còn tới khi đủ 100 giây kể từ lúc đăng nhập
+    assert backend.keys(95) == ["a"]
+    assert backend.get("a", 95)["n"] == 1
+    assert backend.keys(100) == []
+    assert backend.touch("a", 100) is False
+
+
+def test_full_store_evicts_earliest_login(backend):
+    for i, key in enumerate(["a", "b", "c"]):
+        backend.put(key, {}, now=i, max_sessions=3)
+    backend.touch("a", 3)
+
+    assert backend.put("d", {}, now=4, max_sessions=3) == ["a"]
+    # Đăng nhập lại: thay session cũ, không loại ai
+    assert backend.put("c", {}, now=5, max_sessions=3) == []
+    assert sorted(backend.keys(5)) == ["b", "c", "d"]
+
+
+def test_sqlite_sessions_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first = SQLiteSessionBackend(60, 600, db_file=path)
+    second = SQLiteSessionBackend(60, 600, db_file=path)
+    first.put("user@example.com", {"name": "U"}, now=0, max_sessions=10)
+
+    assert second.get("user@example.com", 1)["name"] == "U"
+    assert second.delete("user@example.com") is True
+    assert first.count(2) == 0
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def test_touch_is_rate_limited(monkeypatch):
+    clock = FakeClock(1000.0)
+    monkeypatch.setattr(session_store, "time", clock)
+    store = SessionStore(MemorySessionBackend(idle_timeout=30, absolute_timeout=3600), touch_interval=10)
+    store.create("a", {}, max_sessions=5)
+
+    clock.now += 5
+    assert store.touch("a") is True
+    clock.now += 10
+    assert store.touch("a") is True
+    assert store.touch("missing") is False
+    stats = store.get_stats()
+    assert (stats["touches"], stats["touches_skipped"]) == (2, 1)
+    store.stop()
+
+
+def test_authenticated_requests_keep_session_alive(main_module, client, monkeypatch):
+    import time
+    clock = FakeClock(time.time())
+    monkeypatch.setattr(session_store, "time", clock)
+    sessions = SessionStore(MemorySessionBackend(idle_timeout=30 * 60, absolute_timeout=24 * 3600))
+    monkeypatch.setattr(main_module.login_manager, "_sessions", sessions)
+
+    credentials = {"fullname": "Active", "email": "active@example.com", "password": "secret1"}
+    client.post("/api/register", json=credentials)
+    token = client.post("/api/login", json={"email": "active@example.com", "password": "secret1"}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for _ in range(3):
+        clock.now += 20 * 60
+        assert client.get("/api/albums", headers=headers).status_code == 200
+    assert client.get("/api/users/is-online/active@example.com").json()["is_online"] is True
+
+    clock.now += 31 * 60
+    assert client.get("/api/users/is-online/active@example.com").json()["is_online"] is False
+    sessions.stop()
+
+
+def test_touch_due_throttles_sessions_and_misses(monkeypatch):
+    clock = FakeClock(1000.0)
+    monkeypatch.setattr(session_store, "time", clock)
+    backend = MemorySessionBackend(idle_timeout=600, absolute_timeout=3600)
+    store = SessionStore(backend, touch_interval=10)
+    store.create("a", {}, max_sessions=5)
+
+    assert store.touch_due("a") is False
+    assert store.touch_due("missing") is True
+    assert store.touch("missing") is False
+    # Key không có session: không tra lại backend trong touch_interval
+    assert store.touch_due("missing") is False
+    assert store.touch("missing") is False
+    assert store.get_stats()["touches"] == 1
+
+    clock.now += 10
+    assert store.touch_due("a") is True and store.touch_due("missing") is True
+    store.stop()
+
+
+def test_token_check_on_event_loop_records_activity_off_loop(main_module, monkeypatch):
+    import asyncio
+    import threading
+
+    touched = []
+
+    class Manager:
+        def activity_due(self, email):
+            return not touched
+
+        def update_user_activity(self, email):
+            touched.append((email, threading.get_ident()))
+
+    monkeypatch.setattr(main_module, "login_manager", Manager())
+    token = main_module.create_access_token({"sub": "loop@example.com"})
+
+    async def view_image():
+        assert main_module.verify_token_from_string(token) == "loop@example.com"
+        loop_thread = threading.get_ident()
+        for _ in range(100):
+            if touched:
+                break
+            await asyncio.sleep(0.01)
+        # Lần sau chưa tới hạn: không ghi lại
+        main_module.verify_token_from_string(token)
+        return loop_thread
+
+    loop_thread = asyncio.run(view_image())
+    assert len(touched) == 1
+    assert touched[0][0] == "loop@example.com" and touched[0][1] != loop_thread
+
+
+def test_sqlite_put_uses_maintained_count(tmp_path):
+    path = str(tmp_path / "count.db")
+    backend = SQLiteSessionBackend(idle_timeout=10, absolute_timeout=100, db_file=path)
+    statements = []
+    backend._connect().set_trace_callback(statements.append)
+
+    for i in range(5):
+        backend.put(f"u{i}", {}, now=i, max_sessions=3)
+    backend.delete("u4")
+    backend.sweep(now=12.5)
+    assert not any("COUNT(*)" in statement for statement in statements)
+
+    conn = backend._connect()
+    stored = conn.execute("SELECT n FROM session_count").fetchone()[0]
+    assert stored == conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+    backend.close()
+
+    # Mở lại file: bộ đếm giữ nguyên, không đếm lại
+    reopened = SQLiteSessionBackend(idle_timeout=10, absolute_timeout=100, db_file=path)
+    assert reopened.put("new", {}, now=12.6, max_sessions=2) == []
+    assert reopened.put("newer", {}, now=12.6, max_sessions=2) == ["u3"]
+    reopened.close()
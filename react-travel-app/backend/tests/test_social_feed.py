@@ -0,0 +1,27 @@
+"""Social feed: ảnh base64 cũ chỉ được chuyển sang blob store ở bước migrate lúc khởi động"""
+import base64
+import json
+
+import social_feed
+from social_feed import SocialFeedManager
+
+
+def test_construction_does_not_rewrite_posts_and_startup_migrates(main_module, monkeypatch, tmp_path):
+    posts_file = tmp_path / "social_posts.json"
+    image = b"\x89PNG\r\n\x1a\n legacy post image"
+    posts = {"post_1": {"post_id": "post_1", "user_email": "a@example.com", "content": "hi",
+                        "image_data": "data:image/png;base64," + base64.b64encode(image).decode()}}
+    posts_file.write_text(json.dumps(posts), encoding="utf-8")
+    monkeypatch.setattr(social_feed, "POSTS_FILE", str(posts_file))
+    before = posts_file.read_text(encoding="utf-8")
+
+    manager = SocialFeedManager()
+    assert posts_file.read_text(encoding="utf-8") == before
+
+    monkeypatch.setattr(main_module, "social_feed_manager", manager)
+    monkeypatch.setattr(main_module, "BLOB_GC_ON_STARTUP", False)
+    main_module.run_startup_migrations()
+
+    stored = json.loads(posts_file.read_text(encoding="utf-8"))["post_1"]
+    assert stored["image_data"] == social_feed.image_url(stored["image_hash"])
+    assert main_module.blob_store.get(stored["image_hash"]) == image
@@ -0,0 +1,117 @@
+"""Nhận dạng strict: các biến thể chạy song song, theo thứ tự ưu tiên, lỗi/timeout của một biến thể không làm hỏng cả lượt"""
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import recognize
+
+# Gọi thẳng hàm gốc, bỏ qua recognition_cache
+detect_strict = recognize.detect_landmark_strict.__wrapped__
+
+
+@pytest.fixture
+def strict_env(monkeypatch):
+    monkeypatch.setattr(recognize, "OPENAI_ENABLED", True)
+    monkeypatch.setattr(recognize, "_strict_metrics", {})
+    release = threading.Event()
+    yield release
+    # Giải phóng các lời gọi giả còn treo trên executor dùng chung
+    release.set()
+
+
+def make_image():
+    return Image.new("RGB", (64, 64), "blue")
+
+
+def test_strict_variants_fan_out_concurrently(monkeypatch, strict_env):
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+    barrier = threading.Barrier(3, timeout=2)
+
+    def fake_analysis(img, prompt):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        with lock:
+            state["running"] -= 1
+        return "Không rõ địa danh"
+
+    monkeypatch.setattr(recognize, "get_image_analysis", fake_analysis)
+
+    with pytest.raises(ValueError):
+        detect_strict(make_image(), retries=1, max_parallel=3, time_budget=5, call_budget=6)
+
+    assert state["peak"] == 3
+    metrics = recognize.get_strict_metrics()
+    assert sum(m["misses"] for m in metrics.values()) == 6
+
+
+def test_strict_variants_are_tried_in_priority_order(monkeypatch, strict_env):
+    sizes = []
+
+    def fake_analysis(img, prompt):
+        sizes.append(img.size[0])
+        return "Chợ Bến Thành" if len(sizes) == 4 else "Không rõ địa danh"
+
+    monkeypatch.setattr(recognize, "get_image_analysis", fake_analysis)
+
+    assert detect_strict(make_image(), retries=1, max_parallel=1, time_budget=5) == "Chợ Bến Thành"
+    # original, scale_1.5, scale_0.75, scale_2.0 — dừng ngay ở kết quả hợp lệ đầu tiên
+    assert sizes == [64, 96, 48, 128]
+    assert recognize.get_strict_metrics()["scale_2.0"]["wins"] == 1
+
+
+def test_strict_failing_variant_is_recorded_and_skipped(monkeypatch, strict_env):
+    def fake_analysis(img, prompt):
+        if img.size[0] == 64:
+            raise RuntimeError("upstream 500")
+        return "Nhà thờ Đức Bà"
+
+    monkeypatch.setattr(recognize, "get_image_analysis", fake_analysis)
+
+    assert detect_strict(make_image(), retries=1, max_parallel=1, time_budget=5) == "Nhà thờ Đức Bà"
+    metrics = recognize.get_strict_metrics()
+    assert metrics["original"]["errors"] == 1
+    assert metrics["scale_1.5"]["wins"] == 1
+
+
+def test_strict_slow_variant_does_not_block_faster_win(monkeypatch, strict_env):
+    release = strict_env
+
+    def fake_analysis(img, prompt):
+        if img.size[0] == 64:
+            release.wait(5)
+            return "Không rõ địa danh"
+        return "Hồ Gươm"
+
+    monkeypatch.setattr(recognize, "get_image_analysis", fake_analysis)
+
+    start = time.monotonic()
+    assert detect_strict(make_image(), retries=1, max_parallel=2, time_budget=5) == "Hồ Gươm"
+    assert time.monotonic() - start < 1
+
+
+def test_strict_time_budget_bounds_hung_variant(monkeypatch, strict_env):
+    release = strict_env
+
+    calls = []
+
+    def fake_analysis(img, prompt):
+        calls.append(img.size)
+        release.wait(5)
+        return "Không rõ địa danh"
+
+    monkeypatch.setattr(recognize, "get_image_analysis", fake_analysis)
+
+    start = time.monotonic()
+    with pytest.raises(ValueError):
+        detect_strict(make_image(), retries=1, max_parallel=2, time_budget=0.2, call_budget=6)
+    assert time.monotonic() - start < 1
+    # Hết ngân sách thời gian thì không gửi thêm biến thể nào
+    assert len(calls) == 2
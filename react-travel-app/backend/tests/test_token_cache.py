@@ -0,0 +1,54 @@
+"""JWT cache: token đã xác thực được cache, token đăng xuất bị từ chối tới khi hết hạn"""
+import time
+
+import jwt
+import pytest
+
+from token_cache import TokenCache
+
+SECRET = "test-secret"
+
+
+def make_token(sub, exp_in=3600):
+    return jwt.encode({"sub": sub, "exp": int(time.time() + exp_in)}, SECRET, algorithm="HS256")
+
+
+def test_verify_caches_claims_and_rejects_revoked_tokens():
+    cache = TokenCache(SECRET, "HS256")
+    token, other = make_token("a@example.com"), make_token("b@example.com")
+
+    assert cache.verify(token)["sub"] == "a@example.com"
+    assert cache.verify(token)["sub"] == "a@example.com"
+    assert cache.get_stats()["hits"] == 1
+
+    assert cache.revoke(token) is True
+    with pytest.raises(jwt.InvalidTokenError):
+        cache.verify(token)
+    assert cache.verify(other)["sub"] == "b@example.com"
+    assert cache.revoke("not-a-token") is False
+    assert cache.get_stats()["revoked"] == 1
+
+
+def test_expired_tokens_are_rejected_even_when_cached():
+    cache = TokenCache(SECRET, "HS256")
+    token = make_token("a@example.com", exp_in=1)
+    cache.verify(token)
+    time.sleep(1.1)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        cache.verify(token)
+    # Token đã hết hạn không cần giữ trong danh sách thu hồi
+    cache.revoke(token)
+    assert cache.get_stats()["revoked"] == 0
+
+
+def test_logout_revokes_only_that_token(main_module, client):
+    token = main_module.create_access_token({"sub": "logout@example.com"})
+    other = main_module.create_access_token({"sub": "other@example.com"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/api/albums", headers=headers).status_code == 200
+    assert client.post("/api/logout", headers=headers).json()["success"] is True
+
+    response = client.get("/api/albums", headers=headers)
+    assert response.status_code == 401
+    assert client.get("/api/albums", headers={"Authorization": f"Bearer {other}"}).status_code == 200
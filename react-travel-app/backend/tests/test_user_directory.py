@@ -0,0 +1,96 @@
+"""User directory: tra user qua hash index, giữ thứ tự ưu tiên user đứng trước trong file như cách tìm tuần tự cũ"""
+import random
+
+from user_directory import UserDirectory
+
+
+def linear_find(users, username):
+    """Cách cũ trong login_user"""
+    return next((u for u in users if u.get("username") == username or u.get("email") == username
+                 or (u.get("email", "").split("@")[0] == username)), None)
+
+
+def colliding_users():
+    return [
+        {"username": "alice", "email": "a.nguyen@example.com"},
+        {"username": "bob", "email": "alice@example.com"},          # local-part trùng username của user trước
+        {"username": "carol", "email": "dave@example.com"},
+        {"username": "dave", "email": "dave@other.com"},            # username trùng local-part của user trước
+        {"username": "alice@example.com", "email": "eve@example.com"},  # username trùng email của user trước
+        {"username": "bob", "email": "bob2@example.com"},           # username trùng
+        {"username": "frank", "email": ""},
+    ]
+
+
+def test_find_login_keeps_first_match_priority():
+    users = colliding_users()
+    directory = UserDirectory({"users": users})
+    identifiers = {"nobody", "example.com"}
+    for user in users:
+        identifiers |= {user["username"], user["email"], user["email"].split("@")[0]}
+    identifiers.discard("")
+    for identifier in identifiers:
+        assert directory.find_login(identifier) is linear_find(users, identifier), identifier
+    # Cách cũ khớp chuỗi rỗng với user không có email; index thì không bao giờ
+    assert directory.find_login("") is None
+
+    assert directory.find_login("dave") is users[2]
+    assert directory.find_login("alice@example.com") is users[1]
+    assert directory.find_login("bob") is users[1]
+
+
+def test_find_login_matches_linear_scan_on_random_users():
+    rng = random.Random(21)
+    names = [f"user{i}" for i in range(60)]
+    users = [{"username": rng.choice(names), "email": f"{rng.choice(names)}@{rng.choice(['a.com', 'b.com'])}"}
+             for _ in range(200)]
+    directory = UserDirectory({"users": users})
+    for identifier in names + [f"{name}@a.com" for name in names] + [f"{name}@b.com" for name in names]:
+        assert directory.find_login(identifier) is linear_find(users, identifier), identifier
+
+
+def test_get_uses_first_user_with_key():
+    users = colliding_users()
+    directory = UserDirectory({"users": users})
+    assert directory.get("bob") is users[1]
+    assert directory.get_by_email("dave@example.com") is users[2]
+    assert directory.get("nobody") is None
+    assert directory.get_by_email("frank@example.com") is None
+
+
+def test_add_appends_and_indexes_new_user():
+    data = {"users": colliding_users()}
+    directory = UserDirectory(data)
+    grace = {"username": "grace", "email": "grace@example.com"}
+    directory.add(grace)
+    assert len(directory) == 8
+    assert data["users"][-1] is grace
+    assert directory.find_login("grace") is grace
+    assert directory.get_by_email("grace@example.com") is grace
+
+    # User mới trùng khoá không lấn user có sẵn
+    late_alice = {"username": "alice", "email": "alice@late.com"}
+    directory.add(late_alice)
+    assert directory.get("alice") is data["users"][0]
+    assert directory.find_login("alice") is linear_find(data["users"], "alice")
+    assert directory.get_by_email("alice@late.com") is late_alice
+
+
+def test_reindex_after_key_change():
+    data = {"users": colliding_users()}
+    directory = UserDirectory(data)
+    data["users"][0]["username"] = "alice.nguyen"
+    data["users"][0]["email"] = "alice.nguyen@example.com"
+    directory.reindex()
+    assert directory.get("alice") is None
+    assert directory.get("alice.nguyen") is data["users"][0]
+    for identifier in ("alice", "alice.nguyen", "a.nguyen", "a.nguyen@example.com"):
+        assert directory.find_login(identifier) is linear_find(data["users"], identifier)
+
+
+def test_empty_directory():
+    data = {}
+    directory = UserDirectory(data)
+    assert data == {"users": []}
+    assert len(directory) == 0
+    assert directory.find_login("alice") is None
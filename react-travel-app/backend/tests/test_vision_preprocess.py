@@ -0,0 +1,101 @@
+"""Vision preprocess: xoay theo EXIF, draft JPEG khi thu nhỏ, không vượt cạnh tối đa, cache payload"""
+import base64
+from io import BytesIO
+
+from PIL import Image
+
+from vision_preprocess import VisionPreprocessor
+
+ORIENTATION = 0x0112
+
+
+def jpeg(size, orientation=None, marker=True):
+    """JPEG có ô đỏ ở góc trên trái (theo pixel lưu trong file)"""
+    image = Image.new("RGB", size, "white")
+    if marker:
+        image.paste((255, 0, 0), (0, 0, size[0] // 4, size[1] // 4))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[ORIENTATION] = orientation
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def is_red(pixel):
+    r, g, b = pixel
+    return r > 200 and g < 60 and b < 60
+
+
+def test_exif_rotated_jpeg_is_transposed():
+    preprocessor = VisionPreprocessor(max_edge=1024)
+    # Orientation 6: ảnh lưu nằm ngang, hiển thị phải xoay 90° theo chiều kim đồng hồ
+    prepared = preprocessor.prepare(jpeg((400, 200), orientation=6))
+    assert prepared.size == (200, 400)
+    assert prepared.mode == "RGB"
+    width, height = prepared.size
+    # Góc trên trái của pixel gốc chuyển sang góc trên phải
+    assert is_red(prepared.getpixel((width - 5, 5)))
+    assert not is_red(prepared.getpixel((5, 5)))
+    assert prepared.getexif().get(ORIENTATION, 1) == 1
+
+
+def test_exif_rotation_survives_downscale():
+    preprocessor = VisionPreprocessor(max_edge=100)
+    prepared = preprocessor.prepare(jpeg((800, 400), orientation=6))
+    assert prepared.size == (50, 100)
+    assert is_red(prepared.getpixel((45, 3)))
+
+
+def test_large_jpeg_is_drafted_within_target():
+    preprocessor = VisionPreprocessor(max_edge=1024)
+    source = jpeg((4000, 3000))
+    prepared = preprocessor.prepare(source)
+    assert prepared.size == (1024, 768)
+    # draft() đã cho decoder đọc ở 1/2 thay vì giải mã đủ 4000x3000
+    assert source.size == (2000, 1500)
+    stats = preprocessor.get_stats()
+    assert stats["drafted"] == 1
+    assert stats["downscaled"] == 1
+
+
+def test_draft_never_goes_below_target():
+    for size, max_edge in [((4000, 3000), 600), ((3000, 4000), 700), ((1500, 100), 1024), ((2047, 2047), 1024)]:
+        preprocessor = VisionPreprocessor(max_edge=max_edge)
+        prepared = preprocessor.prepare(jpeg(size, marker=False))
+        assert max(prepared.size) == max_edge, size
+
+
+def test_non_jpeg_is_resized_without_draft():
+    preprocessor = VisionPreprocessor(max_edge=256)
+    buffer = BytesIO()
+    Image.new("RGBA", (1000, 500), (0, 128, 0, 255)).save(buffer, format="PNG")
+    buffer.seek(0)
+    prepared = preprocessor.prepare(Image.open(buffer))
+    assert prepared.size == (256, 128)
+    assert prepared.mode == "RGB"
+    assert preprocessor.get_stats()["drafted"] == 0
+
+
+def test_prepared_image_is_returned_unchanged():
+    preprocessor = VisionPreprocessor(max_edge=1024)
+    image = Image.new("RGB", (300, 200), "blue")
+    assert preprocessor.prepare(image) is image
+    small = Image.new("RGB", (50, 50), "blue")
+    assert preprocessor.prepare(small).size == (50, 50)
+
+
+def test_encode_base64_caches_payload_per_image():
+    preprocessor = VisionPreprocessor(max_edge=512)
+    source = jpeg((2000, 1000), orientation=6)
+    payload = preprocessor.encode_base64(source)
+    assert preprocessor.encode_base64(source) == payload
+
+    decoded = Image.open(BytesIO(base64.b64decode(payload)))
+    assert decoded.format == "JPEG"
+    assert decoded.size == (256, 512)
+    stats = preprocessor.get_stats()
+    assert stats["encoded"] == 1
+    assert stats["cache_hits"] == 1
+    assert stats["bytes_saved"] > 0
@@ -0,0 +1,123 @@
+"""Write-behind: gộp cập nhật cùng khoá, ghi lỗi thì thử lại, stop() ghi nốt phần còn lại"""
+import threading
+import time
+
+from write_behind import WriteBehindBuffer
+
+
+class Recorder:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+        self.written = threading.Event()
+
+    def __call__(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.batches.append(dict(batch))
+        self.written.set()
+
+
+def test_updates_to_same_key_are_coalesced():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, interval=60)
+    for value in (1, 2, 3):
+        buffer.put("a@example.com", value)
+    buffer.put("b@example.com", 10)
+    assert buffer.pending() == {"a@example.com": 3, "b@example.com": 10}
+
+    assert buffer.flush() == 2
+    assert recorder.batches == [{"a@example.com": 3, "b@example.com": 10}]
+    assert buffer.flush() == 0
+    stats = buffer.get_stats()
+    assert stats["puts"] == 4
+    assert stats["coalesced"] == 2
+    assert stats["flushed_keys"] == 2
+    assert stats["pending"] == 0
+    buffer.stop()
+
+
+def test_failed_flush_is_retried_without_losing_newer_values():
+    recorder = Recorder(failures=1)
+    buffer = WriteBehindBuffer(recorder, interval=60)
+    buffer.put("a", 1)
+    buffer.put("b", 1)
+
+    def failing(batch):
+        # Cập nhật mới đến trong lúc đang ghi lô cũ
+        buffer.put("a", 2)
+        recorder(batch)
+
+    buffer._flush_fn = failing
+    assert buffer.flush() == 0
+    assert buffer.pending() == {"a": 2, "b": 1}
+    assert buffer.get_stats()["errors"] == 1
+
+    buffer._flush_fn = recorder
+    assert buffer.flush() == 2
+    assert recorder.batches == [{"a": 2, "b": 1}]
+    buffer.stop()
+
+
+def test_background_flush_after_interval():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, interval=0.05)
+    buffer.put("a", 1)
+    assert recorder.written.wait(2)
+    assert recorder.batches == [{"a": 1}]
+    buffer.stop()
+
+
+def test_background_flush_retries_after_error():
+    recorder = Recorder(failures=2)
+    buffer = WriteBehindBuffer(recorder, interval=0.02)
+    buffer.put("a", 1)
+    assert recorder.written.wait(2)
+    assert recorder.batches == [{"a": 1}]
+    assert buffer.get_stats()["errors"] == 2
+    buffer.stop()
+
+
+def test_max_pending_flushes_before_interval():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, interval=60, max_pending=3)
+    buffer.put("a", 1)
+    buffer.put("b", 1)
+    time.sleep(0.05)
+    assert recorder.batches == []
+    buffer.put("c", 1)
+    assert recorder.written.wait(2)
+    assert recorder.batches == [{"a": 1, "b": 1, "c": 1}]
+    buffer.stop()
+
+
+def test_stop_flushes_pending_updates():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, interval=60)
+    buffer.put("a", 1)
+    buffer.put("b", 2)
+    buffer.stop()
+    assert recorder.batches == [{"a": 1, "b": 2}]
+    buffer._thread.join(2)
+    assert not buffer._thread.is_alive()
+
+    # Sau khi dừng không khởi động lại worker; stop() lần nữa (atexit) vẫn ghi nốt
+    buffer.put("c", 3)
+    buffer.stop()
+    assert recorder.batches[-1] == {"c": 3}
+
+
+def test_discard_skips_keys_written_elsewhere():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, interval=60)
+    first, newer = {"n": 1}, {"n": 2}
+    buffer.put("a", first)
+    buffer.put("b", first)
+    snapshot = buffer.pending()
+    buffer.put("b", newer)
+
+    buffer.discard(snapshot)
+    assert buffer.pending() == {"b": newer}
+    buffer.stop()
+    assert recorder.batches == [{"b": newer}]
@@ -0,0 +1,119 @@
+"""
+Token Cache Module - Cache JWT đã xác thực (token -> claims)
+- Trang album gọi endpoint xem ảnh hàng chục lần với cùng một token: chỉ decode + kiểm tra HMAC lần đầu
+- Entry hết hạn đúng lúc token hết hạn (claim exp), LRU giới hạn số entry
+- Thu hồi token khi đăng xuất: token bị thu hồi bị từ chối đến khi hết hạn
+- Thống kê hit/miss
+"""
+
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import jwt
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', '10000'))
+# Thời gian cache token không có claim exp (giây)
+TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', '300'))
+
+
+class TokenCache:
+    """
+    verify(token) trả về claims như jwt.decode và raise cùng các lỗi của PyJWT
+    (ExpiredSignatureError, InvalidTokenError). Claims trả về dùng chung giữa các request, không sửa.
+    """
+
+    def __init__(self, secret: str, algorithm: str, max_entries: int = TOKEN_CACHE_MAX_ENTRIES,
+                 ttl: float = TOKEN_CACHE_TTL):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = Lock()
+        # token -> (thời điểm hết hạn, claims), thứ tự LRU
+        self._cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        # token đã thu hồi -> thời điểm hết hạn (sau đó token tự bị từ chối, bỏ khỏi danh sách)
+        self._revoked: Dict[str, float] = {}
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "revocations": 0,
+                       "revoked_rejects": 0}
+
+    def _decode(self, token: str, verify_exp: bool = True) -> Dict:
+        return jwt.decode(token, self.secret, algorithms=[self.algorithm],
+                          options={"verify_exp": verify_exp})
+
+    def _expires_at(self, claims: Dict, now: float) -> float:
+        exp = claims.get("exp")
+        return float(exp) if exp is not None else now + self.ttl
+
+    def verify(self, token: str) -> Dict:
+        """Claims của token đã xác thực (từ cache nếu có)"""
+        now = time.time()
+        with self._lock:
+            if token in self._revoked:
+                self._stats["revoked_rejects"] += 1
+                raise jwt.InvalidTokenError("Token has been revoked")
+            entry = self._cache.get(token)
+            if entry is not None:
+                expires_at, claims = entry
+                if expires_at > now:
+                    self._cache.move_to_end(token)
+                    self._stats["hits"] += 1
+                    return claims
+                # Hết hạn: decode lại bên dưới để raise ExpiredSignatureError như bình thường
+                del self._cache[token]
+                self._stats["expired"] += 1
+            self._stats["misses"] += 1
+
+        claims = self._decode(token)
+
+        with self._lock:
+            # Token có thể vừa bị thu hồi trong lúc decode
+            if token not in self._revoked:
+                self._cache[token] = (self._expires_at(claims, now), claims)
+                self._cache.move_to_end(token)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                    self._stats["evictions"] += 1
+        return claims
+
+    def revoke(self, token: Optional[str]) -> bool:
+        """Thu hồi token (đăng xuất); trả về False nếu token không hợp lệ sẵn"""
+        if not token:
+            return False
+        now = time.time()
+        with self._lock:
+            entry = self._cache.pop(token, None)
+        if entry is not None:
+            expires_at = entry[0]
+        else:
+            try:
+                expires_at = self._expires_at(self._decode(token, verify_exp=False), now)
+            except jwt.InvalidTokenError:
+                return False
+
+        with self._lock:
+            # Dọn các token đã thu hồi nay đã hết hạn (đăng xuất hiếm nên duyệt tuần tự là đủ)
+            for expired in [t for t, at in self._revoked.items() if at <= now]:
+                del self._revoked[expired]
+            if expires_at > now:
+                self._revoked[token] = expires_at
+            self._stats["revocations"] += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self._cache),
+                "revoked": len(self._revoked),
+                "max_entries": self.max_entries,
+            }
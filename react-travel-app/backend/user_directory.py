@@ -0,0 +1,71 @@
+"""
+User Directory Module - Danh sách user trong bộ nhớ với hash index
+- Index theo username, email và phần trước @ của email: tìm user O(1)
+- Cập nhật từng user khi đăng ký/sửa, không dựng lại cả danh sách
+- Giữ nguyên thứ tự ưu tiên của cách tìm tuần tự cũ: user đứng trước trong file được chọn
+"""
+
+from typing import Dict, List, Optional
+
+
+def email_local_part(email: Optional[str]) -> str:
+    return (email or "").split("@")[0]
+
+
+class UserDirectory:
+    """
+    Bọc dữ liệu Users.json ({"users": [...], ...}).
+    Các dict user dùng chung với `data`, nên sửa field không phải khoá (password, last_login...)
+    tại chỗ vẫn được ghi ra file; đổi username/email thì gọi reindex().
+    """
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.users: List[Dict] = data.setdefault("users", [])
+        # khoá -> vị trí đầu tiên trong self.users
+        self._by_username: Dict[str, int] = {}
+        self._by_email: Dict[str, int] = {}
+        self._by_local_part: Dict[str, int] = {}
+        for position, user in enumerate(self.users):
+            self._index(position, user)
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def _index(self, position: int, user: Dict):
+        # setdefault: trùng khoá thì user đứng trước thắng, giống next() trên danh sách
+        if user.get("username"):
+            self._by_username.setdefault(user["username"], position)
+        if user.get("email"):
+            self._by_email.setdefault(user["email"], position)
+            self._by_local_part.setdefault(email_local_part(user["email"]), position)
+
+    def reindex(self):
+        """Dựng lại index (sau khi đổi username/email của user có sẵn)"""
+        self._by_username.clear()
+        self._by_email.clear()
+        self._by_local_part.clear()
+        for position, user in enumerate(self.users):
+            self._index(position, user)
+
+    def get(self, username: str) -> Optional[Dict]:
+        """User theo username"""
+        position = self._by_username.get(username)
+        return self.users[position] if position is not None else None
+
+    def get_by_email(self, email: str) -> Optional[Dict]:
+        position = self._by_email.get(email)
+        return self.users[position] if position is not None else None
+
+    def find_login(self, identifier: str) -> Optional[Dict]:
+        """User có username, email hoặc phần trước @ của email bằng identifier"""
+        if not identifier:
+            return None
+        positions = [index[identifier] for index in (self._by_username, self._by_email, self._by_local_part)
+                     if identifier in index]
+        return self.users[min(positions)] if positions else None
+
+    def add(self, user: Dict):
+        """Thêm user mới vào cuối danh sách"""
+        self.users.append(user)
+        self._index(len(self.users) - 1, user)
@@ -0,0 +1,170 @@
+"""
+Vision Preprocess Module - Chuẩn bị ảnh trước khi gửi cho vision model
+- Xoay ảnh theo EXIF orientation
+- Thu nhỏ về cạnh dài tối đa VISION_MAX_EDGE (không bao giờ phóng to);
+  với JPEG dùng draft() để decoder đọc thẳng ở độ phân giải thấp hơn
+- Cache payload JPEG/base64 đã encode theo từng object ảnh
+- Thống kê số byte tiết kiệm được và thời gian xử lý
+"""
+
+import base64
+import os
+import time
+import weakref
+from collections import OrderedDict
+from io import BytesIO
+from threading import RLock
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+# Cạnh dài tối đa gửi cho model: gpt-4o-mini thu ảnh về cạnh ngắn 768px, gửi lớn hơn chỉ tốn băng thông
+VISION_MAX_EDGE = int(os.getenv('VISION_MAX_EDGE', '1024'))
+VISION_JPEG_QUALITY = int(os.getenv('VISION_JPEG_QUALITY', '85'))
+VISION_PAYLOAD_CACHE_SIZE = int(os.getenv('VISION_PAYLOAD_CACHE_SIZE', '64'))
+
+
+def _source_size(image: Image.Image) -> Optional[int]:
+    """Kích thước file gốc (byte) nếu ảnh được mở từ file/BytesIO còn truy cập được"""
+    fp = getattr(image, "fp", None)
+    if fp is None:
+        return None
+    try:
+        if isinstance(fp, BytesIO):
+            return fp.getbuffer().nbytes
+        position = fp.tell()
+        fp.seek(0, os.SEEK_END)
+        size = fp.tell()
+        fp.seek(position)
+        return size
+    except Exception:
+        return None
+
+
+class VisionPreprocessor:
+    """Thu nhỏ/xoay ảnh và encode JPEG cho vision model, có cache payload"""
+
+    def __init__(self, max_edge: int = VISION_MAX_EDGE, quality: int = VISION_JPEG_QUALITY,
+                 cache_size: int = VISION_PAYLOAD_CACHE_SIZE):
+        self.max_edge = max_edge
+        self.quality = quality
+        self.cache_size = cache_size
+
+        # RLock: callback của weakref có thể chạy (khi GC) lúc thread đang giữ lock
+        self._lock = RLock()
+        # id(image) -> (weakref tới image, payload base64)
+        self._payloads: "OrderedDict[int, tuple]" = OrderedDict()
+        self._stats = {
+            "prepared": 0, "downscaled": 0, "drafted": 0, "encoded": 0, "cache_hits": 0,
+            "source_bytes": 0, "payload_bytes": 0, "bytes_saved": 0, "prepare_ms": 0.0, "encode_ms": 0.0
+        }
+
+    def _is_prepared(self, image: Image.Image) -> bool:
+        if image.mode != "RGB" or max(image.size) > self.max_edge:
+            return False
+        return image.getexif().get(0x0112, 1) == 1  # 0x0112 = Orientation
+
+    def prepare(self, image: Image.Image) -> Image.Image:
+        """
+        Ảnh RGB đã xoay đúng chiều, cạnh dài <= max_edge.
+        Ảnh đã đạt yêu cầu được trả về nguyên object (gọi nhiều lần không tốn thêm).
+        Lưu ý: JPEG chưa decode sẽ được draft, object gốc chỉ còn độ phân giải đã giảm.
+        """
+        if self._is_prepared(image):
+            return image
+
+        start = time.perf_counter()
+        source_bytes = _source_size(image)
+        width, height = image.size
+        scale = min(1.0, self.max_edge / max(width, height))
+
+        drafted = False
+        if scale < 1.0:
+            # JPEG chưa decode: decoder giảm 1/2, 1/4, 1/8 ngay khi đọc, vẫn giữ >= kích thước yêu cầu.
+            # Định dạng khác hoặc ảnh đã load thì draft() không làm gì và trả về None
+            requested = (max(1, round(width * scale)), max(1, round(height * scale)))
+            image.draft("RGB", requested)
+            drafted = image.size != (width, height)
+
+        # Thu nhỏ trước rồi mới xoay để phép xoay chỉ chạy trên ảnh nhỏ;
+        # khung giới hạn vuông nên thứ tự này không đổi kết quả
+        width, height = image.size
+        downscaled = max(width, height) > self.max_edge
+        if downscaled:
+            ratio = self.max_edge / max(width, height)
+            target = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+            resized = image.resize(target, Image.Resampling.BICUBIC, reducing_gap=2.0)
+            resized.info = dict(image.info)
+            # resize() không giữ EXIF orientation trong getexif(), gắn lại để exif_transpose dùng
+            resized.getexif()[0x0112] = image.getexif().get(0x0112, 1)
+        else:
+            resized = image
+        prepared = ImageOps.exif_transpose(resized)
+        if prepared.mode != "RGB":
+            prepared = prepared.convert("RGB")
+        # Nhớ kích thước file gốc để tính số byte tiết kiệm khi encode
+        prepared.info["source_bytes"] = source_bytes
+
+        with self._lock:
+            self._stats["prepared"] += 1
+            self._stats["drafted"] += drafted
+            self._stats["downscaled"] += downscaled or drafted
+            self._stats["prepare_ms"] += (time.perf_counter() - start) * 1000
+        return prepared
+
+    def _discard(self, key: int):
+        with self._lock:
+            entry = self._payloads.get(key)
+            if entry is not None and entry[0]() is None:
+                del self._payloads[key]
+
+    def encode_base64(self, image: Image.Image) -> str:
+        """JPEG base64 của ảnh sau khi prepare; cùng một object ảnh chỉ encode một lần"""
+        key = id(image)
+        with self._lock:
+            entry = self._payloads.get(key)
+            if entry is not None and entry[0]() is image:
+                self._payloads.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return entry[1]
+
+        prepared = self.prepare(image)
+        start = time.perf_counter()
+        buffer = BytesIO()
+        prepared.save(buffer, format="JPEG", quality=self.quality)
+        payload_bytes = buffer.tell()
+        payload = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        source_bytes = prepared.info.get("source_bytes") or _source_size(image)
+        with self._lock:
+            self._stats["encoded"] += 1
+            self._stats["payload_bytes"] += payload_bytes
+            self._stats["encode_ms"] += elapsed_ms
+            if source_bytes:
+                self._stats["source_bytes"] += source_bytes
+                self._stats["bytes_saved"] += max(0, source_bytes - payload_bytes)
+
+            self._payloads[key] = (weakref.ref(image, lambda _: self._discard(key)), payload)
+            self._payloads.move_to_end(key)
+            while len(self._payloads) > self.cache_size:
+                self._payloads.popitem(last=False)
+        return payload
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            calls = self._stats["encoded"] + self._stats["cache_hits"]
+            prepared, encoded = self._stats["prepared"], self._stats["encoded"]
+            return {
+                **self._stats,
+                "prepare_ms": round(self._stats["prepare_ms"], 1),
+                "encode_ms": round(self._stats["encode_ms"], 1),
+                "avg_prepare_ms": round(self._stats["prepare_ms"] / prepared, 2) if prepared else 0.0,
+                "avg_encode_ms": round(self._stats["encode_ms"] / encoded, 2) if encoded else 0.0,
+                "cache_hit_rate": round(self._stats["cache_hits"] / calls, 3) if calls else 0.0,
+                "max_edge": self.max_edge,
+            }
+
+
+# Global instance
+vision_preprocessor = VisionPreprocessor()
@@ -0,0 +1,113 @@
+"""
+Write-Behind Module - Gom các cập nhật nhỏ trong bộ nhớ rồi ghi xuống đĩa theo lô
+- Cập nhật cùng khoá được gộp (chỉ giữ giá trị mới nhất)
+- Ghi khi đủ FLUSH_INTERVAL giây hoặc khi số khoá chờ ghi đạt ngưỡng
+- Ghi lỗi thì giữ lại để lần sau ghi tiếp; process dừng bình thường thì ghi nốt (atexit)
+- Crash chỉ mất các cập nhật trong cửa sổ ghi cuối cùng
+"""
+
+import atexit
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    put(key, value) chỉ ghi vào bộ nhớ; flush(batch) được gọi từ thread nền
+    với {key: value mới nhất} và phải raise nếu ghi không thành công.
+    """
+
+    def __init__(self, flush: Callable[[Dict], None], interval: float = 5.0, max_pending: int = 100,
+                 name: str = "write-behind"):
+        self._flush_fn = flush
+        self.interval = interval
+        self.max_pending = max_pending
+        self.name = name
+
+        self._lock = threading.Lock()
+        # Đảm bảo chỉ một lần flush chạy tại một thời điểm (thread nền, flush thủ công, atexit)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending: Dict[Hashable, object] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats = {"puts": 0, "coalesced": 0, "flushes": 0, "flushed_keys": 0, "errors": 0,
+                       "last_flush_ms": 0.0}
+
+        atexit.register(self.stop)
+
+    def _ensure_thread(self):
+        """Worker chỉ khởi động khi có cập nhật đầu tiên; gọi khi đang giữ _lock"""
+        if self._thread is None and not self._stopping:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            if key in self._pending:
+                self._stats["coalesced"] += 1
+            self._pending[key] = value
+            self._stats["puts"] += 1
+            self._ensure_thread()
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def pending(self) -> Dict:
+        """Bản sao các cập nhật chưa ghi"""
+        with self._lock:
+            return dict(self._pending)
+
+    def discard(self, batch: Dict):
+        """Bỏ các cập nhật đã được ghi bằng đường khác (vd. ghi toàn bộ file), nếu chưa bị thay bằng giá trị mới hơn"""
+        with self._lock:
+            for key, value in batch.items():
+                if self._pending.get(key) is value:
+                    del self._pending[key]
+
+    def flush(self) -> int:
+        """Ghi ngay các cập nhật đang chờ, trả về số khoá đã ghi"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                self._flush_fn(batch)
+            except Exception as e:
+                # Trả lại lô chưa ghi được, không đè lên giá trị mới hơn đến trong lúc ghi
+                with self._lock:
+                    for key, value in batch.items():
+                        self._pending.setdefault(key, value)
+                    self._stats["errors"] += 1
+                logger.error(f"{self.name} flush failed ({len(batch)} keys): {e}")
+                return 0
+
+            with self._lock:
+                self._stats["flushes"] += 1
+                self._stats["flushed_keys"] += len(batch)
+                self._stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return len(batch)
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        """Dừng worker và ghi nốt phần còn lại"""
+        self._stopping = True
+        self._wakeup.set()
+        self.flush()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "pending": len(self._pending), "interval": self.interval,
+                    "max_pending": self.max_pending}